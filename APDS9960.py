@@ -11,18 +11,28 @@ The APDS-9960 is a serious little piece of hardware with built in UV and IR bloc
 (`datasheet <https://cdn.sparkfun.com/datasheets/Sensors/Proximity/apds9960.pdf>`_).
 """
 
-import i2c
-import streams
+import threading
 
+try:
+    import i2c
+    import streams
+    import timers
 
-streams.serial()
+    streams.serial()
+except ImportError:
+    # Host Python (Linux single-board computers): use the i2c-dev backend
+    import i2cdev as i2c
+    from i2cdev import timers, sleep, thread
 
 
-new_exception(RuntimeErrorSet,ValueError,'Can not override values')
-new_exception(RuntimeErrorDel,ValueError,'Can not delete values')
-new_exception(ErrorReadingRegister,RuntimeError,'It was an error while reading the register')
-new_exception(ErrorWritingRegister,RuntimeError,'There was an error writing to the register')
-new_exception(ErrorDevice,RuntimeError,'Error device 0xFF')
+try:
+    new_exception(RuntimeErrorSet,ValueError,'Can not override values')
+    new_exception(RuntimeErrorDel,ValueError,'Can not delete values')
+    new_exception(ErrorReadingRegister,RuntimeError,'It was an error while reading the register')
+    new_exception(ErrorWritingRegister,RuntimeError,'There was an error writing to the register')
+    new_exception(ErrorDevice,RuntimeError,'Error device 0xFF')
+except NameError:
+    from i2cdev import RuntimeErrorSet, RuntimeErrorDel, ErrorReadingRegister, ErrorWritingRegister, ErrorDevice
 
 
 
@@ -36,6 +46,9 @@ APDS9960_I2C_ADDR  =     0x39
 GESTURE_THRESHOLD_OUT =  10
 GESTURE_SENSITIVITY_1 =  50
 GESTURE_SENSITIVITY_2 =  20
+GESTURE_FRACTION_BITS =  8       # Fixed point fraction bits of the gesture ratios (in %)
+GESTURE_FULL_SAMPLES  =  16      # FIFO datasets for full gesture confidence
+GESTURE_FEATURES      =  13      # Values of GestureFeatures.values()
 
 #Error code for returned values 
 ERROR      =             0xFF
@@ -46,6 +59,11 @@ APDS9960_ID_2   =        0x9C
 
 #Misc parameters 
 FIFO_PAUSE_TIME =        30      # Wait period (ms) between FIFO reads
+FIFO_MIN_PAUSE  =        4       # Adaptive FIFO drain pause limits (ms)
+FIFO_MAX_PAUSE  =        100
+FIFO_SIZE       =        32      # Gesture FIFO datasets
+FIFO_LOW_WATERMARK  =    8       # Default FIFO level window of the adaptive drain
+FIFO_HIGH_WATERMARK =    24
 
 #APDS-9960 register addresses 
 APDS9960_ENABLE =        0x80
@@ -107,6 +125,9 @@ APSD9960_AIEN       =   0b00010000
 APDS9960_PIEN       =   0b00100000
 APDS9960_GEN        =   0b01000000
 APDS9960_GVALID     =   0b00000001
+APDS9960_GFOV       =   0b00000010
+APDS9960_GFIFO_CLR  =   0b00000100   # GCONF4: clears the gesture FIFO
+APDS9960_WLONG      =   0b00000010   # CONFIG1: 12x wait factor
 
 #On/Off definitions 
 OFF                 =    0
@@ -162,6 +183,15 @@ GWTIME_22_4MS        =   5
 GWTIME_30_8MS        =   6
 GWTIME_39_2MS        =   7
 
+#Gesture wait time in ms for each GWTIME value 
+GWTIME_MS            =  [0, 2.8, 5.6, 8.4, 14.0, 22.4, 30.8, 39.2]
+PULSE_LEN_US         =  [4, 8, 16, 32]
+
+#Timing of the ALS/proximity state machine 
+CYCLE_STEP_MS        =  2.78    # One ATIME/WTIME step
+WLONG_FACTOR         =  12      # WTIME multiplier when WLONG is set
+PROX_TIME_MS         =  2.78    # Estimated proximity conversion time
+
 #Default values 
 DEFAULT_ATIME        =   219     # 103ms
 DEFAULT_WTIME        =   246     # 27ms
@@ -191,6 +221,26 @@ DEFAULT_GPULSE        =  0xC9    # 32us, 10 pulses
 DEFAULT_GCONF3        =  0       # All photodiodes active during gesture
 DEFAULT_GIEN          =  0       # Disable gesture interrupts
 
+#LED current of each LED drive value (in 0.1 mA) and LED boost value (in %) 
+LED_DRIVE_CURRENT     =  [1000, 500, 250, 125]
+LED_BOOST_PERCENT     =  [100, 150, 200, 300]
+
+#Proximity photodiode masks (1 = disabled) 
+PMASK_UR              =  0b0110  # Only UP and RIGHT active
+PMASK_DL              =  0b1001  # Only DOWN and LEFT active
+PMASK_U               =  0b0111  # Only UP active
+PMASK_D               =  0b1011  # Only DOWN active
+PMASK_L               =  0b1101  # Only LEFT active
+PMASK_R               =  0b1110  # Only RIGHT active
+PMASK_UD              =  0b0011  # Only UP and DOWN active
+PMASK_LR              =  0b1100  # Only LEFT and RIGHT active
+
+#Proximity offset calibration 
+PROX_CAL_FLOOR        =  4       # No-target PDATA after calibration
+PROX_CAL_SETTLE       =  30      # Wait (ms) for a new proximity conversion
+GESTURE_CAL_FLOOR     =  4       # No-target gesture datasets after calibration
+GESTURE_CAL_SETTLE    =  20      # Wait (ms) for new gesture datasets
+
 #Direction definitions 
 
 DIR_NONE = 'DIR_NONE'
@@ -212,6 +262,34 @@ FAR_STATE = 'FAR_STATE'
 ALL_STATE = 'ALL_STATE'
 
 
+def _toSignMagnitude(value):
+    # Offset registers: bit 7 is the sign, bits 6:0 the magnitude
+    if value < 0:
+        return 0x80 | (-value & 0x7F)
+    return value & 0x7F
+
+def _fromSignMagnitude(reg):
+    if reg & 0x80:
+        return -(reg & 0x7F)
+    return reg & 0x7F
+
+# Reciprocal table of the 9-bit sums of a photodiode pair: 100% / sum in Q16,
+# so that (a - b) * 100 / (a + b) is a multiply and a shift
+_RECIPROCAL = [0] + [((100 << 16) + n // 2) // n for n in range(1, 511)]
+
+def _waitSettings(period):
+    # WTIME value, WLONG flag and actual wait (ms) closest to a wait period
+    steps = int(period / CYCLE_STEP_MS)
+    if steps <= 256:
+        if steps < 1:
+            steps = 1
+        return (256 - steps, 0, steps * CYCLE_STEP_MS)
+    steps = int(period / (CYCLE_STEP_MS * WLONG_FACTOR))
+    if steps > 256:
+        steps = 256
+    return (256 - steps, 1, steps * CYCLE_STEP_MS * WLONG_FACTOR)
+
+
 class gesture_data_type():
     def __init__(self):
         self.u_data=[0 for x in range(32)]
@@ -223,556 +301,390 @@ class gesture_data_type():
         self.in_threshold = 0
         self.out_threshold = 0
 
-class APDS9960(i2c.I2C):
+class GestureResult():
     """
-    ==================
-    The APDS9960 class
-    ==================
-
-.. class:: APDS9960(drivername)
+    =======================
+    The GestureResult class
+    =======================
+
+.. class:: GestureResult(direction, confidence, runner_up, samples=0, lag=0)
+
+    A decoded gesture, see :meth:`APDS9960.getGestureResult`.
+
+    ``direction`` is the value returned by :meth:`APDS9960.readGesture`, ``confidence``
+    a 0-100 score and ``runner_up`` the second most likely direction (``DIR_NONE`` if
+    there is none). For swipes the score grows with the winning delta (50 at the
+    sensitivity threshold, 100 at twice it), shrinks as the other axis delta gets
+    close to it, and is scaled down when fewer than ``GESTURE_FULL_SAMPLES`` FIFO
+    datasets were seen.
+
+    ``samples`` is the number of FIFO datasets of the gesture and ``lag`` the datasets
+    between the peaks of the two photodiodes of the gesture axis. Results of
+    :meth:`APDS9960.readGesture` also have the ``start`` and ``end`` times (ms,
+    :func:`timers.now`) of the first and last dataset, the ``period`` (ms) between
+    datasets, measured over the gesture or estimated from GWTIME and GPULSE, and the
+    ``velocity`` in photodiode spacings per second (0 when unknown).
      """
-     
-     
-    def __init__(self, i2cdrv, addr=0x39, clk=100000):
-        try:
-            i2c.I2C.__init__(self,i2cdrv,addr,clk)
-            self._addr = addr
-            self.start()
-            self.gesture_ud_delta_ = 0
-            self.gesture_lr_delta_ = 0
-        
-            self.gesture_ud_count_ = 0
-            self.gesture_lr_count_ = 0
-        
-            self.gesture_near_count_ = 0
-            self.gesture_far_count_ = 0
-        
-            self.gesture_state_ = 0
-            self.gesture_motion_ = DIR_NONE
-            self.gesture_data_= gesture_data_type()
-        except Exception as e:
-            print(e)
-
-    def printRegister(self):
-
-        try:
-            self._printDEBUG('APDS9960_ENABLE',self.write_read(APDS9960_ENABLE, 1)[0])
-            self._printDEBUG('APDS9960_CONFIG1',self.write_read(APDS9960_CONFIG1, 1)[0])
-
-            self._printDEBUG('APDS9960_CONTROL',self.write_read(APDS9960_CONTROL, 1)[0])
-            self._printDEBUG('APDS9960_CONFIG2',self.write_read(APDS9960_CONFIG2, 1)[0])
-            self._printDEBUG('APDS9960_STATUS',self.write_read(APDS9960_STATUS, 1)[0])
-            self._printDEBUG('APDS9960_CONFIG3',self.write_read(APDS9960_CONFIG3, 1)[0])
-            self._printDEBUG('APDS9960_GCONF3',self.write_read(APDS9960_GCONF3, 1)[0])
-            self._printDEBUG('APDS9960_GCONF4',self.write_read(APDS9960_GCONF4, 1)[0])
-            self._printDEBUG('APDS9960_GCONF2',self.write_read(APDS9960_GCONF2, 1)[0])
-          
-        except:
-            raise ErrorReadingRegister
-        
-
 
+    def __init__(self, direction, confidence, runner_up, samples=0, lag=0):
+        self.direction = direction
+        self.confidence = confidence
+        self.runner_up = runner_up
+        self.samples = samples
+        self.lag = lag
+        self.start = None
+        self.end = None
+        self.period = 0
+        self.velocity = 0
+
+    def _setTiming(self, start, end, period):
+        self.start = start
+        self.end = end
+        self.period = period
+        if self.lag > 0 and period > 0:
+            self.velocity = int(1000 / (self.lag * period))
+
+def _peakLag(direction, index):
+    # Datasets between the peaks of the photodiodes of the gesture axis,
+    # index holding the dataset index of the U, D, L and R peaks
+    ud = abs(index[1] - index[0])
+    lr = abs(index[3] - index[2])
+    if direction == DIR_UP or direction == DIR_DOWN:
+        return ud
+    if direction == DIR_LEFT or direction == DIR_RIGHT:
+        return lr
+    return max(ud, lr)
+
+def _noDebug(*msg):
+    pass
+
+def _pairRatio(a, b):
+    # (a - b) * 100 / (a + b) in GESTURE_FRACTION_BITS fixed point
+    return ((a - b) * _RECIPROCAL[a + b]) >> (16 - GESTURE_FRACTION_BITS)
+
+def _rateMotion(motion, ud_delta, lr_delta, samples, near_count=0):
+    # GestureResult of a decoded motion: confidence from the fixed point UD/LR deltas
+    # (near/far from the near count) scaled by the sample count, runner-up from the other axis
+    ud = abs(ud_delta)
+    lr = abs(lr_delta)
+    if ud_delta < 0:
+        ud_dir = DIR_UP
+    else:
+        ud_dir = DIR_DOWN
+    if lr_delta < 0:
+        lr_dir = DIR_LEFT
+    else:
+        lr_dir = DIR_RIGHT
+
+    if motion == DIR_UP or motion == DIR_DOWN:
+        primary = ud
+        secondary = lr
+        runner_up = lr_dir
+    elif motion == DIR_LEFT or motion == DIR_RIGHT:
+        primary = lr
+        secondary = ud
+        runner_up = ud_dir
+    else:
+        primary = 0
+        secondary = max(ud, lr)
+        if ud >= lr:
+            runner_up = ud_dir
+        else:
+            runner_up = lr_dir
+    if secondary == 0:
+        runner_up = DIR_NONE
+
+    if motion == DIR_NEAR or motion == DIR_FAR:
+        score = min(100, near_count * 10)
+    elif primary > 0:
+        sensitivity = GESTURE_SENSITIVITY_1 << GESTURE_FRACTION_BITS
+        score = min(100, (primary * 50) // sensitivity) * ((primary - secondary) * 100 // primary) // 100
+    else:
+        score = 0
+    return GestureResult(motion, (score * min(samples, GESTURE_FULL_SAMPLES)) // GESTURE_FULL_SAMPLES, runner_up, samples)
+
+def _swipeResult(ud_delta, lr_delta, samples):
+    # GestureResult of a swipe from fixed point UD/LR deltas, with the
+    # decision rules of HeuristicDecoder._decodeGesture()
+    sensitivity = GESTURE_SENSITIVITY_1 << GESTURE_FRACTION_BITS
+    ud = abs(ud_delta)
+    lr = abs(lr_delta)
+    if ud < sensitivity and lr < sensitivity:
+        direction = DIR_NONE
+    elif lr < sensitivity or (ud >= sensitivity and ud > lr):
+        if ud_delta < 0:
+            direction = DIR_UP
+        else:
+            direction = DIR_DOWN
+    elif lr_delta < 0:
+        direction = DIR_LEFT
+    else:
+        direction = DIR_RIGHT
+    return _rateMotion(direction, ud_delta, lr_delta, samples)
+
+class GestureFeatures():
+    """
+    =========================
+    The GestureFeatures class
+    =========================
 
-    def initialize(self):
-
-        try:
-
-       
-            # Read ID register and check against known values for APDS-9960 */
-            if (self.get_device_id()!= 0xAB):
-                return False
+.. class:: GestureFeatures(threshold=GESTURE_THRESHOLD_OUT)
 
-            # Set ENABLE register to 0 (disable all features) */
-            self.setMode(ALL, OFF)
+    Online summary of a gesture session, the input of trained gesture models.
 
-            # Set default values for ambient light and proximity registers */
-            self._write_bytes(APDS9960_ATIME, DEFAULT_ATIME)
-            self._write_bytes(APDS9960_WTIME, DEFAULT_WTIME)
-            self._write_bytes(APDS9960_PPULSE, DEFAULT_PROX_PPULSE)
-            self._write_bytes(APDS9960_POFFSET_UR, DEFAULT_POFFSET_UR)#
-            self._write_bytes(APDS9960_POFFSET_DL, DEFAULT_POFFSET_DL)#
-            self._write_bytes(APDS9960_CONFIG1, DEFAULT_CONFIG1)#
-        
-            self.setLEDDrive(DEFAULT_LDRIVE)#APDS9960_CONTROL
-            
-            self.setProximityGain(DEFAULT_PGAIN)#APDS9960_CONTROL
-            
-            self.setAmbientLightGain(DEFAULT_AGAIN)
-            
-            self.setProxIntLowThresh(DEFAULT_PILT)
-            
-            self.setProxIntHighThresh(DEFAULT_PIHT)
-            
-            self.setLightIntLowThreshold(DEFAULT_AILT)
-            
-            self.setLightIntHighThreshold(DEFAULT_AIHT)
-            
-            self._write_bytes(APDS9960_PERS, DEFAULT_PERS)
-            
-            self._write_bytes(APDS9960_CONFIG2, DEFAULT_CONFIG2)
-            
-            self._write_bytes(APDS9960_CONFIG3, DEFAULT_CONFIG3)
-            
-            # Set default values for gesture sense registers */
-            self.setGestureEnterThresh(DEFAULT_GPENTH)
-            
-            self.setGestureExitThresh(DEFAULT_GEXTH)
-            
-            self._write_bytes(APDS9960_GCONF1, DEFAULT_GCONF1)
-            
-            self.setGestureGain(DEFAULT_GGAIN)
-            
-            self.setGestureLEDDrive(DEFAULT_GLDRIVE)
-            
-            self.setGestureWaitTime(DEFAULT_GWTIME)
-            
-            self._write_bytes(APDS9960_GOFFSET_U, DEFAULT_GOFFSET)
-            
-            self._write_bytes(APDS9960_GOFFSET_D, DEFAULT_GOFFSET)
-            
-            self._write_bytes(APDS9960_GOFFSET_L, DEFAULT_GOFFSET)
-            
-            self._write_bytes(APDS9960_GOFFSET_R, DEFAULT_GOFFSET)
-            
-            self._write_bytes(APDS9960_GPULSE, DEFAULT_GPULSE)
-            
-            self._write_bytes(APDS9960_GCONF3, DEFAULT_GCONF3)
-            
-            self.setGestureIntEnable(DEFAULT_GIEN)
+    Datasets with all four channels above ``threshold`` are accumulated in a
+    fixed number of integers. :meth:`values` returns the ``GESTURE_FEATURES``
+    integer features: first, last and peak-energy UP/DOWN and LEFT/RIGHT ratios (%),
+    their last-first deltas, the peak energy, the number of datasets, the peak
+    position and the lags between the peaks of the opposite photodiodes (% of the
+    session). The same class extracts the features on the host for training.
+     """
 
-        except Exception as e:
-            print(e)
-        
-    def get_device_id(self):
-        n = self.write_read(APDS9960_ID, 1)
-        return n[0]
+    def __init__(self, threshold=GESTURE_THRESHOLD_OUT):
+        self.threshold = threshold
+        self.reset()
 
-    def getMode(self):
-        """ 
-            .. method:: getMode()
-            
-                Reads and returns the contents of the ENABLE register
+    def reset(self):
         """
-        
-        try:
-            enable_value = self.write_read(APDS9960_ENABLE, 1)[0]
-        except:
-            raise ErrorReadingRegister
-        
-        return enable_value
+            .. method:: reset()
 
-    
-    def setMode(self, mode, enable):
-        """ 
-            .. method:: setMode(mode, enable)
-            
-                Enables or disables a feature in the APDS-9960
-                
-                mode: 
-                    feature to enable  
-                
-                enable:
-                    ON (1) or OFF (0)
+                Starts a new session
         """
+        self.count = 0
+        self._first = None
+        self._last = None
+        self._peak = None
+        self._peakEnergy = 0
+        self._peakIndex = 0
+        # Index and value of the peak of each photodiode
+        self._channelPeak = [0, 0, 0, 0]
+        self._channelIndex = [0, 0, 0, 0]
+
+    def feed(self, u, d, l, r):
+        """
+            .. method:: feed(u, d, l, r)
 
-        reg_val = self.getMode()
-
-        if reg_val == ERROR :
-            raise ErrorDevice
-        
-        # Change bit(s) in ENABLE register */
-        enable = enable & 0x01
-        if mode >= 0 and mode <= 6 :
-            if (enable):
-                reg_val |= (1 << mode)
-            else: 
-                reg_val &= ~(1 << mode)
-            
-        elif mode == ALL:
-            if (enable): 
-                reg_val = 0x7F
-            else: 
-                reg_val = 0x00
-        
-        self._write_bytes(APDS9960_ENABLE,reg_val)
-       
-
-    def enableLightSensor(self, interrupts):
+                Adds one dataset
         """
-            .. method:: enableLightSensor(interrupts)
-            
-                Starts the light (R/G/B/Ambient) sensor on the APDS-9960
-                
-                interrupts:
-                    True to enable hardware interrupt on high or low light
+        threshold = self.threshold
+        if u <= threshold or d <= threshold or l <= threshold or r <= threshold:
+            return
+        sample = (u, d, l, r)
+        if self._first is None:
+            self._first = sample
+        self._last = sample
+        energy = u + d + l + r
+        if energy > self._peakEnergy:
+            self._peakEnergy = energy
+            self._peak = sample
+            self._peakIndex = self.count
+        for k in range(4):
+            if sample[k] > self._channelPeak[k]:
+                self._channelPeak[k] = sample[k]
+                self._channelIndex[k] = self.count
+        self.count += 1
+
+    def feedFifo(self, fifo_data, fifo_level):
         """
+            .. method:: feedFifo(fifo_data, fifo_level)
 
-        # Set default gain, interrupts, enable power, and enable sensor */
-        self.setAmbientLightGain(DEFAULT_AGAIN) 
-        
-        if interrupts:
-            self.setAmbientLightIntEnable(1)
-        else: 
-            self.setAmbientLightIntEnable(0)
-                    
-        self.enablePower()
-        self.setMode(AMBIENT_LIGHT, 1)
-
-    def disableLightSensor(self):
+                Adds ``fifo_level`` interleaved U/D/L/R datasets
         """
-            .. method:: disableLightSensor()
+        for i in range(0, fifo_level * 4, 4):
+            self.feed(fifo_data[i], fifo_data[i + 1], fifo_data[i + 2], fifo_data[i + 3])
 
-                Ends the light sensor on the APDS-9960
+    def values(self):
         """
+            .. method:: values()
 
-        self.setAmbientLightIntEnable(0)
-        self.setMode(AMBIENT_LIGHT, 0)
+                Returns the list of the ``GESTURE_FEATURES`` integer features of the session
+        """
+        if self.count == 0:
+            return [0] * GESTURE_FEATURES
+        shift = GESTURE_FRACTION_BITS
+        first = self._first
+        last = self._last
+        peak = self._peak
+        n = self.count
+        ud_first = _pairRatio(first[0], first[1]) >> shift
+        lr_first = _pairRatio(first[2], first[3]) >> shift
+        ud_last = _pairRatio(last[0], last[1]) >> shift
+        lr_last = _pairRatio(last[2], last[3]) >> shift
+        index = self._channelIndex
+        return [
+            ud_first, lr_first, ud_last, lr_last,
+            ud_last - ud_first, lr_last - lr_first,
+            _pairRatio(peak[0], peak[1]) >> shift, _pairRatio(peak[2], peak[3]) >> shift,
+            self._peakEnergy >> 2, n, (self._peakIndex * 100) // n,
+            ((index[1] - index[0]) * 100) // n, ((index[3] - index[2]) * 100) // n,
+        ]
+
+class GestureTree():
+    """
+    =====================
+    The GestureTree class
+    =====================
+
+.. class:: GestureTree(feature, threshold, left, right, labels, purity=None)
+
+    Decision tree over :class:`GestureFeatures` values, stored as integer tables.
+    Node ``i`` goes to ``left[i]`` when ``values[feature[i]] <= threshold[i]``,
+    to ``right[i]`` otherwise. A leaf has ``feature[i] == -1`` and predicts
+    ``labels[threshold[i]]``; ``purity[i]`` is the percentage of the training
+    traces of the leaf that have its label. Without ``purity`` every leaf has 0.
+    The tables are generated on a host by the ``gesture_train`` module; install
+    the tree with :meth:`APDS9960.setGestureModel`.
+     """
 
-    def enableProximitySensor(self, interrupts):
-        """ 
-            .. method:: enableProximitySensor(interrupts)
+    def __init__(self, feature, threshold, left, right, labels, purity=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.labels = labels
+        self.purity = purity
+
+    def _leaf(self, values):
+        # Index of the leaf reached by a list of feature values
+        i = 0
+        feature = self.feature
+        threshold = self.threshold
+        while feature[i] >= 0:
+            if values[feature[i]] <= threshold[i]:
+                i = self.left[i]
+            else:
+                i = self.right[i]
+        return i
 
-                Starts the proximity sensor on the APDS-9960
-                
-                interrupts:
-                    True to enable hardware external interrupt on proximity
+    def predict(self, values):
         """
+            .. method:: predict(values)
 
-        # Set default gain, LED, interrupts, enable power, and enable sensor */
-        self.setProximityGain(DEFAULT_PGAIN)
-        self.setLEDDrive(DEFAULT_LDRIVE)
-       
-        if interrupts:
-            self.setProximityIntEnable(1)
-        else: 
-            self.setProximityIntEnable(0)
-            
-        self.enablePower()
-        self.setMode(PROXIMITY, 1)
+                Returns the label of a list of feature values
+        """
+        return self.labels[self.threshold[self._leaf(values)]]
 
-    def disableProximitySensor(self):
+    def classify(self, values):
         """
-            .. method:: disableProximitySensor()
-            
-                Ends the proximity sensor on the APDS-9960
+            .. method:: classify(values)
+
+                Returns a tuple (label, purity) for a list of feature values, the purity (0..100) of the leaf
+                being the share of its training traces with the label
         """
+        i = self._leaf(values)
+        if self.purity is None:
+            return (self.labels[self.threshold[i]], 0)
+        return (self.labels[self.threshold[i]], self.purity[i])
 
-        self.setProximityIntEnable(0)
-        self.setMode(PROXIMITY, 0)    
+class HeuristicDecoder():
+    """
+    ==========================
+    The HeuristicDecoder class
+    ==========================
 
+.. class:: HeuristicDecoder(debug=None)
 
-    def enableGestureSensor(self, interrupts):
-        """
-            .. method:: enableGestureSensor(interrupts)
+    The default gesture decoder of :meth:`APDS9960.readGesture`, derived from the
+    SparkFun library: first/last ratios of each FIFO read are accumulated into UP/DOWN
+    and LEFT/RIGHT deltas, and near/far events are counted.
 
-                Starts the gesture recognition engine on the APDS-9960
-                
-                * Enable gesture mode
-                * Set ENABLE to 0 (power off)
-                * Set WTIME to 0xFF
-                * Set AUX to LED_BOOST_300
-                * Enable PON, WEN, PEN, GEN in ENABLE
+    It is the reference of the decoder protocol of :meth:`APDS9960.setGestureDecoder`:
 
-        """ 
-        try:
-            self._resetGestureParameters()
-            self._write_bytes(APDS9960_WTIME, 0xFF)
-            
-            self._write_bytes(APDS9960_PPULSE, DEFAULT_GESTURE_PPULSE)
-        
-            self.setLEDBoost(LED_BOOST_300)
-    
-            if interrupts:
-                self.setGestureIntEnable(1)
-            else:
-                self.setGestureIntEnable(0)
-        
-            self.setGestureMode(1)
-            self.enablePower(self)
-            self.setMode(WAIT, 1)
-            self.setMode(PROXIMITY, 1)
-            self.setMode(GESTURE, 1)
-        
-        except Exception as e:
-            print(e)
-        
+    * ``reset()`` starts a new gesture session,
+    * ``feed(fifo_data, fifo_level)`` adds the datasets of a FIFO read,
+    * ``result()`` returns the :class:`GestureResult` so far; calling it again gives the same result.
 
+    ``debug`` is the print function of the debug messages.
+     """
 
+    def __init__(self, debug=None):
+        if debug is None:
+            debug = _noDebug
+        self._printDEBUG = debug
+        self.gesture_data_= gesture_data_type()
+        self.reset()
 
-    def disableGestureSensor(self):
-        """
-            .. method:: disableGestureSensor()
-            
-                Ends the gesture recognition engine on the APDS-9960
+    def reset(self):
         """
+            .. method:: reset()
 
-        self._resetGestureParameters()
-        self.setGestureIntEnable(0) 
-        self.setGestureMode(0)
-        self.setMode(GESTURE, 0)
-        
-        
-    def isGestureAvailable(self):
-        """ 
-            .. method:: isGestureAvailable()
-                
-                Determines if there is a gesture available for reading
-                
-                return:
-                    True if gesture available. False otherwise.
+                Starts a new gesture session
         """
-
-        #Read value from GSTATUS register
-        try:
-            val = self.write_read(APDS9960_GSTATUS, 1)[0]
-        except:
-             raise ErrorReadingRegister
-    
-        # Shift and mask out GVALID bit */
-        val &= APDS9960_GVALID
-        
-        # Return True/False based on GVALID bit */
-        if val == 1:
-            return True
-        else:
-            return False
+        self.gesture_data_.index = 0
+        self.gesture_data_.total_gestures = 0
     
-
-
-    def readGesture(self):
-        """ 
-            .. method:: readGesture()
-            
-                Processes a gesture event and returns best guessed gesture
-                
-                return:
-                    Number corresponding to gesture.
-        """
-
-        fifo_level = 0
-        fifo_data =[]
-        
-        # Make sure that power and gesture is on and data is valid */
-        mode= self.getMode() & 0b01000001
-        if not self.isGestureAvailable() or not mode:
-            self._printDEBUG(' Make sure that power and gesture is on and data is valid')
-            return DIR_NONE
-        
-        
-        # Keep looping as long as gesture data is valid */
-        while True:
-        
-            # Wait some time to collect next batch of FIFO data */
-            sleep(FIFO_PAUSE_TIME)
-            
-            # Get the contents of the STATUS register. Is data still valid? */
-            try:
-                gstatus = self.write_read(APDS9960_GSTATUS, 1)[0]
-            except:
-                raise ErrorReadingRegister
-            
-            
-            # If we have valid data, read in FIFO */
-            if (gstatus & APDS9960_GVALID) == APDS9960_GVALID:
-                 #Read the current FIFO level
-                try:
-                    fifo_level = self.write_read(APDS9960_GFLVL, 1)[0]
-                except:
-                    raise ErrorReadingRegister
-            
-
-                # If there's stuff in the FIFO, read it into our data block 
-                self._printDEBUG("FIFO Level: ", fifo_level)
-
-                if fifo_level > 0:
-
-                    try:
-                        fifo_data = self.write_read(APDS9960_GFIFO_U, fifo_level * 4)
-                    except:
-                        raise ErrorReadingRegister
-                    
-                    #self._printDEBUG("FIFO data: ", len(fifo_data))
-                    #self._printDEBUG("FIFO Dump: ",fifo_data)
-                    #sleep(1000)
-                    # If at least 1 set of data, sort the data into U/D/L/R */
-                    if len(fifo_data)>=4:
-                        for i  in range(0 ,len(fifo_data), 4):
-                            self.gesture_data_.u_data[self.gesture_data_.index]=fifo_data[i + 0]
-                            self.gesture_data_.d_data[self.gesture_data_.index]=fifo_data[i + 1]
-                            self.gesture_data_.l_data[self.gesture_data_.index]=fifo_data[i + 2]
-                            self.gesture_data_.r_data[self.gesture_data_.index]=fifo_data[i + 3]
-                            self.gesture_data_.index+=1
-                            self.gesture_data_.total_gestures+=1
-                            
-                            self._printDEBUG("Finding First:","U:",fifo_data[i + 0],"D:",fifo_data[i + 1],"L:",fifo_data[i + 2],"R:",fifo_data[i + 3])
-
-                        #self._printDEBUG("total_gestures: ",  self.gesture_data_.total_gestures)
-                        
-                        # # Filter and process gesture data. Decode near/far state */
-                        if self._processGestureData():
-                            if self._decodeGesture():
-                                self._printDEBUG()
-
-                        # Reset data */
-                        self.gesture_data_.index = 0
-                        self.gesture_data_.total_gestures = 0
-                        # self.gesture_data_.u_data=[]
-                        # self.gesture_data_.d_data=[]
-                        # self.gesture_data_.l_data=[]
-                        # self.gesture_data_.r_data=[]
-                    
-                
-            else: 
-               
-                #Determine best guessed gesture and clean up */
-                sleep(FIFO_PAUSE_TIME)
-                if not self._decodeGesture():
-                    self._printDEBUG('return decode False')
-
-                motion = self.gesture_motion_
+        self.gesture_ud_delta_ = 0
+        self.gesture_lr_delta_ = 0
     
+        self.gesture_ud_count_ = 0
+        self.gesture_lr_count_ = 0
     
-                self._printDEBUG("END: ")
-                self._printDEBUG(self.gesture_motion_)
-                self._printDEBUG(gstatus)
+        self.gesture_near_count_ = 0
+        self.gesture_far_count_ = 0
     
-                self._resetGestureParameters()
-                return motion
-
-    def enablePower(self):
-        """ 
-            .. method::enablePower()
-            
-                Turn the APDS-9960 on
-                
-        """
+        self.gesture_state_ = 0
+        self.gesture_motion_ = DIR_NONE
+        self.gesture_samples_ = 0
+        self._peak = [0, 0, 0, 0]
+        self._peakIndex = [0, 0, 0, 0]
 
-        self.setMode(POWER, 1)
-        
-        
-    def disablePower(self):
-        """
-            .. method::disablePower()
-                
-                Turn the APDS-9960 off
+    def feed(self, fifo_data, fifo_level):
         """
+            .. method:: feed(fifo_data, fifo_level)
 
-        self.setMode(POWER, 0)
-        
-
-
-# #******************************************************************************
-#  * Ambient light and color sensor controls
-#  ******************************************************************************/
-
-    def readAmbientLight(self):
-        """
-            .. method:: readAmbientLight()
-            
-                Reads the ambient (clear) light level as a 16-bit value
-                
-                return:
-                    the value of the light sensor.
+                Adds ``fifo_level`` interleaved U/D/L/R datasets of a FIFO read (``fifo_data`` can be longer)
         """
-        try:
-            valLow = self.write_read(APDS9960_CDATAL, 1)[0]
-            valHight = self.write_read(APDS9960_CDATAH, 1)[0]
-        except:
-            raise ErrorReadingRegister
+        if fifo_level > 0:
+
+            #self._printDEBUG("FIFO data: ", len(fifo_data))
+            #self._printDEBUG("FIFO Dump: ",fifo_data)
+            #sleep(1000)
+            # If at least 1 set of data, sort the data into U/D/L/R */
+            if len(fifo_data)>=4:
+                for i  in range(0 ,fifo_level * 4, 4):
+                    self.gesture_data_.u_data[self.gesture_data_.index]=fifo_data[i + 0]
+                    self.gesture_data_.d_data[self.gesture_data_.index]=fifo_data[i + 1]
+                    self.gesture_data_.l_data[self.gesture_data_.index]=fifo_data[i + 2]
+                    self.gesture_data_.r_data[self.gesture_data_.index]=fifo_data[i + 3]
+                    self.gesture_data_.index+=1
+                    self.gesture_data_.total_gestures+=1
+
+                    # Peak of each photodiode, for the gesture velocity
+                    for k in range(4):
+                        if fifo_data[i + k] > self._peak[k]:
+                            self._peak[k] = fifo_data[i + k]
+                            self._peakIndex[k] = self.gesture_samples_
+                    self.gesture_samples_+=1
                     
-        
-        return valLow + (valHight << 8)
-        
+                    self._printDEBUG("Finding First:","U:",fifo_data[i + 0],"D:",fifo_data[i + 1],"L:",fifo_data[i + 2],"R:",fifo_data[i + 3])
 
-
-    def readRedLight(self):
-        """
-            .. method:: readRedLight()
-                
-                Reads the red light level as a 16-bit value
+                #self._printDEBUG("total_gestures: ",  self.gesture_data_.total_gestures)
                 
-                return:
-                    the value of the light sensor.
+                # # Filter and process gesture data. Decode near/far state */
+                if self._processGestureData():
+                    if self._decodeGesture():
+                        self._printDEBUG()
+
+                # Reset data */
+                self.gesture_data_.index = 0
+                self.gesture_data_.total_gestures = 0
+                # self.gesture_data_.u_data=[]
+                # self.gesture_data_.d_data=[]
+                # self.gesture_data_.l_data=[]
+                # self.gesture_data_.r_data=[]
+
+    def result(self):
         """
-        
-      
-        try:
-            valLow = self.write_read(APDS9960_RDATAL, 1)[0]
-            valHight = self.write_read(APDS9960_RDATAH, 1)[0]
-        except:
-            raise ErrorReadingRegister
-                    
-        
-        return valLow + (valHight << 8)
+            .. method:: result()
 
-    def readGreenLight(self):
-        """
-            .. method:: readGreenLight()
-                
-                Reads the red light level as a 16-bit value
-                
-                return:
-                    the value of the light sensor.
-        """
-        
-      
-        try:
-        
-            valLow = self.write_read(APDS9960_GDATAL, 1)[0]
-            valHight = self.write_read(APDS9960_GDATAH, 1)[0]
-        except:
-            raise ErrorReadingRegister
-                    
-        
-        return valLow + (valHight << 8)
-        
-    
-    def readBlueLight(self):
-        """
-            .. method:: readBlueLight()
-                
-                Reads the red light level as a 16-bit value
-                
-                return:
-                    the value of the light sensor.
+                Returns the :class:`GestureResult` of the datasets fed so far
         """
-        
-        try:
-            valLow = self.write_read(APDS9960_BDATAL, 1)[0]
-            valHight = self.write_read(APDS9960_BDATAH, 1)[0]
-        except:
-            raise ErrorReadingRegister
-                    
-        
-        return valLow + (valHight << 8)
-        
-    
+        if not self._decodeGesture():
+            self._printDEBUG('return decode False')
+        result = _rateMotion(self.gesture_motion_, self.gesture_ud_delta_, self.gesture_lr_delta_, self.gesture_samples_, self.gesture_near_count_)
+        result.lag = _peakLag(result.direction, self._peakIndex)
+        return result
 
-
-#  ******************************************************************************
-#  * Proximity sensor controls
-#  ******************************************************************************/
-
-
-    def readProximity(self):
-        """
-            .. method:: readProximity()
-            
-                Reads the proximity level as an 8-bit value
-                
-                return:
-                    the value of the proximity sensor.
-        """
-        
-        try:
-            val = self.write_read(APDS9960_PDATA, 1)[0]
-        except:
-            raise ErrorReadingRegister
-                    
-        
-        return val
-   
-    
     def _processGestureData(self):
 
         u_first = 0
@@ -830,10 +742,13 @@ class APDS9960(i2c.I2C):
         
         
         # Calculate the first vs. last ratio of up/down and left/right */
-        ud_ratio_first = ((u_first - d_first) * 100) / (u_first + d_first)
-        lr_ratio_first = ((l_first - r_first) * 100) / (l_first + r_first)
-        ud_ratio_last = ((u_last - d_last) * 100) / (u_last + d_last)
-        lr_ratio_last = ((l_last - r_last) * 100) / (l_last + r_last)
+        # Fixed point (GESTURE_FRACTION_BITS) percentages with the reciprocal table:
+        # decisions match the floating point ratios unless an accumulated delta is
+        # within 1% / 2**(GESTURE_FRACTION_BITS - 1) of a sensitivity threshold
+        ud_ratio_first = _pairRatio(u_first, d_first)
+        lr_ratio_first = _pairRatio(l_first, r_first)
+        ud_ratio_last = _pairRatio(u_last, d_last)
+        lr_ratio_last = _pairRatio(l_last, r_last)
            
         self._printDEBUG("Last Values:","U:", u_last,"D:",d_last,"L:", l_last,"R:", r_last)
         self._printDEBUG("Ratios:","UD First:",ud_ratio_first,"UD Last:" , ud_ratio_last,"LR Fi:", lr_ratio_first,"LR La:", lr_ratio_last)
@@ -843,6 +758,12 @@ class APDS9960(i2c.I2C):
         ud_delta = ud_ratio_last - ud_ratio_first;
         lr_delta = lr_ratio_last - lr_ratio_first;
 
+        # Exact zero tests: equal ratios by cross multiplication, free of rounding */
+        ud_still = (u_last - d_last) * (u_first + d_first) == (u_first - d_first) * (u_last + d_last)
+        lr_still = (l_last - r_last) * (l_first + r_first) == (l_first - r_first) * (l_last + r_last)
+        sensitivity_1 = GESTURE_SENSITIVITY_1 << GESTURE_FRACTION_BITS
+        sensitivity_2 = GESTURE_SENSITIVITY_2 << GESTURE_FRACTION_BITS
+
         self._printDEBUG("Deltas:","UD: " ,ud_delta,"LR: " , lr_delta)
 
         #Accumulate the UD and LR delta values */
@@ -853,18 +774,18 @@ class APDS9960(i2c.I2C):
 
         
         # Determine U/D gesture */
-        if self.gesture_ud_delta_ >= GESTURE_SENSITIVITY_1:
+        if self.gesture_ud_delta_ >= sensitivity_1:
             self.gesture_ud_count_ = 1
-        elif self.gesture_ud_delta_ <= -GESTURE_SENSITIVITY_1:
+        elif self.gesture_ud_delta_ <= -sensitivity_1:
             self.gesture_ud_count_ = -1
         else:
             self.gesture_ud_count_ = 0
         
         
         # Determine L/R gesture */
-        if self.gesture_lr_delta_ >= GESTURE_SENSITIVITY_1:
+        if self.gesture_lr_delta_ >= sensitivity_1:
             self.gesture_lr_count_ = 1
-        elif self.gesture_lr_delta_ <= -GESTURE_SENSITIVITY_1:
+        elif self.gesture_lr_delta_ <= -sensitivity_1:
             self.gesture_lr_count_ = -1
         else: 
             self.gesture_lr_count_ = 0
@@ -872,27 +793,27 @@ class APDS9960(i2c.I2C):
         
         # Determine Near/Far gesture */
         if (self.gesture_ud_count_ == 0) and (self.gesture_lr_count_ == 0): 
-            if (abs(ud_delta) < GESTURE_SENSITIVITY_2) and (abs(lr_delta) < GESTURE_SENSITIVITY_2): 
+            if (abs(ud_delta) < sensitivity_2) and (abs(lr_delta) < sensitivity_2): 
                 
-                if (ud_delta == 0) and (lr_delta == 0): 
+                if ud_still and lr_still: 
                     self.gesture_near_count_+=1
-                elif ud_delta != 0 or lr_delta != 0: 
+                elif not ud_still or not lr_still: 
                     self.gesture_far_count_+=1
                 
                 
                 if (self.gesture_near_count_ >= 10) and (self.gesture_far_count_ >= 2): 
-                    if (ud_delta == 0) and (lr_delta == 0): 
+                    if ud_still and lr_still: 
                         self.gesture_state_ = NEAR_STATE
-                    elif ud_delta != 0 and lr_delta != 0: 
+                    elif not ud_still and not lr_still: 
                         self.gesture_state_ = FAR_STATE
                     
                     return True
                 
             
         else: 
-            if (abs(ud_delta) < GESTURE_SENSITIVITY_2) and (abs(lr_delta) < GESTURE_SENSITIVITY_2): 
+            if (abs(ud_delta) < sensitivity_2) and (abs(lr_delta) < sensitivity_2): 
                     
-                if (ud_delta == 0) and (lr_delta == 0): 
+                if ud_still and lr_still: 
                     self.gesture_near_count_+=1
                 
                 
@@ -908,7 +829,6 @@ class APDS9960(i2c.I2C):
 
         return False
 
-
     def _decodeGesture(self):
 
 
@@ -982,1238 +902,4315 @@ class APDS9960(i2c.I2C):
             print(e)
             return False
 
-    def _resetGestureParameters(self):
-        #Resets all the parameters in the gesture data member
+class ModelDecoder():
+    """
+    ======================
+    The ModelDecoder class
+    ======================
 
-        self.gesture_data_.index = 0
-        self.gesture_data_.total_gestures = 0
-    
-        self.gesture_ud_delta_ = 0
-        self.gesture_lr_delta_ = 0
-    
-        self.gesture_ud_count_ = 0
-        self.gesture_lr_count_ = 0
-    
-        self.gesture_near_count_ = 0
-        self.gesture_far_count_ = 0
-    
-        self.gesture_state_ = 0
-        self.gesture_motion_ = DIR_NONE
+.. class:: ModelDecoder(model, threshold=GESTURE_THRESHOLD_OUT)
 
+    Gesture decoder of a trained model (e.g. a :class:`GestureTree`): the session is summarized by
+    a :class:`GestureFeatures` and ``model.predict(values)`` gives the gesture. A model with a
+    ``classify(values)`` method returning (label, purity) also gives the confidence of the result:
+    the purity, scaled down like the heuristic one while fewer than ``GESTURE_FULL_SAMPLES``
+    datasets were fed. Otherwise the confidence is 0. See :class:`HeuristicDecoder` for the protocol.
+     """
 
-# #******************************************************************************
-#  * Getters and setters for register values
-#  ******************************************************************************/
+    def __init__(self, model, threshold=GESTURE_THRESHOLD_OUT):
+        self.model = model
+        self.features = GestureFeatures(threshold)
+        try:
+            self._classify = model.classify
+        except AttributeError:
+            # Label only models
+            self._classify = None
 
-    def getProxIntLowThresh(self):
-        """
-            .. method:: getProxIntLowThresh()
-            
-                Returns the lower threshold for proximity detection
-            
+    def reset(self):
         """
-        
-        try:
-            val = self.write_read(APDS9960_PILT, 1)[0]
-        except:
-            raise ErrorReadingRegister
-                    
-        
-        return val
-  
-    def setProxIntLowThresh(self, threshold):
+            .. method:: reset()
+
+                Starts a new gesture session
         """
-            .. method:: getProxIntLowThresh(threshold)
-                
-                Sets the lower threshold for proximity detection
+        self.features.reset()
+
+    def feed(self, fifo_data, fifo_level):
         """
-        
-        
-        self._write_bytes(APDS9960_PILT, threshold)
-        
- 
+            .. method:: feed(fifo_data, fifo_level)
 
+                Adds ``fifo_level`` interleaved U/D/L/R datasets of a FIFO read
+        """
+        self.features.feedFifo(fifo_data, fifo_level)
 
-    def getProxIntHighThresh(self):
+    def result(self):
         """
-            .. method:: getProxIntHighThresh()
-            
-                Returns the high threshold for proximity detection
-            
+            .. method:: result()
+
+                Returns the :class:`GestureResult` of the datasets fed so far
         """
-        
-        try:
-            val = self.write_read(APDS9960_PIHT, 1)[0]
-        except:
-            raise ErrorReadingRegister
-                    
-        return val
+        samples = self.features.count
+        if self._classify is None:
+            direction = self.model.predict(self.features.values())
+            purity = 0
+        else:
+            direction, purity = self._classify(self.features.values())
+        confidence = (purity * min(samples, GESTURE_FULL_SAMPLES)) // GESTURE_FULL_SAMPLES
+        return GestureResult(direction, confidence, DIR_NONE, samples, _peakLag(direction, self.features._channelIndex))
 
+class _Transaction():
+    # Context manager holding the device lock, see APDS9960.transaction()
+    def __init__(self, lock):
+        self._lock = lock
 
-    def setProxIntHighThresh(self, threshold):
-        """
-            .. method:: setProxIntHighThresh(threshold)
-            
-                Sets the high threshold for proximity detection
-            
-        """
+    def __enter__(self):
+        self._lock.acquire()
+        return self
 
-        self._write_bytes(APDS9960_PIHT, threshold)
-            
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._lock.release()
+        return False
 
-    def getLEDDrive(self):
-        """
-            .. method:: getLEDDrive()
-                
-                Returns LED drive strength for proximity and ALS
-                
-                +---------+---------------+
-                |  Value  |  LED Current  |
-                +---------+---------------+
-                |    0    |    100 mA     |
-                +---------+---------------+
-                |    1    |     50 mA     |
-                +---------+---------------+
-                |    2    |     25 mA     |
-                +---------+---------------+
-                |    3    |     12.5 mA   |
-                +---------+---------------+
-                
-        """
+class APDS9960(i2c.I2C):
+    """
+    ==================
+    The APDS9960 class
+    ==================
+
+.. class:: APDS9960(drivername, addr=0x39, clk=100000, bus=None)
 
+    ``bus`` replaces the Zerynth I2C driver with another bus backend, e.g. an
+    :class:`i2cdev.I2CDev` on Linux. The backend needs the ``start()``,
+    ``write_read(reg, n)`` and ``write_bytes(*data)`` methods.
+     """
+     
+     
+    def __init__(self, i2cdrv, addr=0x39, clk=100000, bus=None):
         try:
-            val = self.write_read(APDS9960_CONTROL, 1)[0]
+            if bus is None:
+                i2c.I2C.__init__(self,i2cdrv,addr,clk)
+            else:
+                # Pluggable backend, e.g. i2cdev.I2CDev on Linux
+                self.bus = bus
+                self.write_read = bus.write_read
+                self.write_bytes = bus.write_bytes
+                self.start = bus.start
+            self._addr = addr
+            self.start()
+            self._decoder = HeuristicDecoder(self._printDEBUG)
+            self.gesture_result_ = GestureResult(DIR_NONE, 0, DIR_NONE)
+            self._shadow = {}
+            self._lock = threading.RLock()
+            self._irFactor = 0
+            self._fifoPause = FIFO_PAUSE_TIME
+            self._fifoLow = FIFO_LOW_WATERMARK
+            self._fifoHigh = FIFO_HIGH_WATERMARK
+            self._fifoLast = None
+            self.fifo_overflows = 0
+            self._gestureStart = None
+            self._fifoBuf = bytearray(FIFO_SIZE * 4)
+            self._fifoChunk = FIFO_SIZE * 4
+            self._chunkStats = {}
+            if bus is not None:
+                try:
+                    self.setFifoChunk(bus.max_transfer)
+                except AttributeError:
+                    pass
+        except Exception as e:
+            print(e)
+
+    def printRegister(self):
+
+        try:
+            self._printDEBUG('APDS9960_ENABLE',self.write_read(APDS9960_ENABLE, 1)[0])
+            self._printDEBUG('APDS9960_CONFIG1',self.write_read(APDS9960_CONFIG1, 1)[0])
+
+            self._printDEBUG('APDS9960_CONTROL',self.write_read(APDS9960_CONTROL, 1)[0])
+            self._printDEBUG('APDS9960_CONFIG2',self.write_read(APDS9960_CONFIG2, 1)[0])
+            self._printDEBUG('APDS9960_STATUS',self.write_read(APDS9960_STATUS, 1)[0])
+            self._printDEBUG('APDS9960_CONFIG3',self.write_read(APDS9960_CONFIG3, 1)[0])
+            self._printDEBUG('APDS9960_GCONF3',self.write_read(APDS9960_GCONF3, 1)[0])
+            self._printDEBUG('APDS9960_GCONF4',self.write_read(APDS9960_GCONF4, 1)[0])
+            self._printDEBUG('APDS9960_GCONF2',self.write_read(APDS9960_GCONF2, 1)[0])
+          
         except:
             raise ErrorReadingRegister
-                    
+        
 
-         # Shift and mask out LED drive bits */
-        return (val >> 6) & 0b00000011
 
-    def setLEDDrive(self, drive):
-        """
-            .. method:: setLEDDrive(drive)
-                
-                brief Sets the LED drive strength for proximity and ALS
-                
-                drive:
-                    the value (0-3) for the LED drive strength
-                 
-                +---------+---------------+
-                |  Value  |  LED Current  |
-                +---------+---------------+
-                |    0    |    100 mA     |
-                +---------+---------------+
-                |    1    |     50 mA     |
-                +---------+---------------+
-                |    2    |     25 mA     |
-                +---------+---------------+
-                |    3    |     12.5 mA   |
-                +---------+---------------+
-                 
-                 
-                 
-        """
+
+    def initialize(self):
 
         try:
-            val = self.write_read(APDS9960_CONTROL, 1)[0]
-        except:
-            raise ErrorReadingRegister 
 
+       
+            # Read ID register and check against known values for APDS-9960 */
+            if (self.get_device_id()!= 0xAB):
+                return False
+
+            # Set ENABLE register to 0 (disable all features) */
+            self.setMode(ALL, OFF)
+
+            # Set default values for ambient light and proximity registers */
+            self._write_bytes(APDS9960_ATIME, DEFAULT_ATIME)
+            self._write_bytes(APDS9960_WTIME, DEFAULT_WTIME)
+            self._write_bytes(APDS9960_PPULSE, DEFAULT_PROX_PPULSE)
+            self._write_bytes(APDS9960_POFFSET_UR, DEFAULT_POFFSET_UR)#
+            self._write_bytes(APDS9960_POFFSET_DL, DEFAULT_POFFSET_DL)#
+            self._write_bytes(APDS9960_CONFIG1, DEFAULT_CONFIG1)#
         
-    
-        # Set bits in register to given value */
-        drive &= 0b00000011
-        drive = drive << 6
-        val &= 0b00111111
-        val |= drive
+            self.setLEDDrive(DEFAULT_LDRIVE)#APDS9960_CONTROL
+            
+            self.setProximityGain(DEFAULT_PGAIN)#APDS9960_CONTROL
+            
+            self.setAmbientLightGain(DEFAULT_AGAIN)
+            
+            self.setProxIntLowThresh(DEFAULT_PILT)
+            
+            self.setProxIntHighThresh(DEFAULT_PIHT)
+            
+            self.setLightIntLowThreshold(DEFAULT_AILT)
+            
+            self.setLightIntHighThreshold(DEFAULT_AIHT)
+            
+            self._write_bytes(APDS9960_PERS, DEFAULT_PERS)
+            
+            self._write_bytes(APDS9960_CONFIG2, DEFAULT_CONFIG2)
+            
+            self._write_bytes(APDS9960_CONFIG3, DEFAULT_CONFIG3)
+            
+            # Set default values for gesture sense registers */
+            self.setGestureEnterThresh(DEFAULT_GPENTH)
+            
+            self.setGestureExitThresh(DEFAULT_GEXTH)
+            
+            self._write_bytes(APDS9960_GCONF1, DEFAULT_GCONF1)
+            
+            self.setGestureGain(DEFAULT_GGAIN)
+            
+            self.setGestureLEDDrive(DEFAULT_GLDRIVE)
+            
+            self.setGestureWaitTime(DEFAULT_GWTIME)
+            
+            self._write_bytes(APDS9960_GOFFSET_U, DEFAULT_GOFFSET)
+            
+            self._write_bytes(APDS9960_GOFFSET_D, DEFAULT_GOFFSET)
+            
+            self._write_bytes(APDS9960_GOFFSET_L, DEFAULT_GOFFSET)
+            
+            self._write_bytes(APDS9960_GOFFSET_R, DEFAULT_GOFFSET)
+            
+            self._write_bytes(APDS9960_GPULSE, DEFAULT_GPULSE)
+            
+            self._write_bytes(APDS9960_GCONF3, DEFAULT_GCONF3)
+            
+            self.setGestureIntEnable(DEFAULT_GIEN)
+
+        except Exception as e:
+            print(e)
         
-        try:       
-            self._write_bytes(APDS9960_CONTROL, val)
-        except:
-            raise ErrorWritingRegister
-       
+    def get_device_id(self):
+        n = self.write_read(APDS9960_ID, 1)
+        return n[0]
+
+    def transaction(self):
+        """
+            .. method:: transaction()
 
+                Returns a context manager that groups several operations in one atomic transaction::
 
+                    with sensor.transaction():
+                        sensor.setProximityIntLowThreshold(0)
+                        sensor.setProximityIntHighThreshold(50)
+                        sensor.clearProximityInt()
 
-    def getProximityGain(self):
+                Every read-modify-write and burst read of the driver is already a
+                transaction of its own, so other threads never see a half written
+                register. Transactions can be nested in the same thread.
+        """
+        return _Transaction(self._lock)
 
+    def getMode(self):
         """ 
-            .. method:: getProximityGain()
+            .. method:: getMode()
             
-                Get the gain for proximity detection
-                
-                return:
-                    the value of the proximity gain.
-
-                 
-                +--------+---------+
-                |  Value |  Gain   |
-                +========+=========+
-                |    0   |    1x   |
-                +--------+---------+
-                |    1   |    2x   |
-                +--------+---------+
-                |    2   |    4x   |
-                +--------+---------+
-                |    3   |    8x   |
-                +--------+---------+
-                 
+                Reads and returns the contents of the ENABLE register
         """
+        
         try:
-            val = self.write_read(APDS9960_CONTROL, 1)[0]
+            enable_value = self.write_read(APDS9960_ENABLE, 1)[0]
         except:
             raise ErrorReadingRegister
-  
-    
-        # Shift and mask out PDRIVE bits */
-        val = (val >> 2) & 0b00000011
         
-        return val
-
-
+        return enable_value
 
-    def setProximityGain(self, drive):
-        """
-            .. method:: setProximityGain(drive):
+    
+    def setMode(self, mode, enable):
+        """ 
+            .. method:: setMode(mode, enable)
             
-                Sets the receiver gain for proximity detection
+                Enables or disables a feature in the APDS-9960
                 
-                drive:
-                    the value (0-3) for the gain
-                 
-                +--------+---------+
-                |  Value |  Gain   |
-                +========+=========+
-                |    0   |    1x   |
-                +--------+---------+
-                |    1   |    2x   |
-                +--------+---------+
-                |    2   |    4x   |
-                +--------+---------+
-                |    3   |    8x   |
-                +--------+---------+
+                mode: 
+                    feature to enable  
                 
-
+                enable:
+                    ON (1) or OFF (0)
         """
 
+        # Change bit(s) in ENABLE register */
+        enable = enable & 0x01
+        self._lock.acquire()
         try:
-            val = self.write_read(APDS9960_CONTROL, 1)[0]
-        except:
-            raise ErrorReadingRegister
-  
-    
-        # Set bits in register to given value */
-        drive &= 0b00000011
-        drive = drive << 2
-        val &= 0b11110011
-        val |= drive
-        
-         #Write register value back into CONTROL register
-        try:       
-            self._write_bytes(APDS9960_CONTROL,val)
-        except:
-           raise ErrorWritingRegister
-      
-        
-      
+            reg_val = self.getMode()
 
+            if reg_val == ERROR :
+                raise ErrorDevice
 
-    def getAmbientLightGain(self):
+            if mode >= 0 and mode <= 6 :
+                if (enable):
+                    reg_val |= (1 << mode)
+                else: 
+                    reg_val &= ~(1 << mode)
+                
+            elif mode == ALL:
+                if (enable): 
+                    reg_val = 0x7F
+                else: 
+                    reg_val = 0x00
+
+            self._write_reg(APDS9960_ENABLE,reg_val)
+        finally:
+            self._lock.release()
+        sleep(100)
+       
+
+    def enableLightSensor(self, interrupts):
         """
-            .. method:: getAmbientLightGain()
+            .. method:: enableLightSensor(interrupts)
             
-                Get the gain for the ambient light sensor (ALS)
+                Starts the light (R/G/B/Ambient) sensor on the APDS-9960
                 
-                return:
-                    the value of the ALS gain.
+                interrupts:
+                    True to enable hardware interrupt on high or low light
+        """
 
-            
-                +--------+---------+
-                |  Value |  Gain   |
-                +========+=========+
-                |    0   |    1x   |
-                +--------+---------+
-                |    1   |    4x   |
-                +--------+---------+
-                |    2   |    16x  |
-                +--------+---------+
-                |    3   |    64x  |
-                +--------+---------+
+        # Set default gain, interrupts, enable power, and enable sensor */
+        self.setAmbientLightGain(DEFAULT_AGAIN) 
+        
+        if interrupts:
+            self.setAmbientLightIntEnable(1)
+        else: 
+            self.setAmbientLightIntEnable(0)
+                    
+        self.enablePower()
+        self.setMode(AMBIENT_LIGHT, 1)
+
+    def disableLightSensor(self):
+        """
+            .. method:: disableLightSensor()
+
+                Ends the light sensor on the APDS-9960
+        """
+
+        self.setAmbientLightIntEnable(0)
+        self.setMode(AMBIENT_LIGHT, 0)
+
+    def enableProximitySensor(self, interrupts):
+        """ 
+            .. method:: enableProximitySensor(interrupts)
+
+                Starts the proximity sensor on the APDS-9960
                 
+                interrupts:
+                    True to enable hardware external interrupt on proximity
+        """
+
+        # Set default gain, LED, interrupts, enable power, and enable sensor */
+        self.setProximityGain(DEFAULT_PGAIN)
+        self.setLEDDrive(DEFAULT_LDRIVE)
+       
+        if interrupts:
+            self.setProximityIntEnable(1)
+        else: 
+            self.setProximityIntEnable(0)
+            
+        self.enablePower()
+        self.setMode(PROXIMITY, 1)
+
+    def disableProximitySensor(self):
+        """
+            .. method:: disableProximitySensor()
             
+                Ends the proximity sensor on the APDS-9960
+        """
+
+        self.setProximityIntEnable(0)
+        self.setMode(PROXIMITY, 0)    
+
+
+    def enableGestureSensor(self, interrupts):
         """
+            .. method:: enableGestureSensor(interrupts)
+
+                Starts the gesture recognition engine on the APDS-9960
+                
+                * Enable gesture mode
+                * Set ENABLE to 0 (power off)
+                * Set WTIME to 0xFF
+                * Set AUX to LED_BOOST_300
+                * Enable PON, WEN, PEN, GEN in ENABLE
+
+        """ 
         try:
-            val = self.write_read(APDS9960_CONTROL, 1)[0]
-        except:
-            raise ErrorReadingRegister
+            self._resetGestureParameters()
+            self._write_bytes(APDS9960_WTIME, 0xFF)
             
-        #Shift and mask out ADRIVE bits */
-        val &= 0b00000011
+            self._write_bytes(APDS9960_PPULSE, DEFAULT_GESTURE_PPULSE)
+        
+            self.setLEDBoost(LED_BOOST_300)
     
-        return val
+            if interrupts:
+                self.setGestureIntEnable(1)
+            else:
+                self.setGestureIntEnable(0)
+        
+            self.setGestureMode(1)
+            self.enablePower()
+            self.setMode(WAIT, 1)
+            self.setMode(PROXIMITY, 1)
+            self.setMode(GESTURE, 1)
+        
+        except Exception as e:
+            print(e)
+        
 
-  
-    def setAmbientLightGain(self, drive):
+
+
+    def disableGestureSensor(self):
         """
-            .. method:: setAmbientLightGain(drive)
+            .. method:: disableGestureSensor()
             
-                Sets the receiver gain for the ambient light sensor (ALS)
+                Ends the gesture recognition engine on the APDS-9960
+        """
+
+        self._resetGestureParameters()
+        self.setGestureIntEnable(0) 
+        self.setGestureMode(0)
+        self.setMode(GESTURE, 0)
+        
+        
+    def isGestureAvailable(self):
+        """ 
+            .. method:: isGestureAvailable()
                 
-                drive:
-                    the value (0-3) for the gain
+                Determines if there is a gesture available for reading
                 
                 return:
-                    True if operation successful.
-            
-            
-                +--------+---------+
-                |  Value |  Gain   |
-                +========+=========+
-                |    0   |    1x   |
-                +--------+---------+
-                |    1   |    4x   |
-                +--------+---------+
-                |    2   |    16x  |
-                +--------+---------+
-                |    3   |    64x  |
-                +--------+---------+
-                
-                 
-                
+                    True if gesture available. False otherwise.
         """
 
+        #Read value from GSTATUS register
         try:
-            val = self.write_read(APDS9960_CONTROL, 1)[0]
+            val = self.write_read(APDS9960_GSTATUS, 1)[0]
         except:
-            raise ErrorReadingRegister
+             raise ErrorReadingRegister
+    
+        # Shift and mask out GVALID bit */
+        val &= APDS9960_GVALID
         
-        #Set bits in register to given value
-        drive &= 0b00000011
-        val &= 0b11111100
-        val |= drive
+        # Return True/False based on GVALID bit */
+        if val == 1:
+            return True
+        else:
+            return False
     
-         #Write register value back into CONTROL register
-        try:       
-            self._write_bytes(APDS9960_CONTROL,val)
-        except:
-           raise ErrorWritingRegister
 
 
-    def getLEDBoost(self):
-        """    
-            .. method:: getLEDBoost()
+    def readGesture(self):
+        """ 
+            .. method:: readGesture()
             
-                Get the current LED boost value
+                Processes a gesture event and returns best guessed gesture
                 
                 return:
-                    the LED boost value.
-                
-                +-------+----------------+
-                | Value | Boost Current  |
-                +=======+================+
-                |  0    |  100%          |
-                +-------+----------------+
-                |  1    |  150%          |
-                +-------+----------------+
-                |  2    |  200%          |
-                +-------+----------------+
-                |  3    |  300%          |
-                +-------+----------------+
-                
-                  
-                  
+                    Number corresponding to gesture.
+        """
 
+        drained = False
+        for pause in self.drainGesture():
+            # Wait some time to collect next batch of FIFO data */
+            sleep(pause)
+            drained = True
+        if not drained:
+            return DIR_NONE
+        return self.gesture_result_.direction
+
+    def drainGesture(self, consume=None):
         """
-        
-        #Read value from CONFIG2 register
-        try:
-            val = self.write_read(APDS9960_CONFIG2, 1)[0]
-        except:
-            raise ErrorReadingRegister 
-            
-        val = (val >> 4) & 0b00000011 #Shift and mask out LED_BOOST bits
-        return val
+            .. method:: drainGesture(consume=None)
 
+                Drains a gesture session from the FIFO. It is a generator of the pauses (ms) between the FIFO reads:
+                the caller waits each pause, then resumes the generator to read the next batch. ::
 
+                    for pause in sensor.drainGesture():
+                        sleep(pause)
+                    gesture = sensor.getGestureResult().direction
 
-    def setLEDBoost(self, boost):
-        """
-            .. method:: setLEDBoost(boost)
+                consume:
+                    function called with (fifo_data, fifo_level) for every batch of ``fifo_level`` interleaved U/D/L/R datasets.
+                    If None, the batches go to the gesture decoder and the session is decoded at the end (see :meth:`getGestureResult`).
+
+                Nothing is yielded if power or gesture sensing is off, or if there is no gesture data.
+                An event loop can await the pauses and run each resume on an executor (see :mod:`aio`).
         """
-        #Read value from CONFIG2 register
-        try:
-            val = self.write_read(APDS9960_CONFIG2, 1)[0]
-        except:
-            raise ErrorReadingRegister
-            
-        # Set bits in register to given value
-        boost &= 0b00000011
-        boost = boost << 4
-        val &= 0b11001111
-        val |= boost
-    
-        # Write register value back into CONFIG2 register
-        try:       
-            self._write_bytes(APDS9960_CONFIG2, val)
-        except:
-            raise ErrorWritingRegister
 
+        # Make sure that power and gesture is on and data is valid */
+        mode = self.getMode() & 0b01000001
+        if not self.isGestureAvailable() or not mode:
+            self._printDEBUG(' Make sure that power and gesture is on and data is valid')
+            return
+
+        decode = consume is None
+        if decode:
+            consume = self._consumeGestureFifo
+        self._startDrain()
 
-    def getProxGainCompEnable(self):
+        # Keep looping as long as gesture data is valid */
+        while True:
+            yield self._fifoPause
+            fifo_level = self._fetchGestureFifo()
+            if fifo_level < 0:
+                break
+            consume(self._fifoBuf, fifo_level)
+
+        if decode:
+            #Determine best guessed gesture and clean up */
+            yield self._fifoPause
+            self._endGesture()
+
+    def _gestureCycle(self):
+        # Estimated time (ms) of a FIFO dataset: gesture wait time plus the
+        # LED pulses of the UP/DOWN and LEFT/RIGHT pairs (pulse and pause each)
+        gpulse = self._read_cached(APDS9960_GPULSE)
+        gwtime = self._read_cached(APDS9960_GCONF2) & 0b00000111
+        return GWTIME_MS[gwtime] + (((gpulse & 0b00111111) + 1) * PULSE_LEN_US[gpulse >> 6] * 4) / 1000
+
+    def _startDrain(self):
+        # Initial drain pause: the time to fill the FIFO to the middle of the watermarks
+        pause = int(self._gestureCycle() * (self._fifoLow + self._fifoHigh) / 2)
+        self._fifoPause = min(max(pause, FIFO_MIN_PAUSE), FIFO_MAX_PAUSE)
+        self._fifoLast = None
+        # Gesture timing: first and last FIFO read with data, datasets read
+        self._gestureStart = None
+        self._gestureEnd = None
+        self._gestureFirst = 0
+        self._gestureDatasets = 0
+
+    def _adaptDrain(self, gstatus, fifo_level):
+        # Adapts the drain pause to the observed FIFO growth since the last read
+        now = timers.now()
+        last = self._fifoLast
+        self._fifoLast = now
+        pause = self._fifoPause
+        if gstatus & APDS9960_GFOV:
+            self.fifo_overflows += 1
+            pause = pause // 2
+        elif last is None or (fifo_level >= self._fifoLow and fifo_level <= self._fifoHigh):
+            return
+        elif fifo_level == 0:
+            pause = pause * 2
+        else:
+            # New interval for the middle of the watermarks, minus the time spent outside the pause
+            interval = now - last
+            pause = (interval * (self._fifoLow + self._fifoHigh)) // (2 * fifo_level) - (interval - pause)
+        self._fifoPause = min(max(pause, FIFO_MIN_PAUSE), FIFO_MAX_PAUSE)
+
+    def getFifoPause(self):
         """
-            .. method:: getProxGainCompEnable()
-                
-                Gets proximity gain compensation enable
-                
-                return:
-                    1 if compensation is enabled or 0 if not. 
-            
+            .. method:: getFifoPause()
+
+                Returns the current pause (ms) between gesture FIFO reads
         """
-        
-        try:
-            val = self.write_read(APDS9960_CONFIG3, 1)[0]
-        except:
-            raise ErrorReadingRegister 
-            
-         # Shift and mask out PCMP bits */
-        val = (val >> 5) & 0b00000001
-        
-        return val
+        return self._fifoPause
 
+    def getFifoOverflows(self):
+        """
+            .. method:: getFifoOverflows()
 
-  
-    def setProxGainCompEnable(self, enable):
+                Returns the number of gesture FIFO overflows (GFOV) seen since the sensor was created
         """
-            .. method:: setProxGainCompEnable(enable)
-                
-                Sets the proximity gain compensation enable.
-                
-                enable:
-                    1 to enable compensation or  0 to disable compensation.
-            
+        return self.fifo_overflows
+
+    def setFifoWatermarks(self, low, high):
         """
-         
+            .. method:: setFifoWatermarks(low, high)
+
+                Sets the gesture FIFO level window of the adaptive drain
+
+                The pause between FIFO reads starts from GWTIME and GPULSE and then follows the measured FIFO growth,
+                so that each read finds between ``low`` and ``high`` datasets (0 < low <= high < 32).
+        """
+        if low <= 0 or low > high or high >= FIFO_SIZE:
+            raise ValueError
+        self._fifoLow = low
+        self._fifoHigh = high
+
+    def _fetchGestureFifo(self):
+        # Reads one batch of FIFO data into _fifoBuf and returns the number
+        # of datasets, -1 when the gesture data is no longer valid
+
+        fifo_level = 0
+
+        # Get the contents of the STATUS register. Is data still valid? */
         try:
-            val = self.write_read(APDS9960_CONFIG3, 1)[0]
+            gstatus = self.write_read(APDS9960_GSTATUS, 1)[0]
         except:
             raise ErrorReadingRegister
-            
-        # Set bits in register to given value */
-        enable &= 0b00000001
-        enable = enable << 5
-        val &= 0b11011111
-        val |= enable
-    
-        # Write register value back into CONFIG2 register
-        try:       
-            self._write_bytes(APDS9960_CONFIG3, val)
+        
+        if (gstatus & APDS9960_GVALID) != APDS9960_GVALID:
+            self._printDEBUG(gstatus)
+            return -1
+        
+        # If we have valid data, read the FIFO level and the FIFO as one transaction */
+        self._lock.acquire()
+        try:
+            fifo_level = self.write_read(APDS9960_GFLVL, 1)[0]
+            self._adaptDrain(gstatus, fifo_level)
+
+            # If there's stuff in the FIFO, read it into our data block 
+            if fifo_level > 0:
+                self._readFifoChunks(fifo_level * 4)
         except:
-            raise ErrorWritingRegister
+            raise ErrorReadingRegister
+        finally:
+            self._lock.release()
+
+        self._printDEBUG("FIFO Level: ", fifo_level)
+        if fifo_level > 0:
+            if self._gestureStart is None:
+                self._gestureStart = self._fifoLast
+                self._gestureFirst = fifo_level
+            self._gestureEnd = self._fifoLast
+            self._gestureDatasets += fifo_level
+        return fifo_level
+
+    def _readFifoChunks(self, n):
+        # Reads n FIFO bytes into _fifoBuf with transfers of at most _fifoChunk bytes.
+        # Chunks are whole datasets, the FIFO pops a dataset after GFIFO_R.
+        # A short transfer would shrink _fifoBuf: it fails the read instead
+        chunk = self._fifoChunk
+        start = timers.now()
+        pos = 0
+        while pos < n:
+            size = n - pos
+            if size > chunk:
+                size = chunk
+            data = self.write_read(APDS9960_GFIFO_U, size)
+            if len(data) != size:
+                raise ErrorReadingRegister
+            self._fifoBuf[pos:pos + size] = data
+            pos += size
+        elapsed = timers.now() - start
+
+        if chunk not in self._chunkStats:
+            self._chunkStats[chunk] = [0, 0, 0]
+        stats = self._chunkStats[chunk]
+        stats[0] += (n + chunk - 1) // chunk
+        stats[1] += n
+        stats[2] += elapsed
+
+    def getFifoChunk(self):
+        """
+            .. method:: getFifoChunk()
 
-   
+                Returns the largest transfer (bytes) of a gesture FIFO read
+        """
+        return self._fifoChunk
 
-    def getProxPhotoMask(self):
+    def setFifoChunk(self, size):
         """
-            .. method:: getProxPhotoMask()
+            .. method:: setFifoChunk(size)
+
+                Sets the largest transfer of a gesture FIFO read, rounded down to whole datasets (4 bytes).
+                The default is the whole FIFO (128 bytes), or the ``max_transfer`` of the ``bus`` backend if smaller.
+        """
+        if size < 4:
+            raise ValueError
+        if size > FIFO_SIZE * 4:
+            size = FIFO_SIZE * 4
+        self._fifoChunk = size - size % 4
+
+    def getFifoChunkStats(self):
+        """
+            .. method:: getFifoChunkStats()
+
+                Returns the timing of the gesture FIFO reads of each chunk size used
+
+                return:
+                    a dictionary chunk size -> [transfers, bytes, ms].
+        """
+        return self._chunkStats
+
+    def bestFifoChunk(self):
+        """
+            .. method:: bestFifoChunk()
+
+                Returns the measured chunk size with the highest throughput, None before any timed read.
+                Try candidate sizes with :meth:`setFifoChunk` during a few gestures, then keep the best one.
+        """
+        best = None
+        best_cost = None
+        for chunk in self._chunkStats:
+            transfers, n, ms = self._chunkStats[chunk]
+            # Time per byte first, transfers per byte when below the timer resolution
+            cost = ((ms * 1000) // n, (transfers * 1000) // n)
+            if best is None or cost < best_cost:
+                best = chunk
+                best_cost = cost
+        return best
+
+    def _consumeGestureFifo(self, fifo_data, fifo_level):
+        # Hands fifo_level datasets of FIFO data to the gesture decoder
+        self._decoder.feed(fifo_data, fifo_level)
+
+    def _endGesture(self):
+        # Determines the best guessed gesture and cleans up
+
+        result = self._decoder.result()
+        self.gesture_result_ = result
+        if self._gestureStart is not None:
+            # Period measured between the first and the last read, estimated if a single read
+            period = self._gestureCycle()
+            if self._gestureDatasets > self._gestureFirst and self._gestureEnd > self._gestureStart:
+                period = (self._gestureEnd - self._gestureStart) / (self._gestureDatasets - self._gestureFirst)
+            result._setTiming(int(self._gestureStart - (self._gestureFirst - 1) * period), self._gestureEnd, period)
+
+        self._printDEBUG("END: ")
+        self._printDEBUG(result.direction)
+
+        self._decoder.reset()
+        return result.direction
+
+    def _resetGestureParameters(self):
+        #Resets all the parameters of the gesture decoder
+        self._decoder.reset()
+
+    def setGestureDecoder(self, decoder):
+        """
+            .. method:: setGestureDecoder(decoder)
+
+                Sets the gesture decoder of :meth:`readGesture`, an object with the methods of :class:`HeuristicDecoder`.
+                ``None`` restores the default :class:`HeuristicDecoder`.
+        """
+        if decoder is None:
+            decoder = HeuristicDecoder(self._printDEBUG)
+        decoder.reset()
+        self._decoder = decoder
+
+    def setGestureModel(self, model):
+        """
+            .. method:: setGestureModel(model)
+
+                Replaces the direction heuristic of :meth:`readGesture` with a trained model, e.g. a :class:`GestureTree`,
+                through a :class:`ModelDecoder`. ``None`` restores the heuristic.
+        """
+        if model is None:
+            self.setGestureDecoder(None)
+        else:
+            self.setGestureDecoder(ModelDecoder(model))
+
+    def getGestureResult(self):
+        """
+            .. method:: getGestureResult()
+
+                Returns the :class:`GestureResult` of the last gesture read, with its confidence and runner-up direction.
+                Low confidence gestures can be discarded without reading the sensor again. ::
+
+                    gesture = sensor.readGesture()
+                    if sensor.getGestureResult().confidence < 40:
+                        gesture = DIR_NONE
+        """
+        return self.gesture_result_
+
+    def enablePower(self):
+        """ 
+            .. method::enablePower()
             
-                Gets the current mask for enabled/disabled proximity photodiodes
+                Turn the APDS-9960 on
                 
-                1 = disabled, 0 = enabled
+        """
+
+        self.setMode(POWER, 1)
+        
+        
+    def disablePower(self):
+        """
+            .. method::disablePower()
                 
-                +-----+-----------------+
-                | Bit |   Photodiode    |
-                +=====+=================+
-                | 3   |    UP           |
-                +-----+-----------------+
-                | 2   |    DOWN         |
-                +-----+-----------------+
-                | 1   |    LEFT         |
-                +-----+-----------------+
-                | 0   |    RIGHT        |
-                +-----+-----------------+
+                Turn the APDS-9960 off
+        """
+
+        self.setMode(POWER, 0)
+        
+
+
+# #******************************************************************************
+#  * Ambient light and color sensor controls
+#  ******************************************************************************/
+
+    def readAmbientLight(self):
+        """
+            .. method:: readAmbientLight()
             
+                Reads the ambient (clear) light level as a 16-bit value
+                
+                return:
+                    the value of the light sensor.
+        """
+        return self._read_word(APDS9960_CDATAL)
+        
+
+
+    def readRedLight(self):
+        """
+            .. method:: readRedLight()
+                
+                Reads the red light level as a 16-bit value
+                
+                return:
+                    the value of the light sensor.
+        """
+        return self._read_word(APDS9960_RDATAL)
+
+    def readGreenLight(self):
+        """
+            .. method:: readGreenLight()
+                
+                Reads the red light level as a 16-bit value
+                
+                return:
+                    the value of the light sensor.
+        """
+        return self._read_word(APDS9960_GDATAL)
+        
+    
+    def readBlueLight(self):
+        """
+            .. method:: readBlueLight()
+                
+                Reads the red light level as a 16-bit value
+                
+                return:
+                    the value of the light sensor.
         """
+        return self._read_word(APDS9960_BDATAL)
         
+    def readColor(self):
+        """
+            .. method:: readColor()
+
+                Reads clear, red, green and blue light levels with a single burst read
+
+                return:
+                    a tuple (clear, red, green, blue) of 16-bit values.
+        """
+        return self._readColorData(8)[0]
+
+    def _readColorData(self, n):
+        # Burst read of n >= 8 bytes from CDATAL: the (clear, red, green, blue)
+        # tuple and the raw bytes, PDATA being data[8]
         try:
-            val = self.write_read(APDS9960_CONFIG3, 1)[0]
+            data = self.write_read(APDS9960_CDATAL, n)
         except:
-            raise ErrorReadingRegister 
+            raise ErrorReadingRegister
+        return ((data[0] + (data[1] << 8), data[2] + (data[3] << 8), data[4] + (data[5] << 8), data[6] + (data[7] << 8)), data)
+
+    
+
+
+#  ******************************************************************************
+#  * Proximity sensor controls
+#  ******************************************************************************/
+
+
+    def readProximity(self):
+        """
+            .. method:: readProximity()
             
+                Reads the proximity level as an 8-bit value
+                
+                return:
+                    the value of the proximity sensor.
+        """
         
-        # Mask out photodiode enable mask bits */
-        val &= 0b00001111
+        try:
+            val = self.write_read(APDS9960_PDATA, 1)[0]
+        except:
+            raise ErrorReadingRegister
+                    
         
         return val
 
+    def readProximityIR(self):
+        """
+            .. method:: readProximityIR()
+
+                Reads the proximity and an ambient IR estimate with a single 9 bytes burst read (CDATAL..PDATA).
+                The IR estimate is (red + green + blue - clear) / 2 of the last light conversion.
 
+                return:
+                    a tuple (proximity, ir).
+        """
+        color, data = self._readColorData(9)
+        ir = (color[1] + color[2] + color[3] - color[0]) >> 1
+        if ir < 0:
+            ir = 0
+        return (data[8], ir)
 
-    def setProxPhotoMask(self, mask):
+    def readCompensatedProximity(self):
         """
-            .. method:: setProxPhotoMask(mask)
+            .. method:: readCompensatedProximity()
+
+                Reads the proximity minus the ambient IR contribution (see :meth:`setAmbientIRFactor`).
+                Ambient light and proximity must both be enabled.
+
+                return:
+                    the compensated 8-bit proximity value.
+        """
+        pdata, ir = self.readProximityIR()
+        pdata -= (ir * self._irFactor) >> 8
+        if pdata < 0:
+            return 0
+        return pdata
+
+    def readDistance(self, table):
+        """
+            .. method:: readDistance(table)
+
+                Reads the proximity and converts it to a distance with a lookup table
+
+                table:
+                    the 256 entries table of a :class:`DistanceCalibration` for the current proximity gain, LED drive and LED boost
+        """
+        return table[self.readProximity()]
+
+    def getAmbientIRFactor(self):
+        """
+            .. method:: getAmbientIRFactor()
+
+                Returns the PDATA counts per ambient IR count, in 1/256 units
+        """
+        return self._irFactor
+
+    def setAmbientIRFactor(self, factor):
+        """
+            .. method:: setAmbientIRFactor(factor)
+
+                Sets the PDATA counts per ambient IR count used by :meth:`readCompensatedProximity`, in 1/256 units (0-65535)
+        """
+        if factor < 0 or factor > 65535:
+            raise ValueError
+        self._irFactor = factor
+
+    def calibrateAmbientIRFactor(self, samples=16, interval=100):
+        """
+            .. method:: calibrateAmbientIRFactor(samples=16, interval=100)
+
+                Fits the ambient IR factor with a least squares line through ``samples`` readings of :meth:`readProximityIR`,
+                taken every ``interval`` ms with no target in front of the sensor while the ambient light changes
+                (e.g. moving from shade to sunlight). The intercept (crosstalk) is left to :meth:`calibrateProximityOffset`.
+
+                Raises ``ValueError`` if the ambient IR did not change during the calibration.
+
+                return:
+                    the new factor.
+        """
+        sx = 0
+        sy = 0
+        sxx = 0
+        sxy = 0
+        for i in range(samples):
+            sleep(interval)
+            pdata, ir = self.readProximityIR()
+            sx += ir
+            sy += pdata
+            sxx += ir * ir
+            sxy += ir * pdata
+
+        den = samples * sxx - sx * sx
+        if den == 0:
+            raise ValueError
+        factor = ((samples * sxy - sx * sy) * 256) // den
+        if factor < 0:
+            factor = 0
+        elif factor > 65535:
+            factor = 65535
+        self._irFactor = factor
+        return factor
+   
+    
+# #******************************************************************************
+#  * Getters and setters for register values
+#  ******************************************************************************/
+
+    def getProxIntLowThresh(self):
+        """
+            .. method:: getProxIntLowThresh()
             
-                Sets the mask for enabling/disabling proximity photodiodes
+                Returns the lower threshold for proximity detection
+            
+        """
+        
+        try:
+            val = self.write_read(APDS9960_PILT, 1)[0]
+        except:
+            raise ErrorReadingRegister
+                    
+        
+        return val
+  
+    def setProxIntLowThresh(self, threshold):
+        """
+            .. method:: getProxIntLowThresh(threshold)
                 
-                1 = disabled, 0 = enabled
+                Sets the lower threshold for proximity detection
+        """
+        
+        
+        self._write_bytes(APDS9960_PILT, threshold)
+        
+ 
+
+
+    def getProxIntHighThresh(self):
+        """
+            .. method:: getProxIntHighThresh()
+            
+                Returns the high threshold for proximity detection
+            
+        """
+        
+        try:
+            val = self.write_read(APDS9960_PIHT, 1)[0]
+        except:
+            raise ErrorReadingRegister
+                    
+        return val
+
+
+    def setProxIntHighThresh(self, threshold):
+        """
+            .. method:: setProxIntHighThresh(threshold)
+            
+                Sets the high threshold for proximity detection
+            
+        """
+
+        self._write_bytes(APDS9960_PIHT, threshold)
+            
+
+    def getLEDDrive(self):
+        """
+            .. method:: getLEDDrive()
                 
+                Returns LED drive strength for proximity and ALS
+                
+                +---------+---------------+
+                |  Value  |  LED Current  |
+                +---------+---------------+
+                |    0    |    100 mA     |
+                +---------+---------------+
+                |    1    |     50 mA     |
+                +---------+---------------+
+                |    2    |     25 mA     |
+                +---------+---------------+
+                |    3    |     12.5 mA   |
+                +---------+---------------+
+                
+        """
+
+        try:
+            val = self.write_read(APDS9960_CONTROL, 1)[0]
+        except:
+            raise ErrorReadingRegister
+                    
+
+         # Shift and mask out LED drive bits */
+        return (val >> 6) & 0b00000011
+
+    def setLEDDrive(self, drive):
+        """
+            .. method:: setLEDDrive(drive)
+                
+                brief Sets the LED drive strength for proximity and ALS
+                
+                drive:
+                    the value (0-3) for the LED drive strength
+                 
+                +---------+---------------+
+                |  Value  |  LED Current  |
+                +---------+---------------+
+                |    0    |    100 mA     |
+                +---------+---------------+
+                |    1    |     50 mA     |
+                +---------+---------------+
+                |    2    |     25 mA     |
+                +---------+---------------+
+                |    3    |     12.5 mA   |
+                +---------+---------------+
+                 
+                 
+                 
+        """
+
+        # Set bits in register to given value */
+        self._update_bits(APDS9960_CONTROL, 0b11000000, drive << 6)
+       
+
+
+
+    def getProximityGain(self):
+
+        """ 
+            .. method:: getProximityGain()
+            
+                Get the gain for proximity detection
+                
+                return:
+                    the value of the proximity gain.
+
+                 
+                +--------+---------+
+                |  Value |  Gain   |
+                +========+=========+
+                |    0   |    1x   |
+                +--------+---------+
+                |    1   |    2x   |
+                +--------+---------+
+                |    2   |    4x   |
+                +--------+---------+
+                |    3   |    8x   |
+                +--------+---------+
+                 
+        """
+        try:
+            val = self.write_read(APDS9960_CONTROL, 1)[0]
+        except:
+            raise ErrorReadingRegister
+  
+    
+        # Shift and mask out PDRIVE bits */
+        val = (val >> 2) & 0b00000011
+        
+        return val
+
+
+
+    def setProximityGain(self, drive):
+        """
+            .. method:: setProximityGain(drive):
+            
+                Sets the receiver gain for proximity detection
+                
+                drive:
+                    the value (0-3) for the gain
+                 
+                +--------+---------+
+                |  Value |  Gain   |
+                +========+=========+
+                |    0   |    1x   |
+                +--------+---------+
+                |    1   |    2x   |
+                +--------+---------+
+                |    2   |    4x   |
+                +--------+---------+
+                |    3   |    8x   |
+                +--------+---------+
+                
+
+        """
+
+        # Set bits in register to given value */
+        self._update_bits(APDS9960_CONTROL, 0b00001100, drive << 2)
+      
+        
+      
+
+
+    def getAmbientLightGain(self):
+        """
+            .. method:: getAmbientLightGain()
+            
+                Get the gain for the ambient light sensor (ALS)
+                
+                return:
+                    the value of the ALS gain.
+
+            
+                +--------+---------+
+                |  Value |  Gain   |
+                +========+=========+
+                |    0   |    1x   |
+                +--------+---------+
+                |    1   |    4x   |
+                +--------+---------+
+                |    2   |    16x  |
+                +--------+---------+
+                |    3   |    64x  |
+                +--------+---------+
+                
+            
+        """
+        try:
+            val = self.write_read(APDS9960_CONTROL, 1)[0]
+        except:
+            raise ErrorReadingRegister
+            
+        #Shift and mask out ADRIVE bits */
+        val &= 0b00000011
+    
+        return val
+
+  
+    def setAmbientLightGain(self, drive):
+        """
+            .. method:: setAmbientLightGain(drive)
+            
+                Sets the receiver gain for the ambient light sensor (ALS)
+                
+                drive:
+                    the value (0-3) for the gain
+                
+                return:
+                    True if operation successful.
+            
+            
+                +--------+---------+
+                |  Value |  Gain   |
+                +========+=========+
+                |    0   |    1x   |
+                +--------+---------+
+                |    1   |    4x   |
+                +--------+---------+
+                |    2   |    16x  |
+                +--------+---------+
+                |    3   |    64x  |
+                +--------+---------+
+                
+                 
+                
+        """
+
+        # Set bits in register to given value */
+        self._update_bits(APDS9960_CONTROL, 0b00000011, drive)
+
+
+    def getLEDBoost(self):
+        """    
+            .. method:: getLEDBoost()
+            
+                Get the current LED boost value
+                
+                return:
+                    the LED boost value.
+                
+                +-------+----------------+
+                | Value | Boost Current  |
+                +=======+================+
+                |  0    |  100%          |
+                +-------+----------------+
+                |  1    |  150%          |
+                +-------+----------------+
+                |  2    |  200%          |
+                +-------+----------------+
+                |  3    |  300%          |
+                +-------+----------------+
+                
+                  
+                  
+
+        """
+        
+        #Read value from CONFIG2 register
+        try:
+            val = self.write_read(APDS9960_CONFIG2, 1)[0]
+        except:
+            raise ErrorReadingRegister 
+            
+        val = (val >> 4) & 0b00000011 #Shift and mask out LED_BOOST bits
+        return val
+
+
+
+    def setLEDBoost(self, boost):
+        """
+            .. method:: setLEDBoost(boost)
+        """
+
+        # Set bits in register to given value */
+        self._update_bits(APDS9960_CONFIG2, 0b00110000, boost << 4)
+
+
+    def getProxGainCompEnable(self):
+        """
+            .. method:: getProxGainCompEnable()
+                
+                Gets proximity gain compensation enable
+                
+                return:
+                    1 if compensation is enabled or 0 if not. 
+            
+        """
+        
+        try:
+            val = self.write_read(APDS9960_CONFIG3, 1)[0]
+        except:
+            raise ErrorReadingRegister 
+            
+         # Shift and mask out PCMP bits */
+        val = (val >> 5) & 0b00000001
+        
+        return val
+
+
+  
+    def setProxGainCompEnable(self, enable):
+        """
+            .. method:: setProxGainCompEnable(enable)
+                
+                Sets the proximity gain compensation enable.
+                
+                enable:
+                    1 to enable compensation or  0 to disable compensation.
+            
+        """
+
+        # Set bits in register to given value */
+        self._update_bits(APDS9960_CONFIG3, 0b00100000, enable << 5)
+
+   
+
+    def getProxPhotoMask(self):
+        """
+            .. method:: getProxPhotoMask()
+            
+                Gets the current mask for enabled/disabled proximity photodiodes
+                
+                1 = disabled, 0 = enabled
+                
+                +-----+-----------------+
+                | Bit |   Photodiode    |
+                +=====+=================+
+                | 3   |    UP           |
+                +-----+-----------------+
+                | 2   |    DOWN         |
+                +-----+-----------------+
+                | 1   |    LEFT         |
                 +-----+-----------------+
-                | Bit |   Photodiode    |
-                +=====+=================+
-                | 3   |    UP           |
-                +-----+-----------------+
-                | 2   |    DOWN         |
-                +-----+-----------------+
-                | 1   |    LEFT         |
-                +-----+-----------------+
-                | 0   |    RIGHT        |
-                +-----+-----------------+
+                | 0   |    RIGHT        |
+                +-----+-----------------+
+            
+        """
+        
+        try:
+            val = self.write_read(APDS9960_CONFIG3, 1)[0]
+        except:
+            raise ErrorReadingRegister 
+            
+        
+        # Mask out photodiode enable mask bits */
+        val &= 0b00001111
+        
+        return val
+
+
+
+    def setProxPhotoMask(self, mask):
+        """
+            .. method:: setProxPhotoMask(mask)
+            
+                Sets the mask for enabling/disabling proximity photodiodes
+                
+                1 = disabled, 0 = enabled
+                
+                +-----+-----------------+
+                | Bit |   Photodiode    |
+                +=====+=================+
+                | 3   |    UP           |
+                +-----+-----------------+
+                | 2   |    DOWN         |
+                +-----+-----------------+
+                | 1   |    LEFT         |
+                +-----+-----------------+
+                | 0   |    RIGHT        |
+                +-----+-----------------+
+
+            
+        """
+
+        # Set bits in register to given value */
+        self._update_bits(APDS9960_CONFIG3, 0b00001111, mask)
+
+
+    def getGestureEnterThresh(self):
+        """
+            .. method:: getGestureEnterThresh()
+                
+                Gets the entry proximity threshold for gesture sensing
+
+        """
+        
+        
+        try:
+            val = self.write_read(APDS9960_GPENTH, 1)[0]
+        except:
+            raise ErrorReadingRegister 
+        
+        return val
+
+
+    def setGestureEnterThresh(self, threshold):
+        """
+            .. method:: setGestureEnterThresh(threshold)
+                
+                Sets the entry proximity threshold for gesture sensing
+                
+                threshold: 
+                    the proximity value needed to start gesture mode
+                
+        """
+
+        try:       
+            self._write_bytes(APDS9960_GPENTH, threshold)
+        except:
+            raise ErrorWritingRegister
+
+
+
+    def getGestureExitThresh(self):
+        """
+            .. method:: getGestureExitThresh()
+                
+                Gets the exit proximity threshold for gesture sensing
+        """
+        
+        try:
+            val = self.write_read(APDS9960_GEXTH, 1)[0]
+        except:
+            raise ErrorReadingRegister 
+        
+        return val
+
+
+    def setGestureExitThresh(self, threshold):
+        """
+            .. method:: setGestureExitThresh(threshold)
+                
+                Sets the exit proximity threshold for gesture sensing
+                
+                threshold:
+                    the proximity value needed to end gesture mode
+                
+                
+        """
+        
+        
+        try:       
+            self._write_bytes(APDS9960_GEXTH, threshold)
+        except:
+            raise ErrorWritingRegister
+      
+
+
+    def getGestureGain(self):
+        """
+            .. method:: getGestureGain()
+            
+                Gets the gain of the photodiode during gesture mode
+                
+                return:
+                    the value for the current photodiode gain.
+                
+                    +--------+----------+
+                    | Value  |  Gain    |
+                    +========+==========+
+                    |  0     |  1x      |
+                    +--------+----------+
+                    |  1     |  2x      |
+                    +--------+----------+
+                    |  2     |  4x      |
+                    +--------+----------+
+                    |  3     |  8x      |
+                    +--------+----------+
+                    
+                
+        """
+        
+        try:
+            val = self.write_read(APDS9960_GCONF2, 1)
+        except:
+            raise ErrorReadingRegister
+        
+        #Shift and mask out GGAIN bits */
+        val = (val >> 5) & 0b00000011;
+    
+        return val
+    
+    def setGestureGain(self, value):
+        """
+            .. method:: setGestureGain(value)
+            
+                Sets the gain of the photodiode during gesture mode
+                
+                value:
+                    the value for the gain of the gesture
+                    
+             
+                +--------+----------+
+                | Value  |  Gain    |
+                +========+==========+
+                |  0     |  1x      |
+                +--------+----------+
+                |  1     |  2x      |
+                +--------+----------+
+                |  2     |  4x      |
+                +--------+----------+
+                |  3     |  8x      |
+                +--------+----------+
+            
+        """
+
+        # Set bits in register to given value */
+        self._update_bits(APDS9960_GCONF2, 0b01100000, value << 5)
+
+
+    def getGestureLEDDrive(self):
+        """
+            .. method:: getGestureLEDDrive()
+            
+                Gets the drive current of the LED during gesture mode
+                
+                return:
+                    the LED drive current value.
+
+             
+                +--------+--------------+
+                | Value  |  LED Current |
+                +========+==============+
+                |  0     |   100 mA     |
+                +--------+--------------+
+                |  1     |    50 mA     |
+                +--------+--------------+
+                |  2     |    25 mA     |
+                +--------+--------------+
+                |  3     |    12.5 mA   |
+                +--------+--------------+
+
+             
+        """
+        try:
+            val = self.write_read(APDS9960_GCONF2, 1)[0]
+        except:
+            raise ErrorReadingRegister
+        
+        #Shift and mask out GLDRIVE bits */
+        val = (val >> 3) & 0b00000011
+    
+        return val
+        
+    def setGestureLEDDrive(self, drive):
+        """
+            .. method:: setGestureLEDDrive(drive)
+            
+                Sets the LED drive current during gesture mode
+                
+                drive:
+                    the value for the LED drive current
+                
+                +--------+--------------+
+                | Value  |  LED Current |
+                +========+==============+
+                |  0     |   100 mA     |
+                +--------+--------------+
+                |  1     |    50 mA     |
+                +--------+--------------+
+                |  2     |    25 mA     |
+                +--------+--------------+
+                |  3     |    12.5 mA   |
+                +--------+--------------+
+
+
+             
+                
+        """
+
+        # Set bits in register to given value */
+        self._update_bits(APDS9960_GCONF2, 0b00011000, drive << 3)
+
+
+
+    def getGestureWaitTime(self):
+        """
+            .. method: getGestureWaitTime
+                Gets the time in low power mode between gesture detections
+                
+                return:
+                    the current wait time between gestures.
+
+             
+                +----------+-------------+
+                |  Value   |  Wait time  |
+                +==========+=============+
+                |    0     |     0 ms    |
+                +----------+-------------+
+                |    1     |     2.8 ms  |
+                +----------+-------------+
+                |    2     |     5.6 ms  |
+                +----------+-------------+
+                |    3     |     8.4 ms  |
+                +----------+-------------+
+                |    4     |    14.0 ms  |
+                +----------+-------------+
+                |    5     |    22.4 ms  |
+                +----------+-------------+
+                |    6     |    30.8 ms  |
+                +----------+-------------+
+                |    7     |    39.2 ms  |
+                +----------+-------------+
+             
+        """
+        try:
+            val = self.write_read(APDS9960_GCONF2, 1)[0]
+        except:
+            raise ErrorReadingRegister
+    
+        #Mask out GWTIME bits */
+        val &= 0b00000111
+    
+        return val
+
+    def setGestureWaitTime(self, time):
+        """
+            .. method:: setGestureWaitTime(time)
+            
+                Sets the time in low power mode between gesture detections
+                
+                time:
+                    the value for the wait time
+
+                +----------+-------------+
+                |  Value   |  Wait time  |
+                +==========+=============+
+                |    0     |     0 ms    |
+                +----------+-------------+
+                |    1     |     2.8 ms  |
+                +----------+-------------+
+                |    2     |     5.6 ms  |
+                +----------+-------------+
+                |    3     |     8.4 ms  |
+                +----------+-------------+
+                |    4     |    14.0 ms  |
+                +----------+-------------+
+                |    5     |    22.4 ms  |
+                +----------+-------------+
+                |    6     |    30.8 ms  |
+                +----------+-------------+
+                |    7     |    39.2 ms  |
+                +----------+-------------+
+             
+
+        """
+
+        # Set bits in register to given value */
+        self._update_bits(APDS9960_GCONF2, 0b00000111, time)
+
+
+
+#*
+#  * @brief Gets the low threshold for ambient light interrupts
+#  *
+#  * @param[out] threshold current low threshold stored on the APDS-9960
+#  * @return True if operation successful. False otherwise.
+#  */
+    def getLightIntLowThreshold(self):
+        """
+            .. method:: getLightIntLowThreshold()
+                
+                Gets the low threshold for ambient light interrupts
+                
+                Return:
+                    the current low threshold stored on the APDS-9960
+                
+        """
+        return self._read_word(APDS9960_AILTL)
+
+    
+
+    def setLightIntLowThreshold(self, threshold):
+        """
+            .. method:: setLightIntLowThreshold(threshold)
+            
+                Sets the low threshold for ambient light interrupts
+                
+                threshold:
+                    the low threshold value for interrupt to trigger
+        """
+
+        #Write the 16-bit threshold as low and high byte */
+        self._write_word(APDS9960_AILTL, threshold)
+
+ 
+  
+
+
+    def getLightIntHighThreshold(self):
+        """
+            .. method:: getLightIntHighThreshold()
+            
+                Gets the high threshold for ambient light interrupts
+                
+                return: 
+                    the current hight threshold stored on the APDS-9960
+        """
+        return self._read_word(APDS9960_AIHTL)
+        
+  
+
+    def setLightIntHighThreshold(self, threshold):
+        """
+            .. method:: setLightIntHighThreshold(threshold)
+                
+                Sets the hight threshold for ambient light interrupts
+                
+                threshold:
+                    the hight threshold value for interrupt to trigger
+        """
+
+        #Write the 16-bit threshold as low and high byte */
+        self._write_word(APDS9960_AIHTL, threshold)
+
+
+
+    def getProximityIntLowThreshold(self):
+        """
+            .. method:: getProximityIntLowThreshold()
+                
+                Gets the low threshold for proximity interrupts
+            
+        """
+        
+        try:
+            val = self.write_read(APDS9960_PILT, 1)[0]
+        except:
+            raise ErrorReadingRegister
+                    
+        
+        return val
+   
+
+
+    def setProximityIntLowThreshold(self, threshold):
+        """
+            .. method:: setProximityIntLowThreshold(threshold)
+            
+                Sets the low threshold for proximity interrupts
+                
+                threshold:
+                    the low threshold value for interrupt to trigger
+            
+        """
+        
+        try:       
+            self._write_bytes(APDS9960_PILT,threshold)
+        except:
+           raise ErrorWritingRegister
+
+    
+    def getProximityIntHighThreshold(self):
+        
+        """
+            .. method:: getProximityIntHighThreshold()
+                
+               Gets the high threshold for proximity interrupts
+            
+        """
+        
+        try:
+            val = self.write_read(APDS9960_PIHT, 1)[0]
+        except:
+            raise ErrorReadingRegister
+                    
+        
+        return val
+   
+
+    def setProximityIntHighThreshold(self, threshold):
+        """
+            .. method:: setProximityIntHighThreshold(threshold)
+                
+                Sets the high threshold for proximity interrupts
+                
+                threshold: 
+                    the high threshold value for interrupt to trigger
+            
+        """
+        
+        try:       
+            self._write_bytes(APDS9960_PIHT,threshold)
+        except:
+           raise ErrorWritingRegister
+
+
+    def getAmbientLightIntEnable(self):
+        """
+            .. method:: getAmbientLightIntEnable()
+                
+                Gets if ambient light interrupts are enabled or not
+                
+                Return:
+                    1 if interrupts are enabled, 0 if not.
+        """
+        
+        try:
+            val = self.write_read(APDS9960_ENABLE, 1)[0]
+        except:
+            raise ErrorReadingRegister
+
+        # Shift and mask out AIEN bit */
+        val = (val >> 4) & 0b00000001
+    
+        return val
+
+
+
+    def setAmbientLightIntEnable(self, enable):
+        """
+            .. method:: setAmbientLightIntEnable(enable)
+                
+                Turns ambient light interrupts on or off
+                
+                enable:
+                    1 to enable interrupts or 0 to turn them off
+        """
+
+        # Set bits in register to given value */
+        self._update_bits(APDS9960_ENABLE, 0b00010000, enable << 4)
+   
+
+    def getProximityIntEnable(self):
+        """
+            .. method:: getProximityIntEnable()
+                
+                Gets if proximity interrupts are enabled or not
+                
+                Return:
+                    1 if interrupts are enabled or 0 if not.
+        """
+        
+        try:
+            val = self.write_read(APDS9960_ENABLE, 1)[0]
+        except:
+            raise ErrorReadingRegister
+
+   
+        # Shift and mask out PIEN bit */
+        val = (val >> 5) & 0b00000001
+        
+        return val
+
+
+    def setProximityIntEnable(self, enable):
+        """
+            .. method:: setProximityIntEnable(enable)
+            
+                Turns proximity interrupts on or off
+                
+                enable:
+                    1 to enable interrupts or 0 to turn them off
+        """
+
+        # Set bits in register to given value */
+        self._update_bits(APDS9960_ENABLE, 0b00100000, enable << 5)
+   
+
+    def getGestureIntEnable(self):
+        """
+            .. method:: getGestureIntEnable()
+            
+                Gets if gesture interrupts are enabled or not
+                
+                return:
+                    1 if interrupts are enabled or 0 if not.
+        """
+        try:
+            val = self.write_read(APDS9960_GCONF4, 1)[0]
+        except:
+            raise ErrorReadingRegister
+    
+   
+    
+        # Shift and mask out GIEN bit */
+        val = (val >> 1) & 0b00000001
+        
+        return val
+
+
+    def setGestureIntEnable(self, enable):
+
+        """
+            .. method:: setGestureIntEnable(enable)
+            
+                Turns gesture-related interrupts on or off
+                
+                enable:
+                    1 to enable interrupts or 0 to turn them off
+        """
+
+        # Set bits in register to given value */
+        self._update_bits(APDS9960_GCONF4, 0b00000010, enable << 1)
+   
+
+
+    def clearAmbientLightInt(self):
+        """
+            .. method:: clearAmbientLightInt()
+            
+                Clears the ambient light interrupt
+            
+        """
+        
+        try:
+            val = self.write_read(APDS9960_AICLEAR, 1)[0]
+        except:
+            raise ErrorReadingRegister
+  
+
+
+    def clearProximityInt(self):
+        """
+            .. method:: clearProximityInt()
+            
+                Clears the proximity interrupt
+                
+        """
+            
+        try:
+            val = self.write_read(APDS9960_PICLEAR, 1)[0]
+        except:
+            raise ErrorReadingRegister
+         
+
+  
+
+    def getGestureMode(self):
+        """
+            .. method:: getGestureMode()
+            
+                Tells if the gesture state machine is currently running
+                
+                return:
+                    1 if gesture state machine is running or 0 if not
+        """        
+        
+        try:
+            val = self.write_read(APDS9960_GCONF4, 1)[0]
+        except:
+            raise ErrorReadingRegister
+
+        # Mask out GMODE bit */
+        val &= 0b00000001
+    
+        return val
+
+
+    def setGestureMode(self, mode):
+        """
+            .. method:: setGestureMode(mode)
+            
+                Tells the state machine to either enter or exit gesture state machine
+                
+                mode:
+                    1 to enter gesture state machine or 0 to exit.
+                
+        """
+
+        # Set bits in register to given value */
+        self._update_bits(APDS9960_GCONF4, 0b00000001, mode)
+        
+
+
+    def getProximityPersistence(self):
+        """
+            .. method:: getProximityPersistence()
+
+                Gets the proximity interrupt persistence filter (PPERS)
+
+                return:
+                    the number of consecutive out of range proximity cycles needed for an interrupt (0 = every cycle).
+        """
+        try:
+            val = self.write_read(APDS9960_PERS, 1)[0]
+        except:
+            raise ErrorReadingRegister
+
+        # Shift and mask out PPERS bits */
+        return (val >> 4) & 0b00001111
+
+    def setProximityPersistence(self, persistence):
+        """
+            .. method:: setProximityPersistence(persistence)
+
+                Sets the proximity interrupt persistence filter (PPERS)
+
+                persistence:
+                    the number (0-15) of consecutive out of range proximity cycles needed for an interrupt, 0 for every cycle
+        """
+
+        # Set bits in register to given value */
+        self._update_bits(APDS9960_PERS, 0b11110000, persistence << 4)
+
+    def getLightPersistence(self):
+        """
+            .. method:: getLightPersistence()
+
+                Gets the ambient light interrupt persistence filter (APERS)
+
+                return:
+                    the APERS value, see :meth:`setLightPersistence`.
+        """
+        try:
+            val = self.write_read(APDS9960_PERS, 1)[0]
+        except:
+            raise ErrorReadingRegister
+
+        # Mask out APERS bits */
+        return val & 0b00001111
+
+    def setLightPersistence(self, persistence):
+        """
+            .. method:: setLightPersistence(persistence)
+
+                Sets the ambient light interrupt persistence filter (APERS)
+
+                +----------+-------------------------------------+
+                |  Value   |  Consecutive out of range cycles    |
+                +==========+=====================================+
+                |    0     |     every cycle                     |
+                +----------+-------------------------------------+
+                |  1 - 3   |     1 - 3                           |
+                +----------+-------------------------------------+
+                |  4 - 15  |     5 * (value - 3), up to 60       |
+                +----------+-------------------------------------+
+        """
+
+        # Set bits in register to given value */
+        self._update_bits(APDS9960_PERS, 0b00001111, persistence)
+
+    def getWaitTime(self):
+        """
+            .. method:: getWaitTime()
+
+                Gets the WTIME register: the wait between two cycles is (256 - WTIME) * 2.78 ms, 12 times longer with WLONG
+        """
+        try:
+            val = self.write_read(APDS9960_WTIME, 1)[0]
+        except:
+            raise ErrorReadingRegister
+
+        return val
+
+    def setWaitTime(self, wtime):
+        """
+            .. method:: setWaitTime(wtime)
+
+                Sets the WTIME register, see :meth:`getWaitTime`
+        """
+        self._write_bytes(APDS9960_WTIME, wtime)
+
+    def getWaitLong(self):
+        """
+            .. method:: getWaitLong()
+
+                Gets the WLONG bit: 1 if the wait time is multiplied by 12, 0 if not
+        """
+        try:
+            val = self.write_read(APDS9960_CONFIG1, 1)[0]
+        except:
+            raise ErrorReadingRegister
+
+        # Shift and mask out WLONG bit */
+        return (val >> 1) & 0b00000001
+
+    def setWaitLong(self, enable):
+        """
+            .. method:: setWaitLong(enable)
+
+                Sets the WLONG bit: 1 to multiply the wait time by 12, 0 to not
+        """
+
+        # Set bits in register to given value */
+        self._update_bits(APDS9960_CONFIG1, APDS9960_WLONG, enable << 1)
+
+    def setWaitPeriod(self, period):
+        """
+            .. method:: setWaitPeriod(period)
+
+                Sets WTIME and WLONG for a wait of ``period`` ms between two cycles (up to 8.5 s)
+                and enables the wait state.
+
+                return:
+                    the actual wait period in ms.
+        """
+        wtime, wlong, actual = _waitSettings(period)
+        with self.transaction():
+            written = self._writeWait(wtime, wlong)
+            written = self._write_cached(APDS9960_ENABLE, self.getMode() | APDS9960_WEN, False) or written
+        # A single settle, without holding the bus
+        if written:
+            sleep(100)
+        return actual
+
+    def _writeWait(self, wtime, wlong):
+        # Writes WTIME and the WLONG bit of CONFIG1 without settling, returns True if a register changed
+        config1 = self._read_cached(APDS9960_CONFIG1) & ~APDS9960_WLONG
+        if wlong:
+            config1 |= APDS9960_WLONG
+        written = self._write_cached(APDS9960_WTIME, wtime, False)
+        return self._write_cached(APDS9960_CONFIG1, config1, False) or written
+
+    def low_power_watch(self, low, high, persistence=4, period=1000):
+        """
+            .. method:: low_power_watch(low, high, persistence=4, period=1000)
+
+                Keeps the host asleep until a qualified proximity event
+
+                Only proximity runs, once every ``period`` ms, and INT is raised only after
+                ``persistence`` consecutive conversions outside the ``low``-``high`` window.
+                Ambient light and gesture sensing are turned off. Clear the interrupt
+                with :meth:`clearProximityInt` after handling it.
+
+                return:
+                    the actual wait period in ms.
+        """
+        wtime, wlong, actual = _waitSettings(period)
+        with self.transaction():
+            written = self._write_cached(APDS9960_PILT, low, False)
+            written = self._write_cached(APDS9960_PIHT, high, False) or written
+            pers = (self._read_cached(APDS9960_PERS) & 0b00001111) | ((persistence & 0b00001111) << 4)
+            written = self._write_cached(APDS9960_PERS, pers, False) or written
+            written = self._writeWait(wtime, wlong) or written
+            written = self._write_cached(APDS9960_ENABLE, APDS9960_PON | APDS9960_PEN | APDS9960_WEN | APDS9960_PIEN, False) or written
+            self.clearProximityInt()
+        # A single settle, without holding the bus
+        if written:
+            sleep(100)
+        return actual
+
+    def _measureProximity(self, settle, samples):
+        # Average of the next proximity conversions
+        total = 0
+        for i in range(samples):
+            sleep(settle)
+            total += self.readProximity()
+        return total // samples
+
+    def _searchProximityOffset(self, reg, target, settle, samples):
+        # Binary search of the offset that brings PDATA down to target.
+        # PDATA decreases as the offset grows, 8 steps cover -127..127
+        lo = -127
+        hi = 127
+        while lo < hi:
+            mid = (lo + hi) // 2
+            self._write_cached(reg, _toSignMagnitude(mid))
+            if self._measureProximity(settle, samples) > target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def calibrateProximityOffset(self, target=PROX_CAL_FLOOR, settle=PROX_CAL_SETTLE, samples=1):
+        """
+            .. method:: calibrateProximityOffset(target=PROX_CAL_FLOOR, settle=PROX_CAL_SETTLE, samples=1)
+
+                Compensates the crosstalk of the cover glass with the POFFSET_UR and POFFSET_DL registers
+
+                Run it with the proximity sensor enabled and no target in front of the sensor.
+                Each photodiode pair is isolated with :meth:`setProxPhotoMask`, its baseline
+                is measured and its offset is searched so that the no-target reading lands
+                at ``target``. It takes at most 18 proximity measurements.
+
+                settle:
+                    the wait (ms) for a new proximity conversion, at least one proximity cycle
+
+                samples:
+                    the conversions averaged for each measurement
+
+                return:
+                    the :class:`ProximityCalibration`, already applied.
+        """
+        # Every register write and proximity read takes the device lock on its own,
+        # other users of the sensor run during the settle times
+        calibration = ProximityCalibration()
+        config3 = self._read_cached(APDS9960_CONFIG3)
+        try:
+            # Gain compensation keeps the pair readings on the full scale
+            self._write_cached(APDS9960_CONFIG3, (config3 & 0b11010000) | 0b00100000 | PMASK_UR)
+            self._write_cached(APDS9960_POFFSET_UR, 0)
+            calibration.baseline_ur = self._measureProximity(settle, samples)
+            calibration.ur = self._searchProximityOffset(APDS9960_POFFSET_UR, target, settle, samples)
+
+            self._write_cached(APDS9960_CONFIG3, (config3 & 0b11010000) | 0b00100000 | PMASK_DL)
+            self._write_cached(APDS9960_POFFSET_DL, 0)
+            calibration.baseline_dl = self._measureProximity(settle, samples)
+            calibration.dl = self._searchProximityOffset(APDS9960_POFFSET_DL, target, settle, samples)
+        finally:
+            self._write_cached(APDS9960_CONFIG3, config3)
+        calibration.apply(self)
+        return calibration
+
+    def _writeGestureOffsets(self, offsets):
+        # Writes the (u, d, l, r) gesture offsets that differ from the cache with at most
+        # two transactions: GOFFSET_U, GOFFSET_D, GPULSE (cached value) and GOFFSET_L are
+        # contiguous, GOFFSET_R is alone after a reserved register
+        block = [_toSignMagnitude(offsets[0]), _toSignMagnitude(offsets[1]), 0, _toSignMagnitude(offsets[2])]
+        with self.transaction():
+            block[2] = self._read_cached(APDS9960_GPULSE)
+            for i in range(4):
+                reg = APDS9960_GOFFSET_U + i
+                if reg not in self._shadow or self._shadow[reg] != block[i]:
+                    self._write_block(APDS9960_GOFFSET_U, block)
+                    break
+            self._write_cached(APDS9960_GOFFSET_R, _toSignMagnitude(offsets[3]), False)
+
+    def _measureGestureFifo(self, gconf4, settle, samples):
+        # Averages of U, D, L and R over the next samples datasets of the gesture FIFO
+        totals = [0, 0, 0, 0]
+        n = 0
+        tries = 0
+        self._write_reg(APDS9960_GCONF4, gconf4 | APDS9960_GFIFO_CLR)
+        while n < samples:
+            sleep(settle)
+            with self.transaction():
+                try:
+                    fifo_level = self.write_read(APDS9960_GFLVL, 1)[0]
+                except:
+                    raise ErrorReadingRegister
+                if fifo_level > 0:
+                    self._readFifoChunks(fifo_level * 4)
+                    for i in range(0, fifo_level * 4, 4):
+                        for k in range(4):
+                            totals[k] += self._fifoBuf[i + k]
+            if fifo_level == 0:
+                tries += 1
+                if tries > 10:
+                    # The gesture engine is not running
+                    raise ErrorDevice
+                continue
+            n += fifo_level
+        return [total // n for total in totals]
+
+    def calibrateGestureOffset(self, target=GESTURE_CAL_FLOOR, settle=GESTURE_CAL_SETTLE, samples=8):
+        """
+            .. method:: calibrateGestureOffset(target=GESTURE_CAL_FLOOR, settle=GESTURE_CAL_SETTLE, samples=8)
+
+                Compensates the crosstalk and the asymmetry of the photodiodes with the GOFFSET_U/D/L/R registers
+
+                Run it with the gesture engine enabled (:meth:`enableGestureSensor`) and no target
+                in front of the sensor. The gesture state machine is held on (GMODE, exit threshold 0),
+                the no-target baseline of each photodiode is measured and the four offsets are
+                binary searched together, so that every channel lands at ``target`` and the
+                UP/DOWN and LEFT/RIGHT pairs are balanced. Each of the 8 steps writes the
+                offsets with at most two transactions and averages ``samples`` FIFO datasets.
+                GEXTH and GCONF4 are restored at the end.
+
+                settle:
+                    the wait (ms) for new datasets in the FIFO
+
+                return:
+                    the :class:`GestureCalibration`, already applied.
+        """
+        # Every step takes the device lock on its own, other users of the sensor run during the waits
+        calibration = GestureCalibration()
+        gexth = self._read_cached(APDS9960_GEXTH)
+        try:
+            gconf4 = self.write_read(APDS9960_GCONF4, 1)[0]
+        except:
+            raise ErrorReadingRegister
+        hold = gconf4 | 0b00000001
+        try:
+            with self.transaction():
+                self._write_cached(APDS9960_GEXTH, 0, False)
+                self._write_reg(APDS9960_GCONF4, hold)
+            self._writeGestureOffsets((0, 0, 0, 0))
+            calibration.baseline = self._measureGestureFifo(hold, settle, samples)
+
+            lo = [-127, -127, -127, -127]
+            hi = [127, 127, 127, 127]
+            for step in range(8):
+                mid = [(lo[k] + hi[k]) // 2 for k in range(4)]
+                self._writeGestureOffsets(mid)
+                values = self._measureGestureFifo(hold, settle, samples)
+                for k in range(4):
+                    if lo[k] < hi[k]:
+                        if values[k] > target:
+                            lo[k] = mid[k] + 1
+                        else:
+                            hi[k] = mid[k]
+        finally:
+            # Exit threshold and GCONF4 as they were before the calibration
+            with self.transaction():
+                self._write_cached(APDS9960_GEXTH, gexth, False)
+                self._write_reg(APDS9960_GCONF4, gconf4)
+        calibration.u, calibration.d, calibration.l, calibration.r = lo
+        calibration.apply(self)
+        return calibration
+
+    def _printDEBUG(self, *msg):
+        if DEBUG:
+            print(*msg)
+
+    def _write_bytes(self,reg , val):
+        self._write_reg(reg, val)
+        sleep(100)
+
+    def _write_reg(self, reg, val):
+        # Writes a register without waiting for it to settle
+        self._lock.acquire()
+        try:   
+            self.write_bytes(reg, val)
+            self._shadow[reg] = val
+        except:
+            raise ErrorWritingRegister
+        finally:
+            self._lock.release()
+
+    def _write_block(self, reg, values):
+        # Writes consecutive registers with a single auto-increment transaction
+        self._lock.acquire()
+        try:
+            self.write_bytes(reg, *values)
+            for i in range(len(values)):
+                self._shadow[reg + i] = values[i]
+        except:
+            raise ErrorWritingRegister
+        finally:
+            self._lock.release()
+
+    def _update_bits(self, reg, mask, value):
+        # Read-modify-write of the bits in mask, as a single transaction
+        self._lock.acquire()
+        try:
+            try:
+                val = self.write_read(reg, 1)[0]
+            except:
+                raise ErrorReadingRegister
+            self._write_reg(reg, (val & ~mask) | (value & mask))
+        finally:
+            self._lock.release()
+        sleep(100)
+
+    def _read_word(self, reg):
+        # Reads a 16-bit value (low byte first) with a single burst
+        try:
+            data = self.write_read(reg, 2)
+        except:
+            raise ErrorReadingRegister
+        return data[0] + (data[1] << 8)
+
+    def _write_word(self, reg, val):
+        # Writes a 16-bit value (low byte first) as a single transaction
+        self._lock.acquire()
+        try:
+            self._write_reg(reg, val & 0x00FF)
+            self._write_reg(reg + 1, (val & 0xFF00) >> 8)
+        finally:
+            self._lock.release()
+        sleep(100)
+
+    def _read_cached(self, reg):
+        # Returns the cached value of a configuration register, the device
+        # is read only the first time the register is needed
+        if reg not in self._shadow:
+            try:
+                self._shadow[reg] = self.write_read(reg, 1)[0]
+            except:
+                raise ErrorReadingRegister
+        return self._shadow[reg]
+
+    def _write_cached(self, reg, val, settle=True):
+        # Writes a configuration register only if the cached value differs
+        self._lock.acquire()
+        try:
+            if reg in self._shadow and self._shadow[reg] == val:
+                return False
+            self._write_reg(reg, val)
+        finally:
+            self._lock.release()
+        if settle:
+            sleep(100)
+        return True
+
+
+
+
+class Scheduler():
+    """
+    ===================
+    The Scheduler class
+    ===================
+
+.. class:: Scheduler(sensor)
+
+    Runs ambient light, proximity and gesture sensing together on one APDS-9960.
+
+    Every consumer declares the rate (Hz) and the latency (ms) it needs for a
+    function (``AMBIENT_LIGHT``, ``PROXIMITY`` or ``GESTURE``). The scheduler
+    computes a register plan (ENABLE, ATIME, WTIME, CONFIG1, CONFIG2, GCONF2)
+    using the longest state machine cycle that still meets every target, so
+    the LED fires as rarely as possible, and a read schedule that never reads
+    a result faster than the chip produces it.
+
+    Only the registers that differ from the last written values are reprogrammed.
+     """
+
+    def __init__(self, sensor):
+        self.sensor = sensor
+        self.cycle_ms = 0
+        self._consumers = {}
+        self._next_id = 0
+        self._schedule = {}
+
+    def addConsumer(self, function, rate, latency=None):
+        """
+            .. method:: addConsumer(function, rate, latency=None)
+
+                Declares a new consumer of a sensor function
+
+                function:
+                    ``AMBIENT_LIGHT``, ``PROXIMITY`` or ``GESTURE``
+
+                rate:
+                    the number of samples per second needed
+
+                latency:
+                    the maximum age (ms) of a sample when it is read
+
+                return:
+                    the consumer id.
+
+                Call :meth:`apply` to program the new plan.
+        """
+        if function != AMBIENT_LIGHT and function != PROXIMITY and function != GESTURE:
+            raise ValueError
+        cid = self._next_id
+        self._next_id += 1
+        self._consumers[cid] = [function, rate, latency]
+        return cid
+
+    def setConsumer(self, cid, rate, latency=None):
+        """
+            .. method:: setConsumer(cid, rate, latency=None)
+
+                Changes the rate and latency of a consumer. Call :meth:`apply` to program the new plan.
+        """
+        self._consumers[cid][1] = rate
+        self._consumers[cid][2] = latency
+
+    def removeConsumer(self, cid):
+        """
+            .. method:: removeConsumer(cid)
+
+                Removes a consumer. Call :meth:`apply` to program the new plan.
+        """
+        del self._consumers[cid]
+
+    def _requirements(self):
+        # Merges the consumers into the highest rate and lowest latency per function
+        rates = {AMBIENT_LIGHT: 0, PROXIMITY: 0, GESTURE: 0}
+        latencies = {AMBIENT_LIGHT: None, PROXIMITY: None, GESTURE: None}
+        for cid in self._consumers:
+            function, rate, latency = self._consumers[cid]
+            if rate > rates[function]:
+                rates[function] = rate
+            if latency is not None and (latencies[function] is None or latency < latencies[function]):
+                latencies[function] = latency
+        return rates, latencies
+
+    def _interval(self, rate, latency):
+        interval = 1000 / rate
+        if latency is not None and latency < interval:
+            interval = latency
+        if interval < self.cycle_ms:
+            interval = self.cycle_ms
+        return interval
+
+    def plan(self):
+        """
+            .. method:: plan()
+
+                Computes the register plan for the current consumers without writing it
+
+                return:
+                    a list of (register, value) pairs, in the order they must be written.
+        """
+        return self._plan()[0]
+
+    def _plan(self):
+        # The register plan and the state machine cycle (ms) it gives
+        sensor = self.sensor
+        rates, latencies = self._requirements()
+        als = rates[AMBIENT_LIGHT] > 0
+        prox = rates[PROXIMITY] > 0
+        gesture = rates[GESTURE] > 0
+
+        # The state machine cycle must be short enough for every rate and latency.
+        # Gesture entry happens on a proximity cycle, so only its latency counts here
+        cycle = None
+        for function in (AMBIENT_LIGHT, PROXIMITY, GESTURE):
+            if rates[function] > 0:
+                bound = latencies[function]
+                if function != GESTURE and (bound is None or 1000 / rates[function] < bound):
+                    bound = 1000 / rates[function]
+                if bound is not None and (cycle is None or bound < cycle):
+                    cycle = bound
+
+        prox_ms = 0
+        if prox or gesture:
+            prox_ms = PROX_TIME_MS
+
+        plan = []
+        enable = sensor._read_cached(APDS9960_ENABLE) & (APSD9960_AIEN | APDS9960_PIEN)
+        if als or prox or gesture:
+            enable |= APDS9960_PON
+
+        als_ms = 0
+        if als:
+            # Integrate as long as the cycle allows, up to the default integration time
+            steps = 256 - DEFAULT_ATIME
+            if cycle is not None and (cycle - prox_ms) < steps * CYCLE_STEP_MS:
+                steps = int((cycle - prox_ms) / CYCLE_STEP_MS)
+            if steps < 1:
+                steps = 1
+            als_ms = steps * CYCLE_STEP_MS
+            plan.append((APDS9960_ATIME, 256 - steps))
+            enable |= APDS9960_AEN
+
+        if prox or gesture:
+            enable |= APDS9960_PEN
+
+        # The rest of the cycle is spent in the low power wait state
+        if cycle is None:
+            cycle = prox_ms + als_ms
+        wait_ms = cycle - prox_ms - als_ms
+        if wait_ms >= CYCLE_STEP_MS:
+            wtime, wlong, wait_ms = _waitSettings(wait_ms)
+            config1 = sensor._read_cached(APDS9960_CONFIG1) & ~APDS9960_WLONG
+            if wlong:
+                config1 |= APDS9960_WLONG
+            plan.append((APDS9960_WTIME, wtime))
+            plan.append((APDS9960_CONFIG1, config1))
+            enable |= APDS9960_WEN
+        else:
+            wait_ms = 0
+
+        # LED boost is only needed by the gesture engine
+        config2 = sensor._read_cached(APDS9960_CONFIG2) & 0b11001111
+        if gesture:
+            config2 |= LED_BOOST_300 << 4
+
+            # Longest gesture wait that still delivers the requested dataset rate
+            gwtime = 0
+            for i in range(len(GWTIME_MS)):
+                if GWTIME_MS[i] + PROX_TIME_MS <= 1000 / rates[GESTURE]:
+                    gwtime = i
+            plan.append((APDS9960_GCONF2, (sensor._read_cached(APDS9960_GCONF2) & 0b11111000) | gwtime))
+            enable |= APDS9960_GEN
+        plan.append((APDS9960_CONFIG2, config2))
+
+        # ENABLE goes last so the functions start with the new timing
+        plan.append((APDS9960_ENABLE, enable))
+
+        return (plan, prox_ms + als_ms + wait_ms)
+
+    def apply(self):
+        """
+            .. method:: apply()
+
+                Computes the register plan and writes the registers that changed
+
+                return:
+                    the number of registers written.
+        """
+        plan, cycle = self._plan()
+        written = 0
+        with self.sensor.transaction():
+            for reg, val in plan:
+                if self.sensor._write_cached(reg, val, False):
+                    written += 1
+        # A single settle for the whole plan, without holding the bus
+        if written:
+            sleep(100)
+
+        self.cycle_ms = cycle
+        rates, latencies = self._requirements()
+        now = timers.now()
+        schedule = {}
+        for function in (AMBIENT_LIGHT, PROXIMITY, GESTURE):
+            if rates[function] > 0:
+                interval = self._interval(rates[function], latencies[function])
+                if function in self._schedule and self._schedule[function][0] == interval:
+                    schedule[function] = self._schedule[function]
+                else:
+                    schedule[function] = [interval, now + interval]
+        self._schedule = schedule
+        return written
+
+    def nextDeadline(self):
+        """
+            .. method:: nextDeadline()
+
+                Returns the time (as :func:`timers.now`) of the next scheduled read, or None if nothing is scheduled
+        """
+        deadline = None
+        for function in self._schedule:
+            if deadline is None or self._schedule[function][1] < deadline:
+                deadline = self._schedule[function][1]
+        return deadline
+
+    def poll(self, now=None):
+        """
+            .. method:: poll(now=None)
+
+                Reads the functions whose deadline has passed
+
+                return:
+                    a list of (function, value) pairs. Ambient light values are
+                    (clear, red, green, blue) tuples, proximity values are 8-bit
+                    values and gesture values are directions.
+
+                Ambient light and proximity due together are read with a single burst.
+        """
+        if now is None:
+            now = timers.now()
+        due = []
+        for function in self._schedule:
+            entry = self._schedule[function]
+            if now >= entry[1]:
+                due.append(function)
+                entry[1] += entry[0]
+                if entry[1] <= now:
+                    entry[1] = now + entry[0]
+
+        results = []
+        if AMBIENT_LIGHT in due and PROXIMITY in due:
+            # CDATAL..BDATAH and PDATA are contiguous
+            color, data = self.sensor._readColorData(9)
+            results.append((AMBIENT_LIGHT, color))
+            results.append((PROXIMITY, data[8]))
+        elif AMBIENT_LIGHT in due:
+            results.append((AMBIENT_LIGHT, self.sensor.readColor()))
+        elif PROXIMITY in due:
+            results.append((PROXIMITY, self.sensor.readProximity()))
+
+        if GESTURE in due and self.sensor.isGestureAvailable():
+            results.append((GESTURE, self.sensor.readGesture()))
+        return results
+
+
+
+class SampleRing():
+    """
+    ====================
+    The SampleRing class
+    ====================
+
+.. class:: SampleRing(size)
+
+    Fixed size ring buffer of timestamped samples with a single producer.
+
+    All the slots are allocated at construction. The producer never waits for
+    the consumers: when a consumer falls more than ``size`` samples behind,
+    the oldest samples are overwritten and the consumer detects the overrun
+    from the sequence numbers (see :class:`RingReader`).
+     """
+
+    def __init__(self, size):
+        self.size = size
+        self.head = 0
+        self._seq = [-1 for x in range(size)]
+        self._time = [0 for x in range(size)]
+        self._kind = [0 for x in range(size)]
+        self._value = [None for x in range(size)]
+
+    def push(self, kind, value, timestamp):
+        """
+            .. method:: push(kind, value, timestamp)
+
+                Stores a sample, overwriting the oldest one when the ring is full. Only one thread may push.
+        """
+        seq = self.head
+        i = seq % self.size
+        # Invalidate the slot first so that a reader never mixes two samples
+        self._seq[i] = -1
+        self._time[i] = timestamp
+        self._kind[i] = kind
+        self._value[i] = value
+        self._seq[i] = seq
+        self.head = seq + 1
+
+
+
+class RingReader():
+    """
+    ====================
+    The RingReader class
+    ====================
+
+.. class:: RingReader(ring)
+
+    Consumer cursor on a :class:`SampleRing`. Every consumer owns its reader,
+    reading never blocks and never modifies the ring.
+
+    Only samples pushed after the reader creation are returned.
+    ``lost`` counts the samples overwritten before they could be read.
+     """
+
+    def __init__(self, ring):
+        self.ring = ring
+        self.cursor = ring.head
+        self.lost = 0
+
+    def available(self):
+        """
+            .. method:: available()
+
+                Returns the number of samples waiting to be read, including the overwritten ones
+        """
+        return self.ring.head - self.cursor
+
+    def read(self):
+        """
+            .. method:: read()
+
+                Returns the next sample as a tuple (seq, timestamp, kind, value), or None if there is no new sample.
+        """
+        ring = self.ring
+        while True:
+            head = ring.head
+            if self.cursor >= head:
+                return None
+            if head - self.cursor > ring.size:
+                # The producer lapped us: skip to the oldest sample still stored
+                self.lost += head - ring.size - self.cursor
+                self.cursor = head - ring.size
+            i = self.cursor % ring.size
+            timestamp = ring._time[i]
+            kind = ring._kind[i]
+            value = ring._value[i]
+            if ring._seq[i] == self.cursor:
+                self.cursor += 1
+                return (self.cursor - 1, timestamp, kind, value)
+            # Overwritten while reading, try again from the new head
+            self.lost += 1
+            self.cursor += 1
+
+
+
+class AcquisitionWorker():
+    """
+    ===========================
+    The AcquisitionWorker class
+    ===========================
+
+.. class:: AcquisitionWorker(scheduler, size)
+
+    Background thread that owns the bus of the sensor driven by ``scheduler``
+    (a :class:`Scheduler`) and pushes every ambient light, proximity and gesture
+    result in a :class:`SampleRing` of ``size`` samples.
+
+    The kind of each sample is ``AMBIENT_LIGHT``, ``PROXIMITY`` or ``GESTURE``.
+    Other threads can still use the sensor, every bus access is a transaction
+    (see :meth:`APDS9960.transaction`).
+
+    ``errors`` counts the failed bus accesses, the worker keeps sampling after them.
+    Any other exception stops the thread. ``error`` keeps the last exception.
+     """
+
+    def __init__(self, scheduler, size):
+        self.scheduler = scheduler
+        self.ring = SampleRing(size)
+        self.errors = 0
+        self.error = None
+        self._running = False
+
+    def reader(self):
+        """
+            .. method:: reader()
+
+                Returns a new :class:`RingReader` on the samples of the worker
+        """
+        return RingReader(self.ring)
+
+    def start(self):
+        """
+            .. method:: start()
+
+                Applies the scheduler plan and starts the acquisition thread
+        """
+        self.scheduler.apply()
+        self._running = True
+        thread(self._run)
+
+    def stop(self):
+        """
+            .. method:: stop()
+
+                Stops the acquisition thread after the current read
+        """
+        self._running = False
+
+    def _run(self):
+        while self._running:
+            try:
+                now = timers.now()
+                for kind, value in self.scheduler.poll(now):
+                    self.ring.push(kind, value, now)
+            except (ErrorReadingRegister, ErrorWritingRegister, ErrorDevice) as e:
+                self.errors += 1
+                self.error = e
+                self.scheduler.sensor._printDEBUG(e)
+            except Exception as e:
+                # Not a bus error: a bug, that must not be retried forever
+                self.error = e
+                self._running = False
+                raise
+
+            deadline = self.scheduler.nextDeadline()
+            if deadline is None:
+                sleep(FIFO_PAUSE_TIME)
+            else:
+                wait = int(deadline - timers.now())
+                if wait > 0:
+                    sleep(wait)
+
+
+
+#Polling policies of SensorManager 
+ROUND_ROBIN          =  0
+DEADLINE             =  1
+
+#TCA9548A I2C multiplexer default address 
+TCA9548A_I2C_ADDR    =  0x70
+
+
+class I2CMux(i2c.I2C):
+    """
+    ================
+    The I2CMux class
+    ================
+
+.. class:: I2CMux(i2cdrv, addr=0x70, clk=100000, bus=None)
+
+    TCA9548A style I2C multiplexer: one control byte selects the downstream channels.
+
+    The selected channel is cached, so selecting the current channel again
+    costs no bus traffic.
+
+    ``bus`` is an optional backend with the methods of ``i2c.I2C`` (e.g. an
+    ``i2cdev.I2CDev`` for address ``addr``), like the ``bus`` argument of :class:`APDS9960`.
+    ``i2cdrv`` still identifies the bus shared with other multiplexers.
+     """
+
+    def __init__(self, i2cdrv, addr=TCA9548A_I2C_ADDR, clk=100000, bus=None):
+        if bus is None:
+            i2c.I2C.__init__(self, i2cdrv, addr, clk)
+        else:
+            self.write_bytes = bus.write_bytes
+            self.start = bus.start
+        self.bus = i2cdrv
+        self.channel = None
+        self.selects = 0
+        self.start()
+
+    def select(self, channel):
+        """
+            .. method:: select(channel)
 
-            
+                Connects the downstream bus ``channel`` (0-7), or disconnects all of them if ``channel`` is None
         """
-        
+        if channel == self.channel:
+            return
+        mask = 0
+        if channel is not None:
+            mask = 1 << channel
         try:
-            val = self.write_read(APDS9960_CONFIG3, 1)[0]
-        except:
-            raise ErrorReadingRegister 
-            
-        
-        # Set bits in register to given value */
-        mask &= 0b00001111
-        val &= 0b11110000
-        val |= mask
-    
-        try:       
-            self._write_bytes(APDS9960_CONFIG3, val)
+            self.write_bytes(mask)
         except:
+            self.channel = -1   # Unknown state, the next select must write
             raise ErrorWritingRegister
+        self.channel = channel
+        self.selects += 1
 
 
-    def getGestureEnterThresh(self):
+
+class DeviceStats():
+    """
+    =====================
+    The DeviceStats class
+    =====================
+
+.. class:: DeviceStats()
+
+    Polling statistics of a device of a :class:`SensorManager`. Times are in ms.
+
+    * ``samples``: successful reads
+    * ``errors``: failed reads
+    * ``total_latency``, ``max_latency``: duration of the reads, including the channel selection
+     """
+
+    def __init__(self):
+        self.samples = 0
+        self.errors = 0
+        self.total_latency = 0
+        self.max_latency = 0
+        self.start = None
+        self.last = None
+
+    def latency(self):
         """
-            .. method:: getGestureEnterThresh()
-                
-                Gets the entry proximity threshold for gesture sensing
+            .. method:: latency()
 
+                Returns the average read latency in ms
         """
-        
-        
-        try:
-            val = self.write_read(APDS9960_GPENTH, 1)[0]
-        except:
-            raise ErrorReadingRegister 
-        
-        return val
+        if self.samples == 0:
+            return 0
+        return self.total_latency / self.samples
 
+    def throughput(self):
+        """
+            .. method:: throughput()
 
-    def setGestureEnterThresh(self, threshold):
+                Returns the number of samples per second between the first and the last read
         """
-            .. method:: setGestureEnterThresh(threshold)
-                
-                Sets the entry proximity threshold for gesture sensing
-                
-                threshold: 
-                    the proximity value needed to start gesture mode
-                
+        if self.samples < 2 or self.last == self.start:
+            return 0
+        return (self.samples - 1) * 1000 / (self.last - self.start)
+
+
+
+class SensorManager():
+    """
+    =======================
+    The SensorManager class
+    =======================
+
+.. class:: SensorManager(policy=ROUND_ROBIN)
+
+    Polls many APDS-9960 spread over several buses and I2C multiplexers.
+
+    The APDS-9960 address is fixed, so the devices sharing a bus sit on different
+    channels of a :class:`I2CMux`. Before every read the manager selects the
+    channel of the device and disconnects the other multiplexers of the same bus.
+
+    ``policy`` is ``ROUND_ROBIN`` (every call of :meth:`poll` reads the next device)
+    or ``DEADLINE`` (every call reads the device whose period expired first).
+     """
+
+    def __init__(self, policy=ROUND_ROBIN):
+        self.policy = policy
+        self._devices = []
+        self._muxes = []
+        self._next = 0
+
+    def add(self, sensor, mux=None, channel=None, period=0, read=None):
         """
+            .. method:: add(sensor, mux=None, channel=None, period=0, read=None)
 
-        try:       
-            self._write_bytes(APDS9960_GPENTH, threshold)
-        except:
-            raise ErrorWritingRegister
+                Adds a device to the manager
 
+                sensor:
+                    the :class:`APDS9960` instance
 
+                mux, channel:
+                    the multiplexer and channel the device is connected to, None if the device is directly on the bus
 
-    def getGestureExitThresh(self):
+                period:
+                    the polling period in ms, used by the ``DEADLINE`` policy
+
+                read:
+                    function called with the sensor to take a sample, :meth:`APDS9960.readProximity` if None
+
+                return:
+                    the index of the device.
         """
-            .. method:: getGestureExitThresh()
-                
-                Gets the exit proximity threshold for gesture sensing
+        if mux is not None and mux not in self._muxes:
+            self._muxes.append(mux)
+        self._devices.append([sensor, mux, channel, period, read, timers.now(), DeviceStats()])
+        return len(self._devices) - 1
+
+    def select(self, index):
         """
-        
-        try:
-            val = self.write_read(APDS9960_GEXTH, 1)[0]
-        except:
-            raise ErrorReadingRegister 
-        
-        return val
+            .. method:: select(index)
 
+                Routes the bus to the device ``index`` and returns its sensor, to use it outside :meth:`poll`
+        """
+        device = self._devices[index]
+        mux = device[1]
+        if mux is not None:
+            for other in self._muxes:
+                if other is not mux and other.bus == mux.bus:
+                    other.select(None)
+            mux.select(device[2])
+        return device[0]
+
+    def stats(self, index):
+        """
+            .. method:: stats(index)
 
-    def setGestureExitThresh(self, threshold):
+                Returns the :class:`DeviceStats` of the device ``index``
         """
-            .. method:: setGestureExitThresh(threshold)
-                
-                Sets the exit proximity threshold for gesture sensing
-                
-                threshold:
-                    the proximity value needed to end gesture mode
-                
-                
+        return self._devices[index][6]
+
+    def _due(self, now):
+        if self.policy == DEADLINE:
+            best = None
+            for i in range(len(self._devices)):
+                if self._devices[i][5] <= now and (best is None or self._devices[i][5] < self._devices[best][5]):
+                    best = i
+            return best
+        if len(self._devices) == 0:
+            return None
+        i = self._next
+        self._next = (i + 1) % len(self._devices)
+        return i
+
+    def nextDeadline(self):
         """
-        
-        
-        try:       
-            self._write_bytes(APDS9960_GEXTH, threshold)
-        except:
-            raise ErrorWritingRegister
-      
+            .. method:: nextDeadline()
 
+                Returns the time (as :func:`timers.now`) when the next device is due with the ``DEADLINE`` policy
+        """
+        deadline = None
+        for device in self._devices:
+            if deadline is None or device[5] < deadline:
+                deadline = device[5]
+        return deadline
 
-    def getGestureGain(self):
+    def poll(self):
         """
-            .. method:: getGestureGain()
-            
-                Gets the gain of the photodiode during gesture mode
-                
+            .. method:: poll()
+
+                Reads the next device according to the policy
+
                 return:
-                    the value for the current photodiode gain.
-                
-                    +--------+----------+
-                    | Value  |  Gain    |
-                    +========+==========+
-                    |  0     |  1x      |
-                    +--------+----------+
-                    |  1     |  2x      |
-                    +--------+----------+
-                    |  2     |  4x      |
-                    +--------+----------+
-                    |  3     |  8x      |
-                    +--------+----------+
-                    
-                
+                    a tuple (index, value), or None if no device is due.
         """
-        
+        now = timers.now()
+        index = self._due(now)
+        if index is None:
+            return None
+        device = self._devices[index]
+        stats = device[6]
+        device[5] += device[3]
+        if device[5] <= now:
+            device[5] = now + device[3]
+
         try:
-            val = self.write_read(APDS9960_GCONF2, 1)
-        except:
-            raise ErrorReadingRegister
-        
-        #Shift and mask out GGAIN bits */
-        val = (val >> 5) & 0b00000011;
-    
-        return val
-    
-    def setGestureGain(self, value):
+            sensor = self.select(index)
+            if device[4] is None:
+                value = sensor.readProximity()
+            else:
+                value = device[4](sensor)
+        except Exception as e:
+            stats.errors += 1
+            raise e
+
+        end = timers.now()
+        latency = end - now
+        stats.samples += 1
+        stats.total_latency += latency
+        if latency > stats.max_latency:
+            stats.max_latency = latency
+        if stats.start is None:
+            stats.start = end
+        stats.last = end
+        return (index, value)
+
+
+
+class PresenceDetector():
+    """
+    ==========================
+    The PresenceDetector class
+    ==========================
+
+.. class:: PresenceDetector(sensor, near=DEFAULT_PIHT, far=DEFAULT_PIHT - 20, near_dwell=0, far_dwell=0)
+
+    Turns proximity samples into NEAR/FAR presence transitions.
+
+    The state becomes ``NEAR_STATE`` when the proximity stays at or above ``near``
+    for ``near_dwell`` ms, and goes back to ``FAR_STATE`` when it stays at or below
+    ``far`` for ``far_dwell`` ms. ``far`` must be lower than ``near``: the gap is the
+    hysteresis band, where the state never changes. Both are 8-bit proximity values,
+    ``ValueError`` is raised otherwise.
+
+    Samples can be polled (:meth:`poll`) or interrupt driven: :meth:`arm` programs
+    the PILT/PIHT window so that INT only fires when the opposite threshold is
+    crossed, and :meth:`service` handles the interrupt and re-arms the window
+    after each transition. While a dwell time is running INT fires at every
+    conversion, so no extra timer is needed.
+     """
+
+    def __init__(self, sensor, near=DEFAULT_PIHT, far=DEFAULT_PIHT - 20, near_dwell=0, far_dwell=0):
+        if far < 0 or near > 255 or far >= near:
+            raise ValueError
+        self.sensor = sensor
+        self.near = near
+        self.far = far
+        self.near_dwell = near_dwell
+        self.far_dwell = far_dwell
+        self.state = FAR_STATE
+        self._since = None
+
+    def pending(self):
         """
-            .. method:: setGestureGain(value)
-            
-                Sets the gain of the photodiode during gesture mode
-                
-                value:
-                    the value for the gain of the gesture
-                    
-             
-                +--------+----------+
-                | Value  |  Gain    |
-                +========+==========+
-                |  0     |  1x      |
-                +--------+----------+
-                |  1     |  2x      |
-                +--------+----------+
-                |  2     |  4x      |
-                +--------+----------+
-                |  3     |  8x      |
-                +--------+----------+
-            
+            .. method:: pending()
+
+                Returns True while a transition is waiting for its dwell time
         """
-        try:
-            val = self.write_read(APDS9960_GCONF2, 1)[0]
-        except:
-            raise ErrorReadingRegister
-            
-        # Set bits in register to given value
-        value &= 0b00000011
-        value = value << 5
-        val &= 0b10011111
-        val |= value
-        
-        #Write register value back into GCONF2 register
-        try:       
-            self._write_bytes(APDS9960_GCONF2,val)
-            
-        except:
-           raise ErrorWritingRegister
+        return self._since is not None
 
+    def update(self, value, now=None):
+        """
+            .. method:: update(value, now=None)
 
-    def getGestureLEDDrive(self):
+                Feeds a proximity sample taken at time ``now`` (ms, :func:`timers.now` if None)
+
+                return:
+                    a tuple (state, timestamp) on a transition, None otherwise.
         """
-            .. method:: getGestureLEDDrive()
-            
-                Gets the drive current of the LED during gesture mode
-                
+        if now is None:
+            now = timers.now()
+        if self.state == FAR_STATE:
+            crossed = value >= self.near
+            dwell = self.near_dwell
+        else:
+            crossed = value <= self.far
+            dwell = self.far_dwell
+
+        if not crossed:
+            self._since = None
+            return None
+        if self._since is None:
+            self._since = now
+        if now - self._since < dwell:
+            return None
+
+        self._since = None
+        if self.state == FAR_STATE:
+            self.state = NEAR_STATE
+        else:
+            self.state = FAR_STATE
+        return (self.state, now)
+
+    def poll(self):
+        """
+            .. method:: poll()
+
+                Reads the proximity and feeds it to :meth:`update`. Polling faster than the proximity conversion rate gives no new data.
+        """
+        return self.update(self.sensor.readProximity())
+
+    def arm(self):
+        """
+            .. method:: arm()
+
+                Programs the proximity interrupt window for the current state, writing only the thresholds that changed
+        """
+        if self.state == FAR_STATE:
+            low = 0
+            high = self.near - 1
+        else:
+            low = self.far + 1
+            high = 255
+        with self.sensor.transaction():
+            written = self.sensor._write_cached(APDS9960_PILT, low, False)
+            written = self.sensor._write_cached(APDS9960_PIHT, high, False) or written
+        if written:
+            sleep(100)
+
+    def service(self):
+        """
+            .. method:: service()
+
+                Handles a proximity interrupt: feeds the current proximity, re-arms the window after a transition and clears the interrupt
+
                 return:
-                    the LED drive current value.
+                    a tuple (state, timestamp) on a transition, None otherwise.
+        """
+        transition = self.poll()
+        if transition is not None:
+            self.arm()
+        self.sensor.clearProximityInt()
+        return transition
 
-             
-                +--------+--------------+
-                | Value  |  LED Current |
-                +========+==============+
-                |  0     |   100 mA     |
-                +--------+--------------+
-                |  1     |    50 mA     |
-                +--------+--------------+
-                |  2     |    25 mA     |
-                +--------+--------------+
-                |  3     |    12.5 mA   |
-                +--------+--------------+
 
-             
+
+class ProximityCalibration():
+    """
+    ==============================
+    The ProximityCalibration class
+    ==============================
+
+.. class:: ProximityCalibration(ur=0, dl=0)
+
+    Proximity crosstalk calibration record, see :meth:`APDS9960.calibrateProximityOffset`.
+
+    ``ur`` and ``dl`` are the offsets (-127..127) of the UP/RIGHT and DOWN/LEFT pairs,
+    ``baseline_ur`` and ``baseline_dl`` the no-target readings before calibration.
+    The record serializes to 6 bytes, to be stored and applied again on the next start.
+     """
+
+    def __init__(self, ur=0, dl=0):
+        self.ur = ur
+        self.dl = dl
+        self.baseline_ur = 0
+        self.baseline_dl = 0
+
+    def apply(self, sensor):
         """
-        try:
-            val = self.write_read(APDS9960_GCONF2, 1)[0]
-        except:
-            raise ErrorReadingRegister
-        
-        #Shift and mask out GLDRIVE bits */
-        val = (val >> 3) & 0b00000011
-    
-        return val
-        
-    def setGestureLEDDrive(self, drive):
+            .. method:: apply(sensor)
+
+                Writes the offsets to the POFFSET_UR and POFFSET_DL registers of ``sensor``
         """
-            .. method:: setGestureLEDDrive(drive)
-            
-                Sets the LED drive current during gesture mode
-                
-                drive:
-                    the value for the LED drive current
-                
-                +--------+--------------+
-                | Value  |  LED Current |
-                +========+==============+
-                |  0     |   100 mA     |
-                +--------+--------------+
-                |  1     |    50 mA     |
-                +--------+--------------+
-                |  2     |    25 mA     |
-                +--------+--------------+
-                |  3     |    12.5 mA   |
-                +--------+--------------+
+        with sensor.transaction():
+            written = sensor._write_cached(APDS9960_POFFSET_UR, _toSignMagnitude(self.ur), False)
+            written = sensor._write_cached(APDS9960_POFFSET_DL, _toSignMagnitude(self.dl), False) or written
+        if written:
+            sleep(100)
+
+    def to_bytes(self):
+        """
+            .. method:: to_bytes()
+
+                Returns the record as bytes
+        """
+        return bytes(bytearray([0x50, 0x01, _toSignMagnitude(self.ur), _toSignMagnitude(self.dl), self.baseline_ur, self.baseline_dl]))
+
+    def from_bytes(data):
+        """
+            .. method:: from_bytes(data)
+
+                Builds a record from the bytes of :meth:`to_bytes` (static method)
+        """
+        if len(data) != 6 or data[0] != 0x50 or data[1] != 0x01:
+            raise ValueError
+        calibration = ProximityCalibration(_fromSignMagnitude(data[2]), _fromSignMagnitude(data[3]))
+        calibration.baseline_ur = data[4]
+        calibration.baseline_dl = data[5]
+        return calibration
+    from_bytes = staticmethod(from_bytes)
+
+
 
+class GestureCalibration():
+    """
+    ============================
+    The GestureCalibration class
+    ============================
 
-             
-                
+.. class:: GestureCalibration(u=0, d=0, l=0, r=0)
+
+    Gesture offset calibration record, see :meth:`APDS9960.calibrateGestureOffset`.
+
+    ``u``, ``d``, ``l`` and ``r`` are the offsets (-127..127) of the GOFFSET registers,
+    ``baseline`` the no-target [u, d, l, r] averages before calibration.
+    The record serializes to 10 bytes; apply it after :meth:`APDS9960.initialize` on the
+    next start instead of calibrating again.
+     """
+
+    def __init__(self, u=0, d=0, l=0, r=0):
+        self.u = u
+        self.d = d
+        self.l = l
+        self.r = r
+        self.baseline = [0, 0, 0, 0]
+
+    def apply(self, sensor):
         """
-        try:
-            val = self.write_read(APDS9960_GCONF2, 1)[0]
-        except:
-            raise ErrorReadingRegister
-        
-    
-        #Set bits in register to given value */
-        drive &= 0b00000011
-        drive = drive << 3
-        val &= 0b11100111
-        val |= drive
-        
-          #Write register value back into GCONF2 register
-        try:       
-            self._write_bytes(APDS9960_GCONF2,val)
-        except:
-           raise ErrorWritingRegister
+            .. method:: apply(sensor)
 
+                Writes the offsets to the GOFFSET_U/D/L/R registers of ``sensor``, with at most two transactions
+        """
+        sensor._writeGestureOffsets((self.u, self.d, self.l, self.r))
 
+    def to_bytes(self):
+        """
+            .. method:: to_bytes()
 
-    def getGestureWaitTime(self):
+                Returns the record as bytes
         """
-            .. method: getGestureWaitTime
-                Gets the time in low power mode between gesture detections
-                
-                return:
-                    the current wait time between gestures.
+        return bytes(bytearray([0x47, 0x01, _toSignMagnitude(self.u), _toSignMagnitude(self.d), _toSignMagnitude(self.l), _toSignMagnitude(self.r)] + self.baseline))
 
-             
-                +----------+-------------+
-                |  Value   |  Wait time  |
-                +==========+=============+
-                |    0     |     0 ms    |
-                +----------+-------------+
-                |    1     |     2.8 ms  |
-                +----------+-------------+
-                |    2     |     5.6 ms  |
-                +----------+-------------+
-                |    3     |     8.4 ms  |
-                +----------+-------------+
-                |    4     |    14.0 ms  |
-                +----------+-------------+
-                |    5     |    22.4 ms  |
-                +----------+-------------+
-                |    6     |    30.8 ms  |
-                +----------+-------------+
-                |    7     |    39.2 ms  |
-                +----------+-------------+
-             
+    def from_bytes(data):
         """
-        try:
-            val = self.write_read(APDS9960_GCONF2, 1)[0]
-        except:
-            raise ErrorReadingRegister
-    
-        #Mask out GWTIME bits */
-        val &= 0b00000111
-    
-        return val
+            .. method:: from_bytes(data)
 
-    def setGestureWaitTime(self, time):
+                Builds a record from the bytes of :meth:`to_bytes` (static method)
         """
-            .. method:: setGestureWaitTime(time)
-            
-                Sets the time in low power mode between gesture detections
-                
-                time:
-                    the value for the wait time
+        if len(data) != 10 or data[0] != 0x47 or data[1] != 0x01:
+            raise ValueError
+        calibration = GestureCalibration(_fromSignMagnitude(data[2]), _fromSignMagnitude(data[3]), _fromSignMagnitude(data[4]), _fromSignMagnitude(data[5]))
+        calibration.baseline = [data[6], data[7], data[8], data[9]]
+        return calibration
+    from_bytes = staticmethod(from_bytes)
 
-                +----------+-------------+
-                |  Value   |  Wait time  |
-                +==========+=============+
-                |    0     |     0 ms    |
-                +----------+-------------+
-                |    1     |     2.8 ms  |
-                +----------+-------------+
-                |    2     |     5.6 ms  |
-                +----------+-------------+
-                |    3     |     8.4 ms  |
-                +----------+-------------+
-                |    4     |    14.0 ms  |
-                +----------+-------------+
-                |    5     |    22.4 ms  |
-                +----------+-------------+
-                |    6     |    30.8 ms  |
-                +----------+-------------+
-                |    7     |    39.2 ms  |
-                +----------+-------------+
-             
 
+
+class DistanceCalibration():
+    """
+    =============================
+    The DistanceCalibration class
+    =============================
+
+.. class:: DistanceCalibration()
+
+    Proximity to distance calibration, with a lookup table per proximity gain, LED drive and LED boost.
+
+    Record the proximity of a target at known distances (:meth:`record`), for every
+    gain/drive/boost combination in use, then :meth:`fit` the curve
+    ``PDATA = a / distance^2 + b`` and build the 256 entries lookup tables.
+    A distance query is then a single index (:meth:`APDS9960.readDistance`).
+    Distances are integers in any unit (e.g. mm, up to 65535).
+
+    The tables serialize to a compact binary blob (:meth:`to_bytes`) to be stored in flash.
+     """
+
+    def __init__(self):
+        self.points = {}
+        self.tables = {}
+
+    def addPoint(self, gain, drive, boost, distance, pdata):
         """
+            .. method:: addPoint(gain, drive, boost, distance, pdata)
 
-        try:
-            val = self.write_read(APDS9960_GCONF2, 1)[0]
-        except:
-            raise ErrorReadingRegister
-    
-        #Set bits in register to given value
-        time &= 0b00000111
-        val &= 0b11111000
-        val |= time
-    
-        try:       
-            self._write_bytes(APDS9960_GCONF2,val)
-        except:
-           raise ErrorWritingRegister
+                Adds a calibration point measured with the given proximity gain, LED drive and LED boost
 
+                ``distance`` must be in 1..65535, the range of the serialized tables.
+        """
+        if distance <= 0 or distance > 65535:
+            raise ValueError
+        key = (gain, drive, boost)
+        if key not in self.points:
+            self.points[key] = []
+        self.points[key].append((distance, pdata))
+
+    def record(self, sensor, distance, samples=4, settle=PROX_CAL_SETTLE):
+        """
+            .. method:: record(sensor, distance, samples=4, settle=PROX_CAL_SETTLE)
 
+                Measures the proximity of a target at ``distance`` with the current settings of ``sensor``
 
-#*
-#  * @brief Gets the low threshold for ambient light interrupts
-#  *
-#  * @param[out] threshold current low threshold stored on the APDS-9960
-#  * @return True if operation successful. False otherwise.
-#  */
-    def getLightIntLowThreshold(self):
+                return:
+                    the average proximity value.
         """
-            .. method:: getLightIntLowThreshold()
-                
-                Gets the low threshold for ambient light interrupts
-                
-                Return:
-                    the current low threshold stored on the APDS-9960
-                
+        pdata = sensor._measureProximity(settle, samples)
+        self.addPoint(sensor.getProximityGain(), sensor.getLEDDrive(), sensor.getLEDBoost(), distance, pdata)
+        return pdata
+
+    def fit(self):
         """
-        
-        try:
-            valLow = self.write_read(APDS9960_AILTL, 1)[0]
-            valHight = self.write_read(APDS9960_AILTH, 1)[0]
-        except:
-            raise ErrorReadingRegister
-                    
-        
-        return valLow + (valHight << 8)
+            .. method:: fit()
 
-    
+                Fits the curve of every gain/drive/boost combination and builds its lookup table.
+                Each combination needs at least two points at different distances.
 
-    def setLightIntLowThreshold(self, threshold):
+                Proximity values beyond the recorded ones map to the nearest and
+                farthest recorded distances.
         """
-            .. method:: setLightIntLowThreshold(threshold)
-            
-                Sets the low threshold for ambient light interrupts
-                
-                threshold:
-                    the low threshold value for interrupt to trigger
+        for key in self.points:
+            points = self.points[key]
+            n = len(points)
+
+            # Least squares of PDATA = a * x + b, with x = 1 / distance^2
+            sx = 0
+            sp = 0
+            for distance, pdata in points:
+                sx += 1 / (distance * distance)
+                sp += pdata
+            mx = sx / n
+            mp = sp / n
+            sxx = 0
+            sxp = 0
+            near = points[0][0]
+            far = points[0][0]
+            for distance, pdata in points:
+                dx = 1 / (distance * distance) - mx
+                sxx += dx * dx
+                sxp += dx * (pdata - mp)
+                if distance < near:
+                    near = distance
+                if distance > far:
+                    far = distance
+            if sxx == 0:
+                raise ValueError
+            a = sxp / sxx
+            b = mp - a * mx
+            if a <= 0:
+                raise ValueError
+
+            table = [far for x in range(256)]
+            for p in range(256):
+                if p > b:
+                    distance = int((a / (p - b)) ** 0.5 + 0.5)
+                    if distance < near:
+                        distance = near
+                    if distance < far:
+                        table[p] = distance
+            self.tables[key] = table
+
+    def table(self, gain, drive, boost):
         """
-    
-   
-        #Break 16-bit threshold into 2 8-bit values */
-        val_low = threshold & 0x00FF
-        val_high = (threshold & 0xFF00) >> 8
-        
-        try:       
-            self._write_bytes(APDS9960_AILTL,val_low)
-        except:
-           raise ErrorWritingRegister
-  
-        try:       
-            self._write_bytes(APDS9960_AILTH,val_high)
-        except:
-           raise ErrorWritingRegister
+            .. method:: table(gain, drive, boost)
 
- 
-  
+                Returns the lookup table of a gain/drive/boost combination, to use with :meth:`APDS9960.readDistance`
+        """
+        return self.tables[(gain, drive, boost)]
 
+    def tableFor(self, sensor):
+        """
+            .. method:: tableFor(sensor)
 
-    def getLightIntHighThreshold(self):
+                Returns the lookup table for the current settings of ``sensor``
         """
-            .. method:: getLightIntHighThreshold()
-            
-                Gets the high threshold for ambient light interrupts
-                
-                return: 
-                    the current hight threshold stored on the APDS-9960
+        return self.table(sensor.getProximityGain(), sensor.getLEDDrive(), sensor.getLEDBoost())
+
+    def to_bytes(self):
         """
+            .. method:: to_bytes()
 
-           
-        try:
-            valLow = self.write_read(APDS9960_AIHTL, 1)[0]
-            valHight = self.write_read(APDS9960_AIHTH, 1)[0]
-        except:
-            raise ErrorReadingRegister
-                    
-        
-        return valLow + (valHight << 8)
-        
-  
+                Returns the lookup tables as bytes: a 4 bytes header, then for every
+                table the gain, drive and boost followed by 256 little endian 16-bit distances.
+        """
+        data = bytearray([0x50, 0x44, 0x01, len(self.tables)])
+        for key in self.tables:
+            data.extend(bytearray([key[0], key[1], key[2]]))
+            for distance in self.tables[key]:
+                data.append(distance & 0xFF)
+                data.append((distance >> 8) & 0xFF)
+        return bytes(data)
+
+    def from_bytes(data):
+        """
+            .. method:: from_bytes(data)
 
-    def setLightIntHighThreshold(self, threshold):
+                Builds a calibration from the bytes of :meth:`to_bytes` (static method).
+                Only the tables are restored, not the calibration points.
         """
-            .. method:: setLightIntHighThreshold(threshold)
-                
-                Sets the hight threshold for ambient light interrupts
-                
-                threshold:
-                    the hight threshold value for interrupt to trigger
+        if len(data) < 4 or data[0] != 0x50 or data[1] != 0x44 or data[2] != 0x01:
+            raise ValueError
+        count = data[3]
+        if len(data) != 4 + count * 515:
+            raise ValueError
+        calibration = DistanceCalibration()
+        pos = 4
+        for i in range(count):
+            key = (data[pos], data[pos + 1], data[pos + 2])
+            pos += 3
+            table = [0 for x in range(256)]
+            for p in range(256):
+                table[p] = data[pos] + (data[pos + 1] << 8)
+                pos += 2
+            calibration.tables[key] = table
+        return calibration
+    from_bytes = staticmethod(from_bytes)
+
+
+
+class ProximityScanner():
+    """
+    ==========================
+    The ProximityScanner class
+    ==========================
+
+.. class:: ProximityScanner(sensor, rate=5, settle=PROX_CAL_SETTLE, masks=None, threshold=10)
+
+    Directional proximity: cycles the proximity photodiode mask over the UP, DOWN,
+    LEFT and RIGHT photodiodes and reads PDATA for each of them.
+
+    It is a low power alternative to the gesture engine to detect from which side
+    a target approaches: the LED runs at the proximity duty cycle and only one
+    photodiode mask is active at a time.
+
+    rate:
+        scans per second done by :meth:`poll`
+
+    settle:
+        the wait (ms) for a proximity conversion after a mask switch, at least one proximity cycle
+
+    masks:
+        the list of photodiode masks of a scan, ``[PMASK_U, PMASK_D, PMASK_L, PMASK_R]`` if None.
+        Pair masks (``PMASK_UD``, ``PMASK_LR``, ``PMASK_UR``, ``PMASK_DL``) can be added.
+
+    CONFIG3 is cached, so every step is a single register write and a PDATA read.
+    Call :meth:`stop` to restore the photodiode mask in use before the scan.
+     """
+
+    def __init__(self, sensor, rate=5, settle=PROX_CAL_SETTLE, masks=None, threshold=10):
+        if masks is None:
+            masks = [PMASK_U, PMASK_D, PMASK_L, PMASK_R]
+        self.sensor = sensor
+        self.period = 1000 / rate
+        self.settle = settle
+        self.masks = masks
+        self.threshold = threshold
+        self.vector = [0 for x in range(len(masks))]
+        self._config3 = None
+        self._next = None
+
+    def scan(self):
         """
-    
-   
-        #Break 16-bit threshold into 2 8-bit values */
-        val_low = threshold & 0x00FF
-        val_high = (threshold & 0xFF00) >> 8
-        
-        try:       
-            self._write_bytes(APDS9960_AIHTL,val_low)
-        except:
-           raise ErrorWritingRegister
-  
-        try:       
-            self._write_bytes(APDS9960_AIHTH,val_high)
-        except:
-           raise ErrorWritingRegister
+            .. method:: scan()
+
+                Reads PDATA for every mask
 
+                return:
+                    the list of proximity values, in the order of the masks.
+        """
+        sensor = self.sensor
+        if self._config3 is None:
+            self._config3 = sensor._read_cached(APDS9960_CONFIG3)
+        # Gain compensation keeps the masked readings on the full scale
+        base = (self._config3 & 0b11010000) | 0b00100000
+        for i in range(len(self.masks)):
+            # The device lock is taken by the write and the read, not across the conversion
+            sensor._write_reg(APDS9960_CONFIG3, base | self.masks[i])
+            sleep(self.settle)
+            self.vector[i] = sensor.readProximity()
+        return self.vector
+
+    def poll(self):
+        """
+            .. method:: poll()
 
+                Scans if the scan period has expired
 
-    def getProximityIntLowThreshold(self):
+                return:
+                    the list of proximity values, or None if no scan was due.
         """
-            .. method:: getProximityIntLowThreshold()
-                
-                Gets the low threshold for proximity interrupts
-            
+        now = timers.now()
+        if self._next is not None and now < self._next:
+            return None
+        self._next = now + self.period
+        return self.scan()
+
+    def direction(self):
         """
-        
-        try:
-            val = self.write_read(APDS9960_PILT, 1)[0]
-        except:
-            raise ErrorReadingRegister
-                    
-        
-        return val
-   
+            .. method:: direction()
 
+                Returns the side of the strongest reflection in the last four-direction scan
+                (``DIR_UP``, ``DIR_DOWN``, ``DIR_LEFT`` or ``DIR_RIGHT``), or ``DIR_NONE`` if
+                no side exceeds the opposite one by ``threshold``.
+        """
+        u = d = l = r = 0
+        for i in range(len(self.masks)):
+            if self.masks[i] == PMASK_U:
+                u = self.vector[i]
+            elif self.masks[i] == PMASK_D:
+                d = self.vector[i]
+            elif self.masks[i] == PMASK_L:
+                l = self.vector[i]
+            elif self.masks[i] == PMASK_R:
+                r = self.vector[i]
+        ud = u - d
+        lr = l - r
+        if abs(ud) < self.threshold and abs(lr) < self.threshold:
+            return DIR_NONE
+        if abs(ud) >= abs(lr):
+            if ud > 0:
+                return DIR_UP
+            return DIR_DOWN
+        if lr > 0:
+            return DIR_LEFT
+        return DIR_RIGHT
+
+    def stop(self):
+        """
+            .. method:: stop()
 
-    def setProximityIntLowThreshold(self, threshold):
+                Restores the photodiode mask in use before the first scan
         """
-            .. method:: setProximityIntLowThreshold(threshold)
-            
-                Sets the low threshold for proximity interrupts
-                
-                threshold:
-                    the low threshold value for interrupt to trigger
-            
+        if self._config3 is not None:
+            self.sensor._write_cached(APDS9960_CONFIG3, self._config3)
+            self._config3 = None
+
+
+
+class AdaptiveProximity():
+    """
+    ===========================
+    The AdaptiveProximity class
+    ===========================
+
+.. class:: AdaptiveProximity(sensor, low=40, high=230, levels=None)
+
+    Proximity with LED power scaled to the need.
+
+    ``levels`` is a list of (LED drive, LED boost, PPULSE) settings, from the
+    strongest to the weakest LED energy. When a reading reaches ``high`` (close
+    target, near saturation) the next weaker level is used, when it falls to
+    ``low`` the next stronger one. The default ladder goes from 100 mA with 300%
+    boost down to 12.5 mA with 2 pulses, and starts at the driver defaults.
+
+    Readings are normalized to the LED energy of the driver defaults
+    (``DEFAULT_LDRIVE``, 100% boost, ``DEFAULT_PROX_PPULSE``), so consumers see the
+    same scale at every level; normalized values can exceed 255 at weak levels.
+    Read at most once per proximity cycle, the conversion following a level switch
+    uses the new settings. The settings of the starting level are written at construction.
+     """
+
+    def __init__(self, sensor, low=40, high=230, levels=None):
+        if levels is None:
+            levels = [
+                (LED_DRIVE_100MA, LED_BOOST_300, DEFAULT_PROX_PPULSE),
+                (LED_DRIVE_100MA, LED_BOOST_150, DEFAULT_PROX_PPULSE),
+                (DEFAULT_LDRIVE, LED_BOOST_100, DEFAULT_PROX_PPULSE),
+                (LED_DRIVE_50MA, LED_BOOST_100, DEFAULT_PROX_PPULSE),
+                (LED_DRIVE_25MA, LED_BOOST_100, DEFAULT_PROX_PPULSE),
+                (LED_DRIVE_12_5MA, LED_BOOST_100, DEFAULT_PROX_PPULSE),
+                (LED_DRIVE_12_5MA, LED_BOOST_100, 0x83),    # 16us, 4 pulses
+                (LED_DRIVE_12_5MA, LED_BOOST_100, 0x81),    # 16us, 2 pulses
+            ]
+        self.sensor = sensor
+        self.low = low
+        self.high = high
+        self.levels = levels
+        self.switches = 0
+        reference = self._energy(DEFAULT_LDRIVE, LED_BOOST_100, DEFAULT_PROX_PPULSE)
+        # Integer scale factors (x256) of every level, computed once
+        self._scale = [0 for x in range(len(levels))]
+        self.level = 0
+        for i in range(len(levels)):
+            drive, boost, ppulse = levels[i]
+            self._scale[i] = (reference * 256) // self._energy(drive, boost, ppulse)
+            if levels[i] == (DEFAULT_LDRIVE, LED_BOOST_100, DEFAULT_PROX_PPULSE):
+                self.level = i
+        self.apply()
+
+    def _energy(self, drive, boost, ppulse):
+        # LED energy of a proximity conversion: current * boost * pulses * pulse length
+        return LED_DRIVE_CURRENT[drive] * LED_BOOST_PERCENT[boost] * ((ppulse & 0b00111111) + 1) * (8 << (ppulse >> 6))
+
+    def apply(self):
         """
-        
-        try:       
-            self._write_bytes(APDS9960_PILT,threshold)
-        except:
-           raise ErrorWritingRegister
+            .. method:: apply()
 
-    
-    def getProximityIntHighThreshold(self):
-        
+                Writes the settings of the current level, only the registers that changed
         """
-            .. method:: getProximityIntHighThreshold()
-                
-               Gets the high threshold for proximity interrupts
-            
+        sensor = self.sensor
+        drive, boost, ppulse = self.levels[self.level]
+        with sensor.transaction():
+            sensor._write_cached(APDS9960_CONTROL, (sensor._read_cached(APDS9960_CONTROL) & 0b00111111) | (drive << 6), False)
+            sensor._write_cached(APDS9960_CONFIG2, (sensor._read_cached(APDS9960_CONFIG2) & 0b11001111) | (boost << 4), False)
+            sensor._write_cached(APDS9960_PPULSE, ppulse, False)
+
+    def read(self):
+        """
+            .. method:: read()
+
+                Reads the proximity, normalized to the default LED energy, and adapts the LED level for the next conversion
+        """
+        pdata = self.sensor.readProximity()
+        value = (pdata * self._scale[self.level]) >> 8
+
+        if pdata >= self.high and self.level < len(self.levels) - 1:
+            self.level += 1
+        elif pdata <= self.low and self.level > 0:
+            self.level -= 1
+        else:
+            return value
+        self.switches += 1
+        self.apply()
+        return value
+
+
+
+class GestureGate():
+    """
+    =====================
+    The GestureGate class
+    =====================
+
+.. class:: GestureGate(sensor, wake=DEFAULT_GPENTH, period=100, timeout=300)
+
+    Gesture sensing armed only by a proximity wake.
+
+    While idle the chip only runs proximity once every ``period`` ms, at the
+    default proximity LED settings, with INT raised when PDATA goes above ``wake``.
+    :meth:`service` (call it on INT, or poll it) switches to the gesture profile
+    (no wait time, gesture pulses, LED boost 300%, GEN and GMODE), drains the
+    gesture with :meth:`APDS9960.readGesture` and goes back to idle. Both profiles
+    are written as a diff against the register cache, so a switch only costs the
+    registers that differ. ``timeout`` ms is the longest wait for the gesture FIFO
+    after a wake.
+
+    Run :meth:`APDS9960.initialize` first, instead of :meth:`APDS9960.enableGestureSensor`.
+     """
+
+    def __init__(self, sensor, wake=DEFAULT_GPENTH, period=100, timeout=300):
+        self.sensor = sensor
+        self.wake = wake
+        self.timeout = timeout
+        self.wakes = 0
+        self.gestures = 0
+        self.writes = 0
+        wtime, wlong, actual = _waitSettings(period)
+        self.period = actual
+        # ENABLE goes last, so the interrupt is armed with the new thresholds
+        self._idle = [
+            (APDS9960_PPULSE, DEFAULT_PROX_PPULSE),
+            (APDS9960_WTIME, wtime),
+            (APDS9960_PILT, 0),
+            (APDS9960_PIHT, wake),
+            (APDS9960_ENABLE, APDS9960_PON | APDS9960_PEN | APDS9960_WEN | APDS9960_PIEN),
+        ]
+        self._idle_wlong = wlong
+        self._idle_boost = LED_BOOST_100
+        self._gesture = [
+            (APDS9960_WTIME, 0xFF),
+            (APDS9960_PPULSE, DEFAULT_GESTURE_PPULSE),
+            (APDS9960_ENABLE, APDS9960_PON | APDS9960_PEN | APDS9960_WEN | APDS9960_GEN),
+        ]
+
+    def _apply(self, profile, wlong, boost):
+        # Writes the registers of a profile that differ from the cache
+        sensor = self.sensor
+        config1 = sensor._read_cached(APDS9960_CONFIG1) & ~APDS9960_WLONG
+        if wlong:
+            config1 |= APDS9960_WLONG
+        config2 = (sensor._read_cached(APDS9960_CONFIG2) & 0b11001111) | (boost << 4)
+        profile = [(APDS9960_CONFIG1, config1), (APDS9960_CONFIG2, config2)] + profile
+        for reg, val in profile:
+            if sensor._write_cached(reg, val, False):
+                self.writes += 1
+
+    def idle(self):
         """
-        
-        try:
-            val = self.write_read(APDS9960_PIHT, 1)[0]
-        except:
-            raise ErrorReadingRegister
-                    
-        
-        return val
-   
+            .. method:: idle()
 
-    def setProximityIntHighThreshold(self, threshold):
+                Switches to the idle profile and clears the proximity interrupt
         """
-            .. method:: setProximityIntHighThreshold(threshold)
-                
-                Sets the high threshold for proximity interrupts
-                
-                threshold: 
-                    the high threshold value for interrupt to trigger
-            
+        with self.sensor.transaction():
+            self._apply(self._idle, self._idle_wlong, self._idle_boost)
+            self.sensor.clearProximityInt()
+
+    def arm(self):
         """
-        
-        try:       
-            self._write_bytes(APDS9960_PIHT,threshold)
-        except:
-           raise ErrorWritingRegister
+            .. method:: arm()
 
+                Switches to the gesture profile and forces the gesture state machine (GMODE)
+        """
+        sensor = self.sensor
+        with sensor.transaction():
+            self._apply(self._gesture, 0, LED_BOOST_300)
+            # GMODE is cleared by the hardware on exit, never trust the cache
+            try:
+                gconf4 = sensor.write_read(APDS9960_GCONF4, 1)[0]
+            except:
+                raise ErrorReadingRegister
+            sensor._write_reg(APDS9960_GCONF4, gconf4 | 0b00000001)
+            self.writes += 1
 
-    def getAmbientLightIntEnable(self):
+    def service(self):
         """
-            .. method:: getAmbientLightIntEnable()
-                
-                Gets if ambient light interrupts are enabled or not
-                
-                Return:
-                    1 if interrupts are enabled, 0 if not.
+            .. method:: service()
+
+                Handles a proximity wake: arms the gesture engine, reads the gesture and goes back to idle
+
+                return:
+                    the gesture, ``DIR_NONE`` if the proximity is below ``wake`` or no gesture was decoded.
         """
-        
+        sensor = self.sensor
+        if sensor.readProximity() <= self.wake:
+            sensor.clearProximityInt()
+            return DIR_NONE
+
+        self.wakes += 1
+        gesture = DIR_NONE
+        self.arm()
         try:
-            val = self.write_read(APDS9960_ENABLE, 1)[0]
-        except:
-            raise ErrorReadingRegister
+            waited = 0
+            while not sensor.isGestureAvailable() and waited < self.timeout:
+                sleep(FIFO_PAUSE_TIME)
+                waited += FIFO_PAUSE_TIME
+            gesture = sensor.readGesture()
+        finally:
+            self.idle()
+        if gesture != DIR_NONE:
+            self.gestures += 1
+        return gesture
 
-        # Shift and mask out AIEN bit */
-        val = (val >> 4) & 0b00000001
-    
-        return val
 
 
+class GesturePipeline():
+    """
+    =========================
+    The GesturePipeline class
+    =========================
 
-    def setAmbientLightIntEnable(self, enable):
-        """
-            .. method:: setAmbientLightIntEnable(enable)
-                
-                Turns ambient light interrupts on or off
-                
-                enable:
-                    1 to enable interrupts or 0 to turn them off
+.. class:: GesturePipeline(sensor)
+
+    Double-buffered version of :meth:`APDS9960.readGesture`: FIFO bursts are
+    acquired at a fixed cadence (the adaptive drain pause) in the calling thread,
+    while a decoder thread de-interleaves and decodes the previous burst.
+
+    Two preallocated buffers are handed off with a pair of locks each: the
+    acquisition side owns a buffer until it is filled, the decoder until it is
+    decoded. When the decoder still owns the next buffer the acquisition waits
+    for it (counted in ``stalls``), so no burst is ever overwritten.
+
+    An error of the decoder thread is raised by :meth:`read` at the end of the
+    gesture. The decoder thread starts with the first gesture and runs until :meth:`stop`.
+     """
+
+    def __init__(self, sensor):
+        self.sensor = sensor
+        self._buffers = [bytearray(FIFO_SIZE * 4), bytearray(FIFO_SIZE * 4)]
+        self._levels = [0, 0]
+        # _filled[i] is held until buffer i has data, _free[i] while the decoder owns it
+        self._filled = [threading.Lock(), threading.Lock()]
+        self._free = [threading.Lock(), threading.Lock()]
+        self._filled[0].acquire()
+        self._filled[1].acquire()
+        self._next = 0
+        self._decoder = None
+        self._error = None
+        self.stalls = 0
+        self.bursts = 0
+
+    def _handoff(self, data, level):
+        # Fills the next buffer and gives it to the decoder, level -1 ends the gesture
+        # and level -2 stops the decoder thread
+        i = self._next
+        self._next = 1 - i
+        if not self._free[i].acquire(False):
+            self.stalls += 1
+            self._free[i].acquire()
+        if level > 0:
+            self._buffers[i][0:level * 4] = data[0:level * 4]
+        self._levels[i] = level
+        self._filled[i].release()
+        return i
+
+    def _burst(self, fifo_data, fifo_level):
+        self.bursts += 1
+        self._handoff(fifo_data, fifo_level)
+
+    def _decode(self):
+        i = 0
+        while True:
+            self._filled[i].acquire()
+            level = self._levels[i]
+            try:
+                if level >= 0 and self._error is None:
+                    self.sensor._consumeGestureFifo(self._buffers[i], level)
+            except Exception as e:
+                # Handed over to read(), the rest of the gesture is skipped
+                self._error = e
+            finally:
+                self._free[i].release()
+            if level == -2:
+                return
+            i = 1 - i
+
+    def _join(self, level):
+        # Hands the end marker level to the decoder thread and waits until it has
+        # released both buffers
+        i = self._handoff(None, level)
+        self._free[i].acquire()
+        self._free[i].release()
+
+    def read(self):
         """
+            .. method:: read()
 
+                Processes a gesture event and returns best guessed gesture, like :meth:`APDS9960.readGesture`
+        """
+        sensor = self.sensor
+        deadline = None
         try:
-            val = self.write_read(APDS9960_ENABLE, 1)[0]
-        except:
-            raise ErrorReadingRegister
-   
- 
-        # Set bits in register to given value */
-        enable &= 0b00000001
-        enable = enable << 4
-        val &= 0b11101111
-        val |= enable
-    
-        try:       
-            self._write_bytes(APDS9960_ENABLE,val)
-        except:
-           raise ErrorWritingRegister
-   
+            for pause in sensor.drainGesture(self._burst):
+                if deadline is None:
+                    if self._decoder is None:
+                        self._decoder = thread(self._decode)
+                    deadline = timers.now()
+                deadline += pause
+                wait = deadline - timers.now()
+                if wait > 0:
+                    sleep(wait)
+                else:
+                    # Late: restart the cadence instead of bursting to catch up
+                    deadline = timers.now()
+        except Exception as e:
+            # Bus error: drop the gesture once the decoder is idle
+            if deadline is not None:
+                self._join(-1)
+            self._error = None
+            sensor._resetGestureParameters()
+            raise e
+        if deadline is None:
+            return DIR_NONE
 
-    def getProximityIntEnable(self):
+        # Wait for the decoder to drain both buffers
+        self._join(-1)
+        error = self._error
+        if error is not None:
+            self._error = None
+            sensor._resetGestureParameters()
+            raise error
+        sleep(sensor.getFifoPause())
+        return sensor._endGesture()
+
+    def stop(self):
         """
-            .. method:: getProximityIntEnable()
-                
-                Gets if proximity interrupts are enabled or not
-                
-                Return:
-                    1 if interrupts are enabled or 0 if not.
+            .. method:: stop()
+
+                Stops the decoder thread, after the bursts it was given. The next :meth:`read` starts a new one.
         """
-        
-        try:
-            val = self.write_read(APDS9960_ENABLE, 1)[0]
-        except:
-            raise ErrorReadingRegister
+        if self._decoder is None:
+            return
+        self._join(-2)
+        self._next = 0
+        self._decoder = None
 
-   
-        # Shift and mask out PIEN bit */
-        val = (val >> 5) & 0b00000001
-        
-        return val
 
 
-    def setProximityIntEnable(self, enable):
+class GestureSegmenter():
+    """
+    ==========================
+    The GestureSegmenter class
+    ==========================
+
+.. class:: GestureSegmenter(sensor, threshold=GESTURE_THRESHOLD_OUT, valley=50, gap=2, min_samples=5)
+
+    Splits the U/D/L/R stream of one gesture session into separate swipes.
+
+    A segment starts at the first dataset with all four channels above
+    ``threshold`` and ends after ``gap`` datasets below it, or at an energy
+    valley: when the channel sum falls under ``valley`` % of the segment peak
+    and rises back, the hand left and came in again, so a new segment starts.
+    Each segment of at least ``min_samples`` datasets is decoded from its first
+    and last datasets with the thresholds of :meth:`APDS9960.readGesture`.
+    Only a few values per segment are kept, so memory does not grow with the session.
+    Near/far events are not reported by the segmenter.
+     """
+
+    def __init__(self, sensor, threshold=GESTURE_THRESHOLD_OUT, valley=50, gap=2, min_samples=5):
+        self.sensor = sensor
+        self.threshold = threshold
+        self.valley = valley
+        self.gap = gap
+        self.min_samples = min_samples
+        self.segments = 0
+        self._results = None
+        self.reset()
+
+    def reset(self):
         """
-            .. method:: setProximityIntEnable(enable)
-            
-                Turns proximity interrupts on or off
-                
-                enable:
-                    1 to enable interrupts or 0 to turn them off
+            .. method:: reset()
+
+                Drops the segment in progress
+        """
+        self._active = False
+        self._first = None
+        self._last = None
+        self._count = 0
+        self._peak = 0
+        self._quiet = 0
+        self._dip = False
+        self._channelPeak = [0, 0, 0, 0]
+        self._channelIndex = [0, 0, 0, 0]
+
+    def _start(self, sample, energy):
+        self._active = True
+        self._first = sample
+        self._last = sample
+        self._count = 1
+        self._peak = energy
+        self._quiet = 0
+        self._dip = False
+        self._channelPeak = [sample[0], sample[1], sample[2], sample[3]]
+        self._channelIndex = [0, 0, 0, 0]
+
+    def _close(self):
+        first = self._first
+        last = self._last
+        count = self._count
+        index = self._channelIndex
+        self.reset()
+        if count < self.min_samples:
+            return None
+        self.segments += 1
+        ud_delta = _pairRatio(last[0], last[1]) - _pairRatio(first[0], first[1])
+        lr_delta = _pairRatio(last[2], last[3]) - _pairRatio(first[2], first[3])
+        result = _swipeResult(ud_delta, lr_delta, count)
+        result.lag = _peakLag(result.direction, index)
+        return result
+
+    def feed(self, u, d, l, r):
         """
+            .. method:: feed(u, d, l, r)
 
-        try:
-            val = self.write_read(APDS9960_ENABLE, 1)[0]
-        except:
-            raise ErrorReadingRegister
-   
-        # Set bits in register to given value */
-        enable &= 0b00000001
-        enable = enable << 5
-        val &= 0b11011111
-        val |= enable
-        
-        try:       
-            self._write_bytes(APDS9960_ENABLE,val)
-        except:
-           raise ErrorWritingRegister
-   
+                Feeds one FIFO dataset
 
-    def getGestureIntEnable(self):
+                return:
+                    the :class:`GestureResult` of the segment it closes, None otherwise.
         """
-            .. method:: getGestureIntEnable()
-            
-                Gets if gesture interrupts are enabled or not
-                
+        threshold = self.threshold
+        energy = u + d + l + r
+        above = u > threshold and d > threshold and l > threshold and r > threshold
+        if not self._active:
+            if above:
+                self._start((u, d, l, r), energy)
+            return None
+
+        if not above:
+            self._quiet += 1
+            if self._quiet >= self.gap:
+                return self._close()
+            return None
+        self._quiet = 0
+
+        if energy * 100 < self._peak * self.valley:
+            self._dip = True
+            return None
+        if self._dip:
+            # Out of an energy valley: a new swipe begins with this dataset
+            result = self._close()
+            self._start((u, d, l, r), energy)
+            return result
+
+        if energy > self._peak:
+            self._peak = energy
+        self._last = (u, d, l, r)
+        for k in range(4):
+            if self._last[k] > self._channelPeak[k]:
+                self._channelPeak[k] = self._last[k]
+                self._channelIndex[k] = self._count
+        self._count += 1
+        return None
+
+    def feedFifo(self, fifo_data, fifo_level):
+        """
+            .. method:: feedFifo(fifo_data, fifo_level)
+
+                Feeds ``fifo_level`` interleaved U/D/L/R datasets
+
                 return:
-                    1 if interrupts are enabled or 0 if not.
+                    the list of the :class:`GestureResult` of the closed segments.
         """
-        try:
-            val = self.write_read(APDS9960_GCONF4, 1)[0]
-        except:
-            raise ErrorReadingRegister
-    
-   
-    
-        # Shift and mask out GIEN bit */
-        val = (val >> 1) & 0b00000001
-        
-        return val
+        results = []
+        for i in range(0, fifo_level * 4, 4):
+            result = self.feed(fifo_data[i], fifo_data[i + 1], fifo_data[i + 2], fifo_data[i + 3])
+            if result is not None:
+                results.append(result)
+        return results
+
+    def flush(self):
+        """
+            .. method:: flush()
 
+                Closes the segment in progress at the end of a session
 
-    def setGestureIntEnable(self, enable):
+                return:
+                    its :class:`GestureResult`, None if it was too short or no segment was open.
+        """
+        if not self._active:
+            return None
+        return self._close()
 
+    def _collect(self, fifo_data, fifo_level):
+        self._results.extend(self.feedFifo(fifo_data, fifo_level))
+
+    def read(self):
         """
-            .. method:: setGestureIntEnable(enable)
-            
-                Turns gesture-related interrupts on or off
-                
-                enable:
-                    1 to enable interrupts or 0 to turn them off
+            .. method:: read()
+
+                Reads a whole gesture session from the FIFO, like :meth:`APDS9960.readGesture`
+
+                return:
+                    the list of the :class:`GestureResult` of the swipes found, ``DIR_NONE`` results skipped.
+                    Their velocity uses the dataset period estimated from GWTIME and GPULSE.
         """
+        sensor = self.sensor
+        self.reset()
+        self._results = []
+        for pause in sensor.drainGesture(self._collect):
+            sleep(pause)
+        results = self._results
+        self._results = None
+        result = self.flush()
+        if result is not None:
+            results.append(result)
+
+        period = sensor._gestureCycle()
+        found = []
+        for result in results:
+            if result.direction != DIR_NONE:
+                result._setTiming(None, None, period)
+                found.append(result)
+        return found
+
+
+
+class TemplateClassifier():
+    """
+    ============================
+    The TemplateClassifier class
+    ============================
+
+.. class:: TemplateClassifier(length=16, window=3, capacity=64, limit=None)
+
+    Gesture classifier matching U/D/L/R sequences against recorded templates, for
+    gestures the direction decoder cannot express (circles, double taps, holds...).
+
+    A sequence is reduced to ``length`` frames of three integer features: the UP/DOWN
+    and LEFT/RIGHT ratios (%) and the channel sum (% of the sequence peak).
+    Templates are reduced once by :meth:`addTemplate`, together with their
+    LB_Keogh envelopes. :meth:`classify` computes the cheap lower bound first,
+    skips the templates whose bound is already worse than the best match, and
+    runs DTW (Sakoe-Chiba band of ``window`` frames, L1 distance) with early
+    abandoning as soon as a whole band row exceeds the best distance. ::
+
+        classifier = APDS9960.TemplateClassifier()
+        classifier.addTemplate("circle", circle_samples)
+        classifier.addTemplate("tap", tap_samples)
+        label, distance = classifier.read(sensor)
+
+    It is also a gesture decoder (see :class:`HeuristicDecoder`) for :meth:`APDS9960.setGestureDecoder`:
+    the session is kept in at most ``capacity`` datasets (:meth:`feed`) and classified with
+    ``limit`` by :meth:`result`, unknown gestures giving ``DIR_NONE``.
+     """
 
-        try:
-            val = self.write_read(APDS9960_GCONF4, 1)[0]
-        except:
-            raise ErrorReadingRegister
-    
-    
-    
-        # Set bits in register to given value */
-        enable &= 0b00000001
-        enable = enable << 1
-        val &= 0b11111101
-        val |= enable
-    
-        try:       
-            self._write_bytes(APDS9960_GCONF4,val)
-        except:
-           raise ErrorWritingRegister
-   
+    def __init__(self, length=16, window=3, capacity=64, limit=None):
+        self.length = length
+        self.window = window
+        self.capacity = capacity
+        self.limit = limit
+        self.templates = []
+        self.pruned = 0
+        self.abandoned = 0
+        self.computed = 0
+        self.reset()
+
+    def features(self, samples):
+        """
+            .. method:: features(samples)
 
+                Reduces a list of (u, d, l, r) datasets to ``length`` frames of (ud, lr, energy)
+        """
+        n = len(samples)
+        if n == 0:
+            raise ValueError
+        peak = 1
+        for u, d, l, r in samples:
+            if u + d + l + r > peak:
+                peak = u + d + l + r
+        frames = []
+        shift = GESTURE_FRACTION_BITS
+        for i in range(self.length):
+            u, d, l, r = samples[(i * n) // self.length]
+            frames.append((_pairRatio(u, d) >> shift, _pairRatio(l, r) >> shift, ((u + d + l + r) * 100) // peak))
+        return frames
+
+    def _envelope(self, frames):
+        # Upper and lower LB_Keogh envelopes of a template within the band
+        upper = []
+        lower = []
+        n = len(frames)
+        for i in range(n):
+            lo = max(0, i - self.window)
+            hi = min(n, i + self.window + 1)
+            up = [-1000, -1000, -1000]
+            low = [1000, 1000, 1000]
+            for j in range(lo, hi):
+                for k in range(3):
+                    if frames[j][k] > up[k]:
+                        up[k] = frames[j][k]
+                    if frames[j][k] < low[k]:
+                        low[k] = frames[j][k]
+            upper.append(up)
+            lower.append(low)
+        return (upper, lower)
+
+    def addTemplate(self, label, samples):
+        """
+            .. method:: addTemplate(label, samples)
 
-    def clearAmbientLightInt(self):
+                Adds a template, a list of (u, d, l, r) datasets of a recorded gesture
         """
-            .. method:: clearAmbientLightInt()
-            
-                Clears the ambient light interrupt
-            
+        frames = self.features(samples)
+        upper, lower = self._envelope(frames)
+        self.templates.append((label, frames, upper, lower))
+
+    def _lowerBound(self, frames, upper, lower, limit):
+        # LB_Keogh: distance of the query from the template envelope
+        total = 0
+        for i in range(len(frames)):
+            frame = frames[i]
+            up = upper[i]
+            low = lower[i]
+            for k in range(3):
+                if frame[k] > up[k]:
+                    total += frame[k] - up[k]
+                elif frame[k] < low[k]:
+                    total += low[k] - frame[k]
+            if total >= limit:
+                break
+        return total
+
+    def _dtw(self, a, b, limit):
+        # Banded DTW with L1 frame distance, None when abandoned above limit
+        n = len(a)
+        w = self.window
+        inf = 1 << 30
+        prev = [inf] * (n + 1)
+        prev[0] = 0
+        for i in range(1, n + 1):
+            row = [inf] * (n + 1)
+            best = inf
+            fa = a[i - 1]
+            for j in range(max(1, i - w), min(n, i + w) + 1):
+                fb = b[j - 1]
+                cost = abs(fa[0] - fb[0]) + abs(fa[1] - fb[1]) + abs(fa[2] - fb[2])
+                m = prev[j - 1]
+                if prev[j] < m:
+                    m = prev[j]
+                if row[j - 1] < m:
+                    m = row[j - 1]
+                row[j] = cost + m
+                if row[j] < best:
+                    best = row[j]
+            if best >= limit:
+                return None
+            prev = row
+        return prev[n]
+
+    def classify(self, samples, limit=None):
         """
-        
-        try:
-            val = self.write_read(APDS9960_AICLEAR, 1)[0]
-        except:
-            raise ErrorReadingRegister
-  
+            .. method:: classify(samples, limit=None)
 
+                Finds the template closest to a list of (u, d, l, r) datasets
 
-    def clearProximityInt(self):
+                limit:
+                    the largest accepted distance, None for no limit
+
+                return:
+                    a tuple (label, distance), (None, None) if no template is within ``limit``.
         """
-            .. method:: clearProximityInt()
-            
-                Clears the proximity interrupt
-                
+        frames = self.features(samples)
+        if limit is None:
+            best = 1 << 30
+        else:
+            best = limit + 1
+        label = None
+
+        # Most promising templates first, so that the others prune early
+        bounds = []
+        for template in self.templates:
+            bound = self._lowerBound(frames, template[2], template[3], best)
+            i = len(bounds)
+            while i > 0 and bounds[i - 1][0] > bound:
+                i -= 1
+            bounds.insert(i, (bound, template))
+        for bound, template in bounds:
+            if bound >= best:
+                self.pruned += 1
+                continue
+            self.computed += 1
+            distance = self._dtw(frames, template[1], best)
+            if distance is None:
+                self.abandoned += 1
+            elif distance < best:
+                best = distance
+                label = template[0]
+
+        if label is None:
+            return (None, None)
+        return (label, best)
+
+    def reset(self):
         """
-            
-        try:
-            val = self.write_read(APDS9960_PICLEAR, 1)[0]
-        except:
-            raise ErrorReadingRegister
-         
+            .. method:: reset()
 
-  
+                Starts a new gesture session
+        """
+        self._samples = []
+        self._stride = 1
+        self._seen = 0
 
-    def getGestureMode(self):
+    def feed(self, fifo_data, fifo_level):
         """
-            .. method:: getGestureMode()
-            
-                Tells if the gesture state machine is currently running
-                
-                return:
-                    1 if gesture state machine is running or 0 if not
-        """        
-        
-        try:
-            val = self.write_read(APDS9960_GCONF4, 1)[0]
-        except:
-            raise ErrorReadingRegister
+            .. method:: feed(fifo_data, fifo_level)
 
-        # Mask out GMODE bit */
-        val &= 0b00000001
-    
-        return val
+                Adds ``fifo_level`` interleaved U/D/L/R datasets of a FIFO read
+
+                When the session is longer than ``capacity`` datasets, every other
+                dataset is dropped and the rest of the session is sampled at half
+                the rate, so memory stays bounded and the whole shape is kept.
+        """
+        for i in range(0, fifo_level * 4, 4):
+            if self._seen % self._stride == 0:
+                self._samples.append((fifo_data[i], fifo_data[i + 1], fifo_data[i + 2], fifo_data[i + 3]))
+                if len(self._samples) >= self.capacity:
+                    self._samples = self._samples[::2]
+                    self._stride *= 2
+            self._seen += 1
+
+    def result(self):
+        """
+            .. method:: result()
 
+                Classifies the datasets fed so far
 
-    def setGestureMode(self, mode):
+                return:
+                    a :class:`GestureResult` with the template label and a confidence of 100 minus the mean frame distance.
         """
-            .. method:: setGestureMode(mode)
-            
-                Tells the state machine to either enter or exit gesture state machine
-                
-                mode:
-                    1 to enter gesture state machine or 0 to exit.
-                
+        if not self._samples:
+            return GestureResult(DIR_NONE, 0, DIR_NONE)
+        label, distance = self.classify(self._samples, self.limit)
+        if label is None:
+            return GestureResult(DIR_NONE, 0, DIR_NONE)
+        return GestureResult(label, max(0, 100 - distance // self.length), DIR_NONE, self._seen)
+
+    def record(self, sensor, capacity=None):
         """
-        try:
-            val = self.write_read(APDS9960_GCONF4, 1)[0]
-        except:
-            raise ErrorReadingRegister
-            
-        #Set bits in register to given value */
-        mode &= 0b00000001;
-        val &= 0b11111110;
-        val |= mode;
-    
-             
-        self._write_bytes(APDS9960_GCONF4, val)
-        
+            .. method:: record(sensor, capacity=None)
 
+                Reads a whole gesture session from the FIFO (see :meth:`feed`), in at most ``capacity``
+                datasets (``None`` keeps the capacity of the classifier)
 
-    def _printDEBUG(self, *msg):
-        if DEBUG:
-            print(*msg)
+                return:
+                    the list of (u, d, l, r) datasets, empty if no gesture is available.
+        """
+        default = self.capacity
+        if capacity is not None:
+            self.capacity = capacity
+        try:
+            self.reset()
+            for pause in sensor.drainGesture(self.feed):
+                sleep(pause)
+        finally:
+            self.capacity = default
+        return self._samples
+
+    def read(self, sensor, limit=None):
+        """
+            .. method:: read(sensor, limit=None)
 
-    def _write_bytes(self,reg , val):
-        try:   
-            self.write_bytes(reg, val)
-            sleep(100)
-        except:
-            raise ErrorWritingRegister
+                Records a gesture session (:meth:`record`) and classifies it (:meth:`classify`)
+        """
+        samples = self.record(sensor)
+        if not samples:
+            return (None, None)
+        return self.classify(samples, limit)
@@ -0,0 +1,161 @@
+"""
+.. module:: aio
+
+**********
+aio Module
+**********
+
+This module contains an asyncio interface to the APDS-9960 driver, for host deployments (see :mod:`i2cdev`).
+
+Bus calls run on an executor shared by all the sensors, and the waits of the gesture engine are asyncio timers or interrupt events,
+so one event loop services many sensors concurrently without a thread per device.
+"""
+
+import asyncio
+import threading
+
+import APDS9960
+
+
+class AsyncAPDS9960():
+    """
+    =======================
+    The AsyncAPDS9960 class
+    =======================
+
+.. class:: AsyncAPDS9960(sensor, executor=None)
+
+    Awaitable facade of an :class:`APDS9960.APDS9960` instance. ::
+
+        sensor = aio.AsyncAPDS9960(APDS9960.APDS9960(1))
+        await sensor.run(sensor.sensor.initialize)
+        await sensor.run(sensor.sensor.enableGestureSensor, True)
+        async for gesture in sensor.gestures():
+            print(gesture)
+
+    executor:
+        the ``concurrent.futures`` executor of the bus calls, the default executor of the event loop if None
+
+    The facade belongs to the event loop it is created in, or else to the loop of its first awaited call.
+     """
+
+    def __init__(self, sensor, executor=None):
+        self.sensor = sensor
+        self.executor = executor
+        self._interrupt = asyncio.Event()
+        self._pending = False
+        self._bindLock = threading.Lock()
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = None
+
+    def _bind(self):
+        # Captures the event loop, and delivers an interrupt signaled before it was known
+        if self._loop is None:
+            with self._bindLock:
+                self._loop = asyncio.get_running_loop()
+                if self._pending:
+                    self._pending = False
+                    self._interrupt.set()
+        return self._loop
+
+    async def run(self, fun, *args):
+        """
+            .. method:: run(fun, *args)
+
+                Runs a blocking driver call on the executor and returns its result
+        """
+        return await self._bind().run_in_executor(self.executor, fun, *args)
+
+    def interrupt(self):
+        """
+            .. method:: interrupt()
+
+                Signals the INT pin of the sensor. It can be called from any thread, e.g. a GPIO callback.
+        """
+        with self._bindLock:
+            if self._loop is None:
+                # No event loop yet: the first awaited call sets the event
+                self._pending = True
+                return
+        self._loop.call_soon_threadsafe(self._interrupt.set)
+
+    async def wait_interrupt(self, timeout=None):
+        """
+            .. method:: wait_interrupt(timeout=None)
+
+                Waits for :meth:`interrupt` or for ``timeout`` ms
+
+                return:
+                    True if the interrupt was signaled.
+        """
+        self._bind()
+        try:
+            if timeout is None:
+                await self._interrupt.wait()
+            else:
+                await asyncio.wait_for(self._interrupt.wait(), timeout / 1000)
+        except asyncio.TimeoutError:
+            return False
+        self._interrupt.clear()
+        return True
+
+    async def read_color(self):
+        """
+            .. method:: read_color()
+
+                Returns the (clear, red, green, blue) light levels
+        """
+        return await self.run(self.sensor.readColor)
+
+    async def read_ambient_light(self):
+        """
+            .. method:: read_ambient_light()
+
+                Returns the ambient (clear) light level
+        """
+        return await self.run(self.sensor.readAmbientLight)
+
+    async def read_proximity(self):
+        """
+            .. method:: read_proximity()
+
+                Returns the proximity level
+        """
+        return await self.run(self.sensor.readProximity)
+
+    async def read_gesture(self):
+        """
+            .. method:: read_gesture()
+
+                Awaitable version of :meth:`APDS9960.readGesture`: the FIFO pauses do not block the event loop
+        """
+        # Each step of the drain runs on the executor, each pause on the event loop
+        drain = self.sensor.drainGesture()
+        drained = False
+        while True:
+            pause = await self.run(next, drain, None)
+            if pause is None:
+                break
+            drained = True
+            await asyncio.sleep(pause / 1000)
+        if not drained:
+            return APDS9960.DIR_NONE
+        return self.sensor.getGestureResult().direction
+
+    async def gestures(self, poll=None):
+        """
+            .. method:: gestures(poll=None)
+
+                Asynchronous iterator of the detected gestures (``DIR_NONE`` results are skipped)
+
+                poll:
+                    the period (ms) to check for a gesture. If None, the sensor is
+                    checked only after :meth:`interrupt` (gesture interrupts enabled).
+        """
+        while True:
+            await self.wait_interrupt(poll)
+            gesture = await self.read_gesture()
+            if gesture != APDS9960.DIR_NONE:
+                yield gesture
@@ -18,22 +18,9 @@
 
 import streams
 import APDS9960
-import threading
 
 
 streams.serial()
-lock= threading.Lock()
-
-flagGesture = threading.Event()
-gesture=None
-isr_flag=0
-
-def interruptRoutine():
-    global isr_flag
-    if isr_flag==0:
-        isr_flag = 1
-
-onPinFall(D21,interruptRoutine)
 
 print("---------------------------------------")
 print("APDS-9960 - Gesture")
@@ -44,45 +31,27 @@ try:
    
     IRGesture = APDS9960.APDS9960(I2C0)
     IRGesture.initialize()
-    IRGesture.enableGestureSensor(True)
-    
+    IRGesture.enableGestureSensor(False)
 
+    # The worker thread owns the sensor and checks for gestures every 20 ms
+    scheduler = APDS9960.Scheduler(IRGesture)
+    scheduler.addConsumer(APDS9960.GESTURE, 50, 20)
+    worker = APDS9960.AcquisitionWorker(scheduler, 8)
+    reader = worker.reader()
     
 except Exception as e:
     print(e)
     
-def irGestureRun():
-    global isr_flag, IRGesture, gesture, flagGesture
-    while True:
-        try:
-            lock.acquire()
-            
-            if isr_flag==1:
-                if IRGesture.isGestureAvailable():
-                    gesture = IRGesture.readGesture()
-                    flagGesture.set()
-                   
-                else:
-                    print("Gesture Disable")
-                
-                isr_flag=0
-                
-            lock.release()
-
-                
-        except Exception as e:
-            print(e)
-        
-        sleep(20)
-
 
 
 def gestureRecognition():
-    global gesture
     while True:
-        lock.acquire()
-        
-            
+        sample = reader.read()
+        if sample is None:
+            sleep(100)
+            continue
+
+        seq, timestamp, kind, gesture = sample
         if gesture == 'DIR_UP':
             print("UP")
         elif gesture == 'DIR_DOWN':
@@ -98,16 +67,9 @@ def gestureRecognition():
         else:
             print("NONE")
 
-        lock.release()
-        sleep(500)
-        flagGesture.wait()
-        flagGesture.clear()
+        if reader.lost:
+            print("Lost gestures:", reader.lost)
     
    
 thread(gestureRecognition)
-thread(irGestureRun)
-
-
-
-           
-
+worker.start()
@@ -0,0 +1,114 @@
+"""
+.. module:: gesture_bench
+
+*********************
+gesture_bench Module
+*********************
+
+This module compares gesture decoders side by side on a host computer.
+
+Every decoder follows the protocol of :class:`APDS9960.HeuristicDecoder` (``reset``, ``feed``, ``result``) and runs over the same corpus of
+recorded traces, fed in FIFO-sized blocks like :meth:`APDS9960.APDS9960.readGesture` does. ::
+
+    decoders = {
+        "heuristic": APDS9960.HeuristicDecoder,
+        "tree": lambda: APDS9960.ModelDecoder(tree),
+        "templates": lambda: classifier,
+    }
+    print(gesture_bench.report(gesture_bench.run(decoders, corpus)))
+
+The best decoder of a deployment is then installed with :meth:`APDS9960.APDS9960.setGestureDecoder`.
+"""
+
+import time
+import tracemalloc
+
+
+def _block(samples, start, size):
+    # Interleaved U/D/L/R bytes of size datasets, as read from the FIFO
+    data = bytearray()
+    for u, d, l, r in samples[start:start + size]:
+        data.extend((u, d, l, r))
+    return data
+
+def evaluate(decoder, corpus, block=8):
+    """
+    .. function:: evaluate(decoder, corpus, block=8)
+
+        Runs one decoder over a corpus of (label, samples) traces, ``samples`` being lists of (u, d, l, r) datasets
+
+        return:
+            a dictionary with:
+
+            * ``accuracy``: the fraction of traces decoded as their label,
+            * ``latency``: the mean number of datasets fed before the result reached its final value,
+            * ``cpu_us``: the mean CPU time (us) of a trace, reset to result,
+            * ``memory``: the peak memory (bytes) allocated while decoding a trace.
+    """
+    correct = 0
+    latency = 0
+    cpu = 0
+    memory = 0
+    for label, samples in corpus:
+        # Timed pass: the work readGesture() does for a session
+        start = time.process_time()
+        decoder.reset()
+        for i in range(0, len(samples), block):
+            data = _block(samples, i, block)
+            decoder.feed(data, len(data) // 4)
+        result = decoder.result()
+        cpu += time.process_time() - start
+        if result.direction == label:
+            correct += 1
+
+        # Untimed pass: the result after each block gives the latency to decision
+        tracemalloc.start()
+        decoder.reset()
+        decided = len(samples)
+        for i in range(0, len(samples), block):
+            data = _block(samples, i, block)
+            decoder.feed(data, len(data) // 4)
+            direction = decoder.result().direction
+            if direction != result.direction:
+                decided = len(samples)
+            elif decided == len(samples):
+                decided = min(i + block, len(samples))
+        memory = max(memory, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        latency += decided
+
+    n = max(len(corpus), 1)
+    return {
+        'accuracy': correct / n,
+        'latency': latency / n,
+        'cpu_us': cpu * 1000000 / n,
+        'memory': memory,
+    }
+
+def run(decoders, corpus, block=8):
+    """
+    .. function:: run(decoders, corpus, block=8)
+
+        Runs every decoder of a dictionary name -> factory (a callable returning a new decoder) with :func:`evaluate`
+
+        return:
+            a dictionary name -> results.
+    """
+    results = {}
+    for name in decoders:
+        results[name] = evaluate(decoders[name](), corpus, block)
+    return results
+
+def report(results):
+    """
+    .. function:: report(results)
+
+        Formats the results of :func:`run` as a text table, best accuracy first
+    """
+    names = sorted(results, key=lambda name: -results[name]['accuracy'])
+    width = max([len(name) for name in names] + [7])
+    lines = ['%-*s  %8s  %8s  %9s  %8s' % (width, 'decoder', 'accuracy', 'latency', 'cpu (us)', 'memory')]
+    for name in names:
+        r = results[name]
+        lines.append('%-*s  %7.1f%%  %8.1f  %9.1f  %8d' % (width, name, r['accuracy'] * 100, r['latency'], r['cpu_us'], r['memory']))
+    return '\n'.join(lines)
@@ -0,0 +1,159 @@
+"""
+.. module:: gesture_train
+
+*********************
+gesture_train Module
+*********************
+
+This module trains gesture models on a host computer (NumPy only) and exports them as the integer tables of :class:`APDS9960.GestureTree`.
+
+Traces are lists of (u, d, l, r) FIFO datasets, e.g. recorded with :meth:`APDS9960.TemplateClassifier.record`.
+The features are extracted with :class:`APDS9960.GestureFeatures`, the same code that runs on the device, so the trained thresholds apply unchanged. ::
+
+    X, y, labels = gesture_train.dataset(traces)
+    tree = gesture_train.train(X, y, labels, max_depth=5)
+    print(gesture_train.accuracy(tree, X, y, labels))
+    print(gesture_train.to_source(tree))
+
+The printed source creates the tree on the device: ``sensor.setGestureModel(APDS9960.GestureTree(...))``.
+"""
+
+import numpy as np
+
+import APDS9960
+
+
+def features(samples):
+    """
+    .. function:: features(samples)
+
+        Returns the :class:`APDS9960.GestureFeatures` values of a trace
+    """
+    extractor = APDS9960.GestureFeatures()
+    for u, d, l, r in samples:
+        extractor.feed(u, d, l, r)
+    return extractor.values()
+
+def dataset(traces):
+    """
+    .. function:: dataset(traces)
+
+        Builds the training set of a list of (label, samples) traces
+
+        return:
+            a tuple (X, y, labels): the integer feature matrix, the label indexes and the label list.
+    """
+    labels = []
+    rows = []
+    y = []
+    for label, samples in traces:
+        if label not in labels:
+            labels.append(label)
+        rows.append(features(samples))
+        y.append(labels.index(label))
+    return (np.array(rows, dtype=np.int64), np.array(y, dtype=np.int64), labels)
+
+def _gini(counts, total):
+    # Gini impurity of each row of class counts
+    p = counts / np.maximum(total, 1)[:, None]
+    return 1 - (p * p).sum(axis=1)
+
+def _bestSplit(X, y, classes, min_leaf):
+    # Feature and integer threshold of the split with the lowest weighted Gini impurity
+    n = len(y)
+    best = None
+    best_score = None
+    onehot = np.eye(classes, dtype=np.float64)[y]
+    for f in range(X.shape[1]):
+        order = np.argsort(X[:, f], kind='stable')
+        values = X[order, f]
+        left = np.cumsum(onehot[order], axis=0)[:-1]
+        right = left[-1] + onehot[order[-1]] - left
+        nl = np.arange(1, n)
+        # Split only between different values, leaving min_leaf samples on each side
+        valid = (values[1:] != values[:-1]) & (nl >= min_leaf) & (n - nl >= min_leaf)
+        if not valid.any():
+            continue
+        score = nl * _gini(left, nl) + (n - nl) * _gini(right, n - nl)
+        score = np.where(valid, score, np.inf)
+        i = int(np.argmin(score))
+        if best_score is None or score[i] < best_score:
+            best_score = score[i]
+            # Integer threshold, the device compares values <= threshold
+            best = (f, int(values[i]))
+    return best
+
+def train(X, y, labels, max_depth=5, min_leaf=2):
+    """
+    .. function:: train(X, y, labels, max_depth=5, min_leaf=2)
+
+        Trains a CART decision tree (Gini impurity) with integer thresholds
+
+        return:
+            an :class:`APDS9960.GestureTree`, with the purity of every leaf.
+    """
+    feature = []
+    threshold = []
+    left = []
+    right = []
+    purity = []
+    classes = len(labels)
+
+    def grow(idx, depth):
+        node = len(feature)
+        counts = np.bincount(y[idx], minlength=classes)
+        feature.append(-1)
+        threshold.append(int(counts.argmax()))
+        left.append(-1)
+        right.append(-1)
+        # Share of the traces of the node with its majority label, the confidence of a leaf
+        purity.append(int(counts.max() * 100 // len(idx)))
+        if depth >= max_depth or len(np.unique(y[idx])) == 1:
+            return node
+        split = _bestSplit(X[idx], y[idx], classes, min_leaf)
+        if split is None:
+            return node
+        f, t = split
+        mask = X[idx, f] <= t
+        feature[node] = f
+        threshold[node] = t
+        left[node] = grow(idx[mask], depth + 1)
+        right[node] = grow(idx[~mask], depth + 1)
+        return node
+
+    grow(np.arange(len(y)), 0)
+    return APDS9960.GestureTree(feature, threshold, left, right, list(labels), purity)
+
+def predict(tree, X):
+    """
+    .. function:: predict(tree, X)
+
+        Returns the labels predicted for each row of ``X``
+    """
+    return [tree.predict([int(v) for v in row]) for row in X]
+
+def accuracy(tree, X, y, labels):
+    """
+    .. function:: accuracy(tree, X, y, labels)
+
+        Returns the fraction of the rows of ``X`` predicted correctly
+    """
+    predicted = predict(tree, X)
+    return float(np.mean([predicted[i] == labels[y[i]] for i in range(len(y))]))
+
+def to_source(tree):
+    """
+    .. function:: to_source(tree)
+
+        Returns the Python source that creates the tree on the device
+    """
+    labels = []
+    for label in tree.labels:
+        if isinstance(label, str) and hasattr(APDS9960, label) and getattr(APDS9960, label) == label:
+            # Direction constants keep their names
+            labels.append('APDS9960.' + label)
+        else:
+            labels.append(repr(label))
+    if tree.purity is None:
+        return 'APDS9960.GestureTree(%r, %r, %r, %r, [%s])' % (tree.feature, tree.threshold, tree.left, tree.right, ', '.join(labels))
+    return 'APDS9960.GestureTree(%r, %r, %r, %r, [%s], %r)' % (tree.feature, tree.threshold, tree.left, tree.right, ', '.join(labels), tree.purity)
@@ -0,0 +1,200 @@
+"""
+.. module:: i2cdev
+
+*************
+i2cdev Module
+*************
+
+This module lets the APDS-9960 driver run on Linux single-board computers, through the ``/dev/i2c-N`` device nodes of the i2c-dev kernel driver.
+
+Every register read goes out as one combined write/read ``I2C_RDWR`` ioctl, so multi-byte FIFO and RGBC reads are a single kernel call.
+
+On host Python the :mod:`APDS9960` module imports this module in place of the Zerynth ``i2c`` module, so ``APDS9960.APDS9960(1)`` drives the sensor on ``/dev/i2c-1``.
+An :class:`I2CDev` can also be passed explicitly with the ``bus`` argument of :class:`APDS9960`.
+"""
+
+import ctypes
+import fcntl
+import os
+import threading
+import time
+
+
+#i2c-dev ioctl requests and message flags (linux/i2c-dev.h, linux/i2c.h)
+I2C_RDWR             =  0x0707
+I2C_M_RD             =  0x0001
+
+#Largest transfer of a single i2c_msg
+I2C_MAX_TRANSFER     =  8192
+
+
+class i2c_msg(ctypes.Structure):
+    _fields_ = [
+        ('addr', ctypes.c_uint16),
+        ('flags', ctypes.c_uint16),
+        ('len', ctypes.c_uint16),
+        ('buf', ctypes.POINTER(ctypes.c_uint8)),
+    ]
+
+class i2c_rdwr_ioctl_data(ctypes.Structure):
+    _fields_ = [
+        ('msgs', ctypes.POINTER(i2c_msg)),
+        ('nmsgs', ctypes.c_uint32),
+    ]
+
+
+class I2CDev():
+    """
+    ================
+    The I2CDev class
+    ================
+
+.. class:: I2CDev(bus, addr=0x39, clk=100000, path=None, ioctl=None)
+
+    I2C device on a Linux i2c-dev bus, with the same methods the driver uses on the Zerynth ``i2c.I2C`` class.
+
+    bus:
+        the bus number N of ``/dev/i2c-N``
+
+    clk:
+        ignored, the bus clock is set by the kernel (device tree)
+
+    path, ioctl:
+        the device node and the ioctl function, to use a stand-in of ``/dev/i2c-N``
+        that needs no hardware. ``ioctl(fd, request, data)`` receives an
+        :class:`i2c_rdwr_ioctl_data` and must fill the buffers of the read messages.
+     """
+
+    def __init__(self, bus, addr=0x39, clk=100000, path=None, ioctl=None):
+        if path is None:
+            path = '/dev/i2c-%d' % bus
+        if ioctl is None:
+            ioctl = fcntl.ioctl
+        self.path = path
+        self.addr = addr
+        self.max_transfer = I2C_MAX_TRANSFER
+        self._ioctl = ioctl
+        self._fd = None
+
+    def start(self):
+        """
+            .. method:: start()
+
+                Opens the device node
+        """
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDWR)
+
+    def stop(self):
+        """
+            .. method:: stop()
+
+                Closes the device node
+        """
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def transfer(self, *msgs):
+        """
+            .. method:: transfer(*msgs)
+
+                Runs several messages as one combined transaction (a single ``I2C_RDWR`` ioctl)
+
+                msgs:
+                    bytes to write, or an integer n to read n bytes
+
+                return:
+                    a list with the bytes read by each read message.
+        """
+        n = len(msgs)
+        array = (i2c_msg * n)()
+        bufs = []
+        for i in range(n):
+            msg = msgs[i]
+            if isinstance(msg, int):
+                buf = (ctypes.c_uint8 * msg)()
+                array[i].flags = I2C_M_RD
+                array[i].len = msg
+            else:
+                buf = (ctypes.c_uint8 * len(msg)).from_buffer_copy(bytes(msg))
+                array[i].flags = 0
+                array[i].len = len(msg)
+            array[i].addr = self.addr
+            array[i].buf = ctypes.cast(buf, ctypes.POINTER(ctypes.c_uint8))
+            bufs.append(buf)
+
+        data = i2c_rdwr_ioctl_data(array, n)
+        self._ioctl(self._fd, I2C_RDWR, data)
+
+        result = []
+        for i in range(n):
+            if isinstance(msgs[i], int):
+                result.append(bytes(bufs[i]))
+        return result
+
+    def write_read(self, reg, n):
+        """
+            .. method:: write_read(reg, n)
+
+                Writes the register address ``reg`` and reads ``n`` bytes without releasing the bus
+        """
+        return self.transfer(bytes((reg,)), n)[0]
+
+    def write_bytes(self, *data):
+        """
+            .. method:: write_bytes(*data)
+
+                Writes the bytes ``data``
+        """
+        self.transfer(bytes(data))
+
+    def write(self, data):
+        """
+            .. method:: write(data)
+
+                Writes a bytes-like object
+        """
+        self.transfer(data)
+
+    def read(self, n):
+        """
+            .. method:: read(n)
+
+                Reads ``n`` bytes
+        """
+        return self.transfer(n)[0]
+
+
+#Host stand-ins for the Zerynth runtime used by the APDS9960 module
+
+I2C = I2CDev
+
+class timers():
+    @staticmethod
+    def now():
+        return int(time.monotonic() * 1000)
+
+def sleep(ms):
+    time.sleep(ms / 1000)
+
+def thread(fun, *args):
+    th = threading.Thread(target=fun, args=args)
+    th.daemon = True
+    th.start()
+    return th
+
+class RuntimeErrorSet(ValueError):
+    pass
+
+class RuntimeErrorDel(ValueError):
+    pass
+
+class ErrorReadingRegister(RuntimeError):
+    pass
+
+class ErrorWritingRegister(RuntimeError):
+    pass
+
+class ErrorDevice(RuntimeError):
+    pass
@@ -0,0 +1,40 @@
+import os
+import sys
+import threading
+
+import pytest
+
+# The driver modules live at the top of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import APDS9960
+
+
+class Sleeps(list):
+    # The waits of the driver, with whether another thread could take the device lock during each
+
+    def __init__(self):
+        list.__init__(self)
+        self.sensor = None
+
+    def _probe(self, free):
+        if self.sensor._lock.acquire(False):
+            self.sensor._lock.release()
+            free.append(True)
+
+    def __call__(self, ms):
+        free = []
+        probe = threading.Thread(target=self._probe, args=(free,))
+        probe.start()
+        probe.join()
+        self.append((ms, bool(free)))
+
+    def locked(self):
+        return [ms for ms, free in self if not free]
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    record = Sleeps()
+    monkeypatch.setattr(APDS9960, 'sleep', record)
+    return record
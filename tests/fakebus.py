@@ -0,0 +1,147 @@
+"""
+Stand-in for a Linux ``/dev/i2c-N`` bus, plugged into :class:`i2cdev.I2CDev` through its ``ioctl`` argument.
+
+The bus routes every ``I2C_RDWR`` message to the simulated device at the message address,
+directly on the bus or behind the selected channels of a simulated TCA9548A.
+"""
+
+import errno
+import os
+
+import i2cdev
+
+
+class FakeAPDS9960():
+    # Register file of an APDS-9960 with the auto-incrementing address pointer
+    # and a gesture FIFO of (u, d, l, r) datasets. The FIFO holds 32 datasets:
+    # the following ones are lost and GFOV is set until the next FIFO read
+
+    def __init__(self):
+        self.regs = bytearray(256)
+        self.regs[0x92] = 0xAB
+        self.pointer = 0
+        self.fifo = []
+        self.pending = []
+        self.per = 4
+        self.overflow = False
+        self.lost = 0
+        self.failed = False
+        self.reads_left = None
+        self.writes = []
+
+    def gesture(self, trace, per=4):
+        # Starts a gesture session: power and gesture on, and the datasets of
+        # trace reach the FIFO per at a time, at every GSTATUS read
+        self.regs[0x80] = 0x41
+        self.pending = list(trace)
+        self.per = per
+
+    def write(self, data):
+        if self.failed:
+            raise OSError(errno.EIO, 'device does not answer')
+        self.pointer = data[0]
+        self.writes.append(tuple(data))
+        for value in data[1:]:
+            self.regs[self.pointer] = value
+            self.pointer = (self.pointer + 1) & 0xFF
+
+    def read(self, n):
+        if self.reads_left is not None:
+            # Fails after a number of reads
+            self.reads_left -= 1
+            self.failed = self.failed or self.reads_left < 0
+        if self.failed:
+            raise OSError(errno.EIO, 'device does not answer')
+        if self.pointer == 0xFC:
+            self.overflow = False
+            out = bytearray()
+            while len(out) < n:
+                if self.fifo:
+                    out.extend(self.fifo.pop(0))
+                else:
+                    out.extend((0, 0, 0, 0))
+            return bytes(out[:n])
+        if self.pointer == 0xAE:
+            return bytes([len(self.fifo)] + [0] * (n - 1))
+        if self.pointer == 0xAF:
+            self.fifo.extend(self.pending[:self.per])
+            del self.pending[:self.per]
+            if len(self.fifo) > 32:
+                self.lost += len(self.fifo) - 32
+                del self.fifo[32:]
+                self.overflow = True
+            return bytes([(1 if self.fifo else 0) | (2 if self.overflow else 0)] + [0] * (n - 1))
+        out = bytearray()
+        for i in range(n):
+            out.append(self.regs[(self.pointer + i) & 0xFF])
+        return bytes(out)
+
+
+class FakeMux():
+    # TCA9548A: the control byte is the mask of the connected channels
+
+    def __init__(self):
+        self.mask = 0
+        self.channels = {}
+        self.writes = []
+
+    def attach(self, channel, addr, device):
+        self.channels.setdefault(channel, {})[addr] = device
+
+    def write(self, data):
+        self.mask = data[-1]
+        self.writes.append(self.mask)
+
+    def read(self, n):
+        return bytes([self.mask] * n)
+
+    def connected(self, addr):
+        found = []
+        for channel in self.channels:
+            if self.mask & (1 << channel) and addr in self.channels[channel]:
+                found.append(self.channels[channel][addr])
+        return found
+
+
+class FakeBus():
+
+    def __init__(self):
+        self.devices = {}
+        self.transfers = []
+
+    def attach(self, addr, device):
+        self.devices[addr] = device
+        return device
+
+    def open(self, addr):
+        # An I2CDev for addr on this bus, with /dev/null standing in for the device node
+        return i2cdev.I2CDev(0, addr, path=os.devnull, ioctl=self.ioctl)
+
+    def route(self, addr):
+        found = []
+        if addr in self.devices:
+            found.append(self.devices[addr])
+        for device in self.devices.values():
+            if isinstance(device, FakeMux):
+                found.extend(device.connected(addr))
+        if len(found) == 0:
+            raise OSError(errno.ENXIO, 'no device at 0x%02x' % addr)
+        if len(found) > 1:
+            raise OSError(errno.EIO, 'bus collision at 0x%02x' % addr)
+        return found[0]
+
+    def ioctl(self, fd, request, data):
+        assert request == i2cdev.I2C_RDWR
+        msgs = []
+        for i in range(data.nmsgs):
+            msgs.append(data.msgs[i])
+        self.transfers.append([(msg.addr, msg.flags, msg.len) for msg in msgs])
+        for msg in msgs:
+            device = self.route(msg.addr)
+            if msg.flags & i2cdev.I2C_M_RD:
+                values = device.read(msg.len)
+                for j in range(msg.len):
+                    msg.buf[j] = values[j]
+            else:
+                device.write(bytes(msg.buf[j] for j in range(msg.len)))
+        return 0
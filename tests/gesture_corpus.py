@@ -0,0 +1,87 @@
+"""
+Synthetic gesture traces: lists of (u, d, l, r) datasets as read from the gesture FIFO.
+"""
+
+import math
+import random
+
+import APDS9960
+
+
+DIRECTIONS = [APDS9960.DIR_UP, APDS9960.DIR_DOWN, APDS9960.DIR_LEFT, APDS9960.DIR_RIGHT]
+
+
+def swipe(direction, n=24, base=0, peak=200):
+    # The hand crosses the photodiode pair of the swipe: the diode it meets
+    # first (U for DIR_UP) peaks at 35 % of the trace, the opposite one at 65 %
+    out = []
+    for t in range(n):
+        a = base + peak * math.exp(-((t - n * 0.35) / (n * 0.2)) ** 2)
+        b = base + peak * math.exp(-((t - n * 0.65) / (n * 0.2)) ** 2)
+        c = (a + b) / 2
+        if direction == APDS9960.DIR_UP:
+            u, d, l, r = a, b, c, c
+        elif direction == APDS9960.DIR_DOWN:
+            u, d, l, r = b, a, c, c
+        elif direction == APDS9960.DIR_LEFT:
+            u, d, l, r = c, c, a, b
+        else:
+            u, d, l, r = c, c, b, a
+        out.append(tuple(min(255, int(v)) for v in (u, d, l, r)))
+    return out
+
+
+def circle(n=24, phase=0, turn=1):
+    out = []
+    for t in range(n):
+        a = 2 * math.pi * t / n * turn + phase
+        out.append((int(60 + 75 * (1 + math.sin(a))), int(60 + 75 * (1 - math.sin(a))),
+                    int(60 + 75 * (1 + math.cos(a))), int(60 + 75 * (1 - math.cos(a)))))
+    return out
+
+
+def tap(n=24, taps=1):
+    out = []
+    for t in range(n):
+        e = int(40 + 160 * max(0, math.sin(math.pi * taps * t / n)))
+        out.append((e, e, e, e))
+    return out
+
+
+def hold(n=24):
+    return [(150, 150, 150, 150)] * n
+
+
+def noisy(rng, trace, amount=10):
+    return [tuple(max(0, min(255, v + rng.randint(-amount, amount))) for v in x) for x in trace]
+
+
+def random_trace(rng):
+    # A noisy swipe of random length and strength, or plain noise
+    if rng.random() < 0.6:
+        trace = swipe(rng.choice(DIRECTIONS), rng.randint(8, 40), rng.randint(0, 40), rng.randint(30, 240))
+        return noisy(rng, trace, 15)
+    return [tuple(rng.randint(0, 255) for k in range(4)) for i in range(rng.randint(5, 40))]
+
+
+def swipe_corpus(seed, count):
+    # count noisy swipes per direction, with random length, baseline, peak and gain
+    rng = random.Random(seed)
+    corpus = []
+    for direction in DIRECTIONS:
+        for k in range(count):
+            trace = swipe(direction, rng.randint(12, 40), rng.randint(15, 40), rng.randint(60, 230))
+            trace = [tuple(max(0, min(255, int(v * (1 + rng.uniform(-0.2, 0.2))) + rng.randint(-12, 12))) for v in x) for x in trace]
+            corpus.append((direction, trace))
+    return corpus
+
+
+def feed(decoder, trace, block):
+    # Feeds a trace to a decoder in FIFO reads of block datasets
+    decoder.reset()
+    for i in range(0, len(trace), block):
+        data = bytearray()
+        for dataset in trace[i:i + block]:
+            data.extend(dataset)
+        decoder.feed(data, len(data) // 4)
+    return decoder.result()
@@ -0,0 +1,98 @@
+"""
+The SparkFun gesture decoder as it was before the fixed-point rewrite: float first/last
+ratios and the original near/far rules, behind the decoder protocol of
+:class:`APDS9960.HeuristicDecoder`. It only returns the direction.
+"""
+
+from APDS9960 import (
+    DIR_DOWN, DIR_FAR, DIR_LEFT, DIR_NEAR, DIR_NONE, DIR_RIGHT, DIR_UP,
+    GESTURE_SENSITIVITY_1, GESTURE_SENSITIVITY_2, GESTURE_THRESHOLD_OUT,
+)
+
+
+class FloatDecoder():
+
+    def reset(self):
+        self.ud_delta = 0
+        self.lr_delta = 0
+        self.ud_count = 0
+        self.lr_count = 0
+        self.near_count = 0
+        self.far_count = 0
+        self.state = None
+        self.motion = DIR_NONE
+
+    def feed(self, fifo_data, fifo_level):
+        if fifo_level <= 0:
+            return
+        data = [tuple(fifo_data[i:i + 4]) for i in range(0, fifo_level * 4, 4)]
+        if self._process(data):
+            self._decode()
+
+    def result(self):
+        self._decode()
+        return self.motion
+
+    def _process(self, data):
+        if len(data) <= 4:
+            return False
+        above = [x for x in data if min(x) > GESTURE_THRESHOLD_OUT]
+        if not above:
+            return False
+        u_first, d_first, l_first, r_first = above[0]
+        u_last, d_last, l_last, r_last = above[-1]
+
+        ud_delta = (u_last - d_last) * 100 / (u_last + d_last) - (u_first - d_first) * 100 / (u_first + d_first)
+        lr_delta = (l_last - r_last) * 100 / (l_last + r_last) - (l_first - r_first) * 100 / (l_first + r_first)
+        self.ud_delta += ud_delta
+        self.lr_delta += lr_delta
+
+        self.ud_count = self._count(self.ud_delta)
+        self.lr_count = self._count(self.lr_delta)
+
+        small = abs(ud_delta) < GESTURE_SENSITIVITY_2 and abs(lr_delta) < GESTURE_SENSITIVITY_2
+        if self.ud_count == 0 and self.lr_count == 0:
+            if small:
+                if ud_delta == 0 and lr_delta == 0:
+                    self.near_count += 1
+                else:
+                    self.far_count += 1
+                if self.near_count >= 10 and self.far_count >= 2:
+                    if ud_delta == 0 and lr_delta == 0:
+                        self.state = DIR_NEAR
+                    elif ud_delta != 0 and lr_delta != 0:
+                        self.state = DIR_FAR
+                    return True
+        elif small:
+            if ud_delta == 0 and lr_delta == 0:
+                self.near_count += 1
+            if self.near_count >= 10:
+                self.ud_count = 0
+                self.lr_count = 0
+                self.ud_delta = 0
+                self.lr_delta = 0
+        return False
+
+    def _count(self, delta):
+        if delta >= GESTURE_SENSITIVITY_1:
+            return 1
+        if delta <= -GESTURE_SENSITIVITY_1:
+            return -1
+        return 0
+
+    def _decode(self):
+        if self.state is not None:
+            self.motion = self.state
+            return
+        ud = self.ud_count
+        lr = self.lr_count
+        if ud == 0 and lr == 0:
+            self.motion = DIR_NONE
+        elif lr == 0:
+            self.motion = DIR_DOWN if ud == 1 else DIR_UP
+        elif ud == 0:
+            self.motion = DIR_RIGHT if lr == 1 else DIR_LEFT
+        elif abs(self.ud_delta) > abs(self.lr_delta):
+            self.motion = DIR_DOWN if ud == 1 else DIR_UP
+        else:
+            self.motion = DIR_RIGHT if lr == 1 else DIR_LEFT
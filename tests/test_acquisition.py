@@ -0,0 +1,133 @@
+import time
+
+import pytest
+
+import APDS9960
+from fakebus import FakeAPDS9960, FakeBus
+
+
+def test_ring_read_in_order():
+    ring = APDS9960.SampleRing(4)
+    ring.push(APDS9960.PROXIMITY, 1, 100)
+    reader = APDS9960.RingReader(ring)
+    # Only the samples pushed after the reader creation
+    assert reader.read() is None
+    for i in range(3):
+        ring.push(APDS9960.PROXIMITY, 10 + i, 200 + i)
+    assert reader.available() == 3
+    assert [reader.read() for i in range(3)] == [(1 + i, 200 + i, APDS9960.PROXIMITY, 10 + i) for i in range(3)]
+    assert reader.read() is None
+    assert reader.lost == 0
+
+
+def test_ring_overrun():
+    ring = APDS9960.SampleRing(4)
+    reader = APDS9960.RingReader(ring)
+    for i in range(10):
+        ring.push(APDS9960.AMBIENT_LIGHT, i, i)
+    assert reader.available() == 10
+    # The 6 oldest samples were overwritten: the sequence jumps from nothing to 6
+    samples = []
+    while True:
+        sample = reader.read()
+        if sample is None:
+            break
+        samples.append(sample[0])
+    assert samples == [6, 7, 8, 9]
+    assert reader.lost == 6
+    assert reader.available() == 0
+
+
+def test_ring_readers_lag_independently():
+    ring = APDS9960.SampleRing(4)
+    fast = APDS9960.RingReader(ring)
+    slow = APDS9960.RingReader(ring)
+    seen = []
+    for i in range(12):
+        ring.push(APDS9960.PROXIMITY, i, i)
+        seen.append(fast.read()[0])
+        if i == 1:
+            assert slow.read()[0] == 0
+    assert seen == list(range(12))
+    assert fast.lost == 0
+    # slow read 0, then fell 11 samples behind a ring of 4
+    assert slow.available() == 11
+    assert slow.read()[0] == 8
+    assert slow.lost == 7
+
+
+def test_ring_slot_overwritten_while_reading():
+    ring = APDS9960.SampleRing(4)
+    reader = APDS9960.RingReader(ring)
+    for i in range(3):
+        ring.push(APDS9960.PROXIMITY, i, i)
+    # The producer is rewriting the slot of sample 0
+    ring._seq[0] = -1
+    assert reader.read()[0] == 1
+    assert reader.lost == 1
+
+
+def _worker(rate=200):
+    bus = FakeBus()
+    chip = bus.attach(APDS9960.APDS9960_I2C_ADDR, FakeAPDS9960())
+    chip.regs[APDS9960.APDS9960_PDATA] = 42
+    sensor = APDS9960.APDS9960(1, bus=bus.open(APDS9960.APDS9960_I2C_ADDR))
+    scheduler = APDS9960.Scheduler(sensor)
+    scheduler.addConsumer(APDS9960.PROXIMITY, rate)
+    return APDS9960.AcquisitionWorker(scheduler, 8), chip
+
+
+def test_worker_samples():
+    worker, chip = _worker()
+    reader = worker.reader()
+    worker.start()
+    try:
+        time.sleep(0.2)
+    finally:
+        worker.stop()
+    samples = []
+    while True:
+        sample = reader.read()
+        if sample is None:
+            break
+        samples.append(sample)
+    assert samples
+    assert all(kind == APDS9960.PROXIMITY and value == 42 for seq, timestamp, kind, value in samples)
+    seqs = [sample[0] for sample in samples]
+    assert seqs == list(range(seqs[0], seqs[0] + len(seqs)))
+    assert seqs[0] == reader.lost
+
+
+def test_worker_counts_bus_errors():
+    worker, chip = _worker()
+    worker.scheduler.apply()
+    chip.failed = True
+    polls = []
+
+    def poll(now):
+        polls.append(now)
+        if len(polls) == 3:
+            worker.stop()
+        return [(APDS9960.PROXIMITY, worker.scheduler.sensor.readProximity())]
+
+    worker.scheduler.poll = poll
+    worker._running = True
+    worker._run()
+    assert worker.errors == 3
+    assert isinstance(worker.error, APDS9960.ErrorReadingRegister)
+
+
+def test_worker_stops_on_other_errors():
+    worker, chip = _worker()
+    worker.scheduler.apply()
+
+    def poll(now):
+        raise TypeError('bug')
+
+    worker.scheduler.poll = poll
+    worker._running = True
+    with pytest.raises(TypeError):
+        worker._run()
+    assert not worker._running
+    assert worker.errors == 0
+    assert isinstance(worker.error, TypeError)
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+
+import APDS9960
+import aio
+from fakebus import FakeAPDS9960, FakeBus
+from gesture_corpus import DIRECTIONS, swipe
+
+
+def _sensors(n):
+    out = []
+    for i in range(n):
+        # One bus per sensor: they all answer at the APDS-9960 address
+        bus = FakeBus()
+        chip = bus.attach(APDS9960.APDS9960_I2C_ADDR, FakeAPDS9960())
+        sensor = APDS9960.APDS9960(1, bus=bus.open(APDS9960.APDS9960_I2C_ADDR))
+        out.append((aio.AsyncAPDS9960(sensor), chip))
+    return out
+
+
+def test_read_color_and_proximity():
+    sensor, chip = _sensors(1)[0]
+    chip.regs[APDS9960.APDS9960_CDATAL:APDS9960.APDS9960_CDATAL + 8] = bytes([1, 2, 3, 4, 5, 6, 7, 8])
+    chip.regs[APDS9960.APDS9960_PDATA] = 77
+
+    async def main():
+        return (await sensor.read_color(), await sensor.read_proximity(), await sensor.read_ambient_light())
+
+    assert asyncio.run(main()) == ((0x0201, 0x0403, 0x0605, 0x0807), 77, 0x0201)
+
+
+def test_gesture_stream_polling():
+    sensor, chip = _sensors(1)[0]
+    chip.gesture(swipe(APDS9960.DIR_LEFT), 6)
+
+    async def main():
+        stream = sensor.gestures(poll=5)
+        try:
+            return await asyncio.wait_for(stream.__anext__(), 5)
+        finally:
+            await stream.aclose()
+
+    assert asyncio.run(main()) == APDS9960.DIR_LEFT
+
+
+def test_gesture_stream_interrupt():
+    sensor, chip = _sensors(1)[0]
+
+    async def main():
+        stream = sensor.gestures()
+        first = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0.05)
+        # Nothing is read before the interrupt
+        assert not first.done()
+        assert chip.writes == []
+        chip.gesture(swipe(APDS9960.DIR_DOWN), 6)
+        # Signaled from a foreign thread, e.g. a GPIO callback
+        threading.Thread(target=sensor.interrupt).start()
+        try:
+            return await asyncio.wait_for(first, 5)
+        finally:
+            await stream.aclose()
+
+    assert asyncio.run(main()) == APDS9960.DIR_DOWN
+
+
+def test_interrupt_before_the_loop():
+    sensor, chip = _sensors(1)[0]
+    # No event loop is known yet: the signal waits for the first await
+    sensor.interrupt()
+    assert asyncio.run(sensor.wait_interrupt(1000))
+    assert sensor._loop is not None
+
+
+def test_many_sensors_at_once():
+    sensors = _sensors(4)
+    polls = []
+    for i, ((sensor, chip), direction) in enumerate(zip(sensors, DIRECTIONS)):
+        chip.gesture(swipe(direction), 6)
+        read = chip.read
+
+        def logged(n, read=read, chip=chip, i=i):
+            # The GSTATUS polls of every sensor, in bus order
+            if chip.pointer == APDS9960.APDS9960_GSTATUS:
+                polls.append(i)
+            return read(n)
+
+        chip.read = logged
+
+    async def main():
+        return await asyncio.gather(*[sensor.read_gesture() for sensor, chip in sensors])
+
+    assert asyncio.run(main()) == DIRECTIONS
+    # The FIFO pauses of one sensor do not hold the others back: the drains interleave
+    last = len(polls) - 1 - polls[::-1].index(0)
+    assert polls.index(len(sensors) - 1) < last
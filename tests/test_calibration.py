@@ -0,0 +1,105 @@
+import pytest
+
+import APDS9960
+from fakebus import FakeAPDS9960, FakeBus
+
+
+class CrosstalkChip(FakeAPDS9960):
+    # PDATA of the enabled photodiode pair: its crosstalk minus twice its offset
+    crosstalk = {APDS9960.PMASK_UR: 70, APDS9960.PMASK_DL: 40}
+
+    def read(self, n):
+        if self.pointer == APDS9960.APDS9960_PDATA:
+            mask = self.regs[APDS9960.APDS9960_CONFIG3] & 0b1111
+            reg = APDS9960.APDS9960_POFFSET_UR
+            if mask == APDS9960.PMASK_DL:
+                reg = APDS9960.APDS9960_POFFSET_DL
+            pdata = self.crosstalk.get(mask, 90) - 2 * APDS9960._fromSignMagnitude(self.regs[reg])
+            self.regs[APDS9960.APDS9960_PDATA] = max(0, min(255, pdata))
+        return FakeAPDS9960.read(self, n)
+
+
+def _sensor(chip):
+    bus = FakeBus()
+    bus.attach(APDS9960.APDS9960_I2C_ADDR, chip)
+    return APDS9960.APDS9960(1, bus=bus.open(APDS9960.APDS9960_I2C_ADDR))
+
+
+def test_proximity_offset_calibration(sleeps):
+    chip = CrosstalkChip()
+    chip.regs[APDS9960.APDS9960_CONFIG3] = 0b00000000
+    sensor = sleeps.sensor = _sensor(chip)
+    calibration = sensor.calibrateProximityOffset()
+    assert (calibration.baseline_ur, calibration.baseline_dl) == (70, 40)
+    assert (calibration.ur, calibration.dl) == (33, 18)
+    assert APDS9960._fromSignMagnitude(chip.regs[APDS9960.APDS9960_POFFSET_UR]) == 33
+    assert APDS9960._fromSignMagnitude(chip.regs[APDS9960.APDS9960_POFFSET_DL]) == 18
+    assert chip.regs[APDS9960.APDS9960_CONFIG3] == 0
+    assert sleeps and sleeps.locked() == []
+
+
+@pytest.mark.parametrize('distance', [0, -5, 65536])
+def test_distance_out_of_range(distance):
+    calibration = APDS9960.DistanceCalibration()
+    with pytest.raises(ValueError):
+        calibration.addPoint(0, 0, 0, distance, 100)
+    assert calibration.points == {}
+
+
+def test_distance_tables():
+    # PDATA = 32768 / distance^2 + 4, exact at these distances
+    calibration = APDS9960.DistanceCalibration()
+    for distance in (16, 32, 64, 128):
+        calibration.addPoint(0, 0, 0, distance, 4 + 32768 // (distance * distance))
+    calibration.fit()
+    table = calibration.table(0, 0, 0)
+    assert table[36] == 32
+    assert table[255] == 16
+    assert table[0] == 128
+    restored = APDS9960.DistanceCalibration.from_bytes(calibration.to_bytes())
+    assert restored.table(0, 0, 0) == table
+
+    chip = FakeAPDS9960()
+    chip.regs[APDS9960.APDS9960_PDATA] = 12
+    assert _sensor(chip).readDistance(table) == 64
+
+
+def test_largest_distance():
+    calibration = APDS9960.DistanceCalibration()
+    calibration.addPoint(0, 0, 0, 1, 250)
+    calibration.addPoint(0, 0, 0, 65535, 4)
+    calibration.fit()
+    table = APDS9960.DistanceCalibration.from_bytes(calibration.to_bytes()).table(0, 0, 0)
+    assert table[0] == 65535
+
+
+class GestureCrosstalkChip(FakeAPDS9960):
+    # Every GFLVL read finds four new datasets: the crosstalk of each
+    # photodiode minus twice its gesture offset
+    crosstalk = (60, 35, 80, 20)
+    offsets = (APDS9960.APDS9960_GOFFSET_U, APDS9960.APDS9960_GOFFSET_D, APDS9960.APDS9960_GOFFSET_L, APDS9960.APDS9960_GOFFSET_R)
+
+    def read(self, n):
+        if self.pointer == APDS9960.APDS9960_GFLVL:
+            dataset = []
+            for k in range(4):
+                value = self.crosstalk[k] - 2 * APDS9960._fromSignMagnitude(self.regs[self.offsets[k]])
+                dataset.append(max(0, min(255, value)))
+            self.fifo.extend([tuple(dataset)] * 4)
+        return FakeAPDS9960.read(self, n)
+
+
+def test_gesture_offset_calibration(sleeps):
+    chip = GestureCrosstalkChip()
+    chip.regs[APDS9960.APDS9960_GCONF4] = 0b00000011
+    chip.regs[APDS9960.APDS9960_GEXTH] = 30
+    chip.regs[APDS9960.APDS9960_GPULSE] = 0xC9
+    sensor = sleeps.sensor = _sensor(chip)
+    calibration = sensor.calibrateGestureOffset()
+    assert calibration.baseline == [60, 35, 80, 20]
+    assert [calibration.u, calibration.d, calibration.l, calibration.r] == [28, 16, 38, 8]
+    assert [APDS9960._fromSignMagnitude(chip.regs[reg]) for reg in chip.offsets] == [28, 16, 38, 8]
+    assert chip.regs[APDS9960.APDS9960_GPULSE] == 0xC9
+    assert chip.regs[APDS9960.APDS9960_GCONF4] == 0b00000011
+    assert chip.regs[APDS9960.APDS9960_GEXTH] == 30
+    assert sleeps and sleeps.locked() == []
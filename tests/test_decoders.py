@@ -0,0 +1,167 @@
+"""
+Checks behind the decoder claims: the fixed-point heuristic against the float
+SparkFun decoder, and the accuracy of the template classifier and of trained
+trees on synthetic corpora.
+
+``PYTHONPATH=. python tests/test_decoders.py`` prints the gesture_bench table
+of a trained tree against the heuristic.
+"""
+
+import random
+
+import pytest
+
+import APDS9960
+import gesture_bench
+from gesture_corpus import DIRECTIONS, circle, feed, hold, noisy, random_trace, swipe, swipe_corpus, tap
+from reference_decoder import FloatDecoder
+
+
+def test_fixed_point_heuristic_matches_float_decoder():
+    rng = random.Random(1)
+    heuristic = APDS9960.HeuristicDecoder()
+    reference = FloatDecoder()
+    differ = 0
+    for k in range(3000):
+        trace = random_trace(rng)
+        block = rng.randint(1, 12)
+        feed(reference, trace, block)
+        if feed(heuristic, trace, block).direction != reference.result():
+            # Only where the float sums are within the Q8 rounding of the sensitivity
+            edge = min(abs(abs(reference.ud_delta) - APDS9960.GESTURE_SENSITIVITY_1),
+                       abs(abs(reference.lr_delta) - APDS9960.GESTURE_SENSITIVITY_1))
+            assert edge < 0.01, trace
+            differ += 1
+    assert differ <= 1
+
+
+def _extended(rng, n):
+    # Noisy variable-length circles, taps, holds and swipes, n of each
+    kinds = [
+        ('cw', lambda: circle(rng.randint(16, 40), rng.uniform(-0.3, 0.3))),
+        ('ccw', lambda: circle(rng.randint(16, 40), rng.uniform(-0.3, 0.3), -1)),
+        ('double', lambda: tap(rng.randint(16, 40), 2)),
+        ('tap', lambda: tap(rng.randint(16, 40), 1)),
+        ('hold', lambda: hold(rng.randint(8, 40))),
+    ]
+    for direction in DIRECTIONS:
+        kinds.append((direction, lambda direction=direction: swipe(direction, rng.randint(16, 40))))
+    return [(label, noisy(rng, make())) for label, make in kinds for k in range(n)]
+
+
+def _templates():
+    classifier = APDS9960.TemplateClassifier()
+    classifier.addTemplate('cw', circle())
+    classifier.addTemplate('ccw', circle(turn=-1))
+    classifier.addTemplate('double', tap(taps=2))
+    classifier.addTemplate('tap', tap())
+    classifier.addTemplate('hold', hold())
+    for direction in DIRECTIONS:
+        classifier.addTemplate(direction, swipe(direction))
+    return classifier
+
+
+def test_template_classifier_accuracy():
+    classifier = _templates()
+    corpus = _extended(random.Random(3), 40)
+    correct = sum(classifier.classify(samples)[0] == label for label, samples in corpus)
+    assert correct == len(corpus)
+    # The lower bounds and early abandoning skip part of the DTW work
+    assert classifier.pruned + classifier.abandoned > 0
+
+
+def _trained():
+    gesture_train = pytest.importorskip('gesture_train')
+    X, y, labels = gesture_train.dataset(swipe_corpus(5, 150))
+    return gesture_train.train(X, y, labels, max_depth=4)
+
+
+def _decoders(tree):
+    return {
+        'heuristic': APDS9960.HeuristicDecoder,
+        'tree': lambda: APDS9960.ModelDecoder(tree),
+    }
+
+
+def test_tree_beats_heuristic():
+    results = gesture_bench.run(_decoders(_trained()), swipe_corpus(6, 80))
+    assert results['tree']['accuracy'] >= 0.85
+    assert results['tree']['accuracy'] > results['heuristic']['accuracy'] + 0.3
+
+
+class _Constant():
+    # Decides DIR_UP once 8 datasets were fed
+    def reset(self):
+        self.count = 0
+
+    def feed(self, fifo_data, fifo_level):
+        self.count += fifo_level
+
+    def result(self):
+        return APDS9960.GestureResult(APDS9960.DIR_UP if self.count >= 8 else APDS9960.DIR_NONE, 0, APDS9960.DIR_NONE)
+
+
+def test_bench_measures():
+    corpus = [(direction, swipe(direction, 20)) for direction in DIRECTIONS]
+    results = gesture_bench.run({'constant': _Constant}, corpus, block=4)['constant']
+    assert results['accuracy'] == 0.25
+    assert results['latency'] == 8
+    assert results['cpu_us'] > 0
+
+
+if __name__ == '__main__':
+    print(gesture_bench.report(gesture_bench.run(_decoders(_trained()), swipe_corpus(6, 80))))
+
+
+SENSITIVITY = APDS9960.GESTURE_SENSITIVITY_1 << APDS9960.GESTURE_FRACTION_BITS
+FULL = APDS9960.GESTURE_FULL_SAMPLES
+
+
+@pytest.mark.parametrize('delta, confidence', [
+    (SENSITIVITY // 2, 25),
+    (SENSITIVITY, 50),
+    (SENSITIVITY * 3 // 2, 75),
+    (SENSITIVITY * 2, 100),
+    (SENSITIVITY * 4, 100),
+])
+def test_rate_motion_confidence(delta, confidence):
+    result = APDS9960._rateMotion(APDS9960.DIR_UP, -delta, 0, FULL)
+    assert (result.direction, result.confidence, result.runner_up, result.samples) == (APDS9960.DIR_UP, confidence, APDS9960.DIR_NONE, FULL)
+    # Short sessions are scaled down, long ones are not scaled up
+    assert APDS9960._rateMotion(APDS9960.DIR_UP, -delta, 0, FULL // 4).confidence == confidence // 4
+    assert APDS9960._rateMotion(APDS9960.DIR_UP, -delta, 0, FULL * 3).confidence == confidence
+
+
+def test_rate_motion_runner_up():
+    rate = APDS9960._rateMotion
+    # The other axis, in the sign of its delta, weighs down the confidence
+    result = rate(APDS9960.DIR_DOWN, 2 * SENSITIVITY, SENSITIVITY, FULL)
+    assert (result.confidence, result.runner_up) == (50, APDS9960.DIR_RIGHT)
+    assert rate(APDS9960.DIR_DOWN, 2 * SENSITIVITY, -SENSITIVITY // 2, FULL).runner_up == APDS9960.DIR_LEFT
+    result = rate(APDS9960.DIR_LEFT, -SENSITIVITY // 2, -2 * SENSITIVITY, FULL)
+    assert (result.confidence, result.runner_up) == (75, APDS9960.DIR_UP)
+    assert rate(APDS9960.DIR_RIGHT, SENSITIVITY, 2 * SENSITIVITY, FULL).runner_up == APDS9960.DIR_DOWN
+    # No motion: the stronger axis
+    result = rate(APDS9960.DIR_NONE, SENSITIVITY // 4, -SENSITIVITY // 2, FULL)
+    assert (result.confidence, result.runner_up) == (0, APDS9960.DIR_LEFT)
+    assert rate(APDS9960.DIR_NONE, 0, 0, FULL).runner_up == APDS9960.DIR_NONE
+    # Near/far from the near count
+    assert rate(APDS9960.DIR_NEAR, 0, 0, FULL, 7).confidence == 70
+    assert rate(APDS9960.DIR_FAR, SENSITIVITY, 0, FULL, 12).confidence == 100
+
+
+def test_heuristic_confidence_and_runner_up():
+    for direction in DIRECTIONS:
+        result = feed(APDS9960.HeuristicDecoder(), swipe(direction), 6)
+        # A clean swipe: no motion on the other axis
+        assert (result.direction, result.confidence, result.runner_up, result.samples) == (direction, 100, APDS9960.DIR_NONE, 24)
+
+    # A LEFT swipe crossing an UP motion: the weaker the UP motion, the higher the confidence
+    confidences = []
+    for base in (40, 80, 120, 200):
+        trace = [(y[0], y[1], x[2], x[3]) for x, y in zip(swipe(APDS9960.DIR_LEFT), swipe(APDS9960.DIR_UP, base=base, peak=100))]
+        result = feed(APDS9960.HeuristicDecoder(), trace, 6)
+        assert (result.direction, result.runner_up) == (APDS9960.DIR_LEFT, APDS9960.DIR_UP)
+        confidences.append(result.confidence)
+    assert confidences == sorted(confidences)
+    assert 0 < confidences[0] < confidences[-1] < 100
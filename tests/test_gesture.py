@@ -0,0 +1,357 @@
+import asyncio
+
+import pytest
+
+import APDS9960
+import aio
+from fakebus import FakeAPDS9960, FakeBus
+from gesture_corpus import DIRECTIONS, feed, swipe
+
+
+def _sensor():
+    bus = FakeBus()
+    chip = bus.attach(APDS9960.APDS9960_I2C_ADDR, FakeAPDS9960())
+    return APDS9960.APDS9960(1, bus=bus.open(APDS9960.APDS9960_I2C_ADDR)), chip
+
+
+@pytest.mark.parametrize('direction', DIRECTIONS)
+def test_read_gesture(direction):
+    sensor, chip = _sensor()
+    chip.gesture(swipe(direction), 6)
+    assert sensor.readGesture() == direction
+    assert sensor.getGestureResult().direction == direction
+    assert sensor.getGestureResult().samples == 24
+
+
+def test_read_gesture_without_data():
+    sensor, chip = _sensor()
+    chip.gesture(swipe(APDS9960.DIR_LEFT), 6)
+    assert sensor.readGesture() == APDS9960.DIR_LEFT
+    assert sensor.readGesture() == APDS9960.DIR_NONE
+    # The result of the last gesture is kept
+    assert sensor.getGestureResult().direction == APDS9960.DIR_LEFT
+
+
+def test_drain_gesture_passes_every_dataset():
+    sensor, chip = _sensor()
+    trace = swipe(APDS9960.DIR_UP, 30)
+    chip.gesture(trace, 7)
+    read = []
+
+    def consume(fifo_data, fifo_level):
+        for i in range(0, fifo_level * 4, 4):
+            read.append(tuple(fifo_data[i:i + 4]))
+
+    pauses = list(sensor.drainGesture(consume))
+    assert read == trace
+    # One pause before each read: 14, 7, 7 and 2 datasets, then the end of the data
+    assert len(pauses) == 5
+    assert all(APDS9960.FIFO_MIN_PAUSE <= pause <= APDS9960.FIFO_MAX_PAUSE for pause in pauses)
+
+
+def test_drain_gesture_needs_gesture_mode():
+    sensor, chip = _sensor()
+    chip.gesture(swipe(APDS9960.DIR_UP))
+    chip.regs[APDS9960.APDS9960_ENABLE] = 0
+    assert list(sensor.drainGesture()) == []
+
+
+@pytest.mark.parametrize('direction', DIRECTIONS)
+def test_async_read_gesture(direction):
+    sensor, chip = _sensor()
+    chip.gesture(swipe(direction), 6)
+    assert asyncio.run(aio.AsyncAPDS9960(sensor).read_gesture()) == direction
+
+
+@pytest.mark.parametrize('direction', DIRECTIONS)
+def test_pipeline_read(direction):
+    sensor, chip = _sensor()
+    pipeline = APDS9960.GesturePipeline(sensor)
+    chip.gesture(swipe(direction), 6)
+    assert pipeline.read() == direction
+    # 12, 6 and 6 datasets
+    assert pipeline.bursts == 3
+    assert pipeline.read() == APDS9960.DIR_NONE
+
+
+class BrokenDecoder(APDS9960.HeuristicDecoder):
+    def feed(self, fifo_data, fifo_level):
+        raise ValueError('broken decoder')
+
+
+def test_pipeline_raises_decoder_errors():
+    sensor, chip = _sensor()
+    pipeline = APDS9960.GesturePipeline(sensor)
+    sensor.setGestureDecoder(BrokenDecoder())
+    chip.gesture(swipe(APDS9960.DIR_UP), 6)
+    with pytest.raises(ValueError):
+        pipeline.read()
+
+    # Both buffers were released: the next gesture goes through
+    sensor.setGestureDecoder(APDS9960.HeuristicDecoder())
+    chip.gesture(swipe(APDS9960.DIR_UP), 6)
+    assert pipeline.read() == APDS9960.DIR_UP
+    pipeline.stop()
+
+
+def test_pipeline_recovers_from_bus_errors():
+    sensor, chip = _sensor()
+    pipeline = APDS9960.GesturePipeline(sensor)
+    chip.gesture(swipe(APDS9960.DIR_LEFT), 6)
+    chip.reads_left = 8
+    with pytest.raises(APDS9960.ErrorReadingRegister):
+        pipeline.read()
+
+    chip.failed = False
+    chip.reads_left = None
+    chip.fifo = []
+    chip.gesture(swipe(APDS9960.DIR_RIGHT), 6)
+    assert pipeline.read() == APDS9960.DIR_RIGHT
+    pipeline.stop()
+
+
+def test_pipeline_stop():
+    sensor, chip = _sensor()
+    pipeline = APDS9960.GesturePipeline(sensor)
+    pipeline.stop()
+    chip.gesture(swipe(APDS9960.DIR_DOWN), 6)
+    assert pipeline.read() == APDS9960.DIR_DOWN
+    decoder = pipeline._decoder
+    pipeline.stop()
+    decoder.join(1)
+    assert not decoder.is_alive()
+    assert pipeline._decoder is None
+
+    # A new decoder thread starts with the next gesture
+    chip.gesture(swipe(APDS9960.DIR_DOWN), 5)
+    assert pipeline.read() == APDS9960.DIR_DOWN
+    assert pipeline._decoder is not None
+    pipeline.stop()
+
+
+def test_segmenter_read():
+    sensor, chip = _sensor()
+    quiet = [(0, 0, 0, 0)] * 4
+    chip.gesture(swipe(APDS9960.DIR_LEFT) + quiet + swipe(APDS9960.DIR_DOWN))
+    results = APDS9960.GestureSegmenter(sensor).read()
+    assert [result.direction for result in results] == [APDS9960.DIR_LEFT, APDS9960.DIR_DOWN]
+
+
+def test_template_record():
+    sensor, chip = _sensor()
+    trace = swipe(APDS9960.DIR_RIGHT)
+    chip.gesture(trace, 5)
+    assert APDS9960.TemplateClassifier().record(sensor) == trace
+
+
+def test_template_record_capacity():
+    sensor, chip = _sensor()
+    trace = swipe(APDS9960.DIR_RIGHT, 40)
+    chip.gesture(trace, 5)
+    classifier = APDS9960.TemplateClassifier(capacity=64)
+    samples = classifier.record(sensor, 16)
+    # Halved at 16 datasets, then every other dataset of the session is kept
+    assert len(samples) < 16
+    assert samples == trace[::4][:len(samples)]
+    assert classifier.capacity == 64
+
+
+def _drain(sensor, chip, bus, trace, per):
+    # The FIFO bytes handed to the consumer, and the sizes of the FIFO reads
+    chip.gesture(trace, per)
+    read = bytearray()
+    del bus.transfers[:]
+
+    def consume(fifo_data, fifo_level):
+        read.extend(fifo_data[:fifo_level * 4])
+
+    list(sensor.drainGesture(consume))
+    sizes = []
+    for transfer in bus.transfers:
+        # Register pointer, then the read: only the FIFO reads are longer than a byte
+        if len(transfer) == 2 and transfer[1][2] > 1:
+            sizes.append(transfer[1][2])
+    return bytes(read), sizes
+
+
+def _fifo_sensor():
+    bus = FakeBus()
+    chip = bus.attach(APDS9960.APDS9960_I2C_ADDR, FakeAPDS9960())
+    return APDS9960.APDS9960(1, bus=bus.open(APDS9960.APDS9960_I2C_ADDR)), chip, bus
+
+
+def test_fifo_chunk_setting():
+    sensor, chip = _sensor()
+    # The whole FIFO fits the transfers of the bus backend
+    assert sensor.getFifoChunk() == APDS9960.FIFO_SIZE * 4
+    sensor.setFifoChunk(10)
+    assert sensor.getFifoChunk() == 8
+    sensor.setFifoChunk(1000)
+    assert sensor.getFifoChunk() == APDS9960.FIFO_SIZE * 4
+    with pytest.raises(ValueError):
+        sensor.setFifoChunk(3)
+
+
+def test_fifo_chunked_reads():
+    trace = swipe(APDS9960.DIR_UP, 30)
+    sensor, chip, bus = _fifo_sensor()
+    whole, sizes = _drain(sensor, chip, bus, trace, 7)
+    # 14, 7, 7 and 2 datasets, one transfer each
+    assert sizes == [56, 28, 28, 8]
+
+    sensor, chip, bus = _fifo_sensor()
+    sensor.setFifoChunk(12)
+    chunked, sizes = _drain(sensor, chip, bus, trace, 7)
+    assert sizes == [12, 12, 12, 12, 8, 12, 12, 4, 12, 12, 4, 8]
+    # The same bytes, reassembled in the same buffer
+    assert chunked == whole == bytes(value for dataset in trace for value in dataset)
+    assert len(sensor._fifoBuf) == APDS9960.FIFO_SIZE * 4
+    assert sensor.getFifoChunkStats()[12][:2] == [len(sizes), len(trace) * 4]
+
+
+def test_fifo_short_read():
+    sensor, chip = _sensor()
+    chip.gesture(swipe(APDS9960.DIR_UP), 6)
+    write_read = sensor.write_read
+
+    def short(reg, n):
+        data = write_read(reg, n)
+        if reg == APDS9960.APDS9960_GFIFO_U:
+            return data[:n - 4]
+        return data
+
+    sensor.write_read = short
+    with pytest.raises(APDS9960.ErrorReadingRegister):
+        sensor.readGesture()
+    # The buffer kept its size
+    assert len(sensor._fifoBuf) == APDS9960.FIFO_SIZE * 4
+
+
+def test_best_fifo_chunk():
+    sensor, chip, bus = _fifo_sensor()
+    assert sensor.bestFifoChunk() is None
+    for size in (4, 32):
+        sensor.setFifoChunk(size)
+        _drain(sensor, chip, bus, swipe(APDS9960.DIR_LEFT), 6)
+    stats = sensor.getFifoChunkStats()
+    assert sorted(stats) == [4, 32]
+    assert stats[4][:2] == [24, 96]
+    # Below the timer resolution: the fewest transfers per byte
+    stats[4][2] = stats[32][2] = 0
+    assert sensor.bestFifoChunk() == 32
+    # Then the time per byte
+    stats[4][2] = 1
+    stats[32][2] = 5
+    assert sensor.bestFifoChunk() == 4
+
+
+def test_fifo_overflow():
+    sensor, chip = _sensor()
+    # GWTIME 2.8 ms: the drain starts with a 45 ms pause for 16 datasets
+    chip.regs[APDS9960.APDS9960_GCONF2] = 1
+    trace = swipe(APDS9960.DIR_UP, 40)
+    chip.gesture(trace, 36)
+    read = []
+
+    def consume(fifo_data, fifo_level):
+        read.extend(tuple(fifo_data[i:i + 4]) for i in range(0, fifo_level * 4, 4))
+
+    pauses = list(sensor.drainGesture(consume))
+    assert chip.lost == 8
+    assert read == trace[:32]
+    assert sensor.getFifoOverflows() == sensor.fifo_overflows == 1
+    # The pause is halved after the overflow
+    assert pauses == [45, 22]
+    assert sensor.getFifoPause() == 22
+
+
+def test_fifo_drain_adaptation(monkeypatch):
+    sensor, chip = _sensor()
+    clock = [1000]
+    monkeypatch.setattr(APDS9960.timers, 'now', staticmethod(lambda: clock[0]))
+    valid = APDS9960.APDS9960_GVALID
+
+    def fetch(level, interval=40, gstatus=valid):
+        clock[0] += interval
+        sensor._adaptDrain(gstatus, level)
+        return sensor.getFifoPause()
+
+    sensor._fifoPause = 30
+    sensor._fifoLast = None
+    # Nothing to compare the first read with
+    assert fetch(32) == 30
+    # Within the 8..24 watermarks
+    assert fetch(8) == fetch(24) == 30
+    # A full FIFO in 40 ms (10 ms outside the pause): 16 datasets in 20 ms
+    assert fetch(32) == 40 * 32 // 64 - 10
+    # Empty: twice as long, then bounded
+    assert fetch(0) == 20
+    sensor._fifoPause = 30
+    assert fetch(4) == APDS9960.FIFO_MAX_PAUSE
+    # Overflows halve the pause down to the minimum, whatever the level
+    assert fetch(16, gstatus=valid | APDS9960.APDS9960_GFOV) == 50
+    sensor._fifoPause = 6
+    assert fetch(16, gstatus=valid | APDS9960.APDS9960_GFOV) == APDS9960.FIFO_MIN_PAUSE
+    assert sensor.getFifoOverflows() == 2
+
+    # A narrower window moves the target
+    sensor.setFifoWatermarks(2, 6)
+    sensor._fifoPause = 30
+    assert fetch(4) == 30
+    assert fetch(10) == 40 * 8 // 20 - 10
+    for low, high in ((0, 6), (7, 6), (2, APDS9960.FIFO_SIZE)):
+        with pytest.raises(ValueError):
+            sensor.setFifoWatermarks(low, high)
+
+
+def _timed(monkeypatch, trace):
+    # readGesture() of trace with a clock that only moves in its pauses,
+    # GWTIME 2.8 ms and 6 datasets reaching the FIFO at each GSTATUS read
+    clock = [1000]
+    pauses = []
+
+    def sleep(ms):
+        pauses.append(ms)
+        clock[0] += ms
+
+    monkeypatch.setattr(APDS9960.timers, 'now', staticmethod(lambda: clock[0]))
+    monkeypatch.setattr(APDS9960, 'sleep', sleep)
+    sensor, chip = _sensor()
+    chip.regs[APDS9960.APDS9960_GCONF2] = 1
+    chip.gesture(trace, 6)
+    sensor.readGesture()
+    return sensor.getGestureResult(), pauses
+
+
+def test_gesture_timing(monkeypatch):
+    # The L and R peaks of a 24 dataset swipe are 8 datasets apart
+    result, pauses = _timed(monkeypatch, swipe(APDS9960.DIR_LEFT))
+    assert (result.direction, result.samples, result.lag) == (APDS9960.DIR_LEFT, 24, 8)
+
+    # Reads of 12, 6 and 6 datasets after the first three pauses
+    first = 1000 + pauses[0]
+    last = first + pauses[1] + pauses[2]
+    assert result.period == (last - first) / 12
+    assert result.end == last
+    # The first read also holds the 11 datasets before its last one
+    assert result.start == int(first - 11 * result.period)
+    assert result.start < first < result.end
+    assert result.velocity == int(1000 / (8 * result.period)) > 0
+
+
+def test_gesture_velocity(monkeypatch):
+    left, pauses = _timed(monkeypatch, swipe(APDS9960.DIR_LEFT))
+    right, pauses = _timed(monkeypatch, swipe(APDS9960.DIR_RIGHT))
+    # The direction has the sign, the velocity is the speed
+    assert right.direction == APDS9960.DIR_RIGHT
+    assert right.velocity == left.velocity > 0
+    assert (right.start, right.end) == (left.start, left.end)
+
+    # A slower hand: the peaks at datasets 17 and 31 of a 48 dataset swipe
+    slow, pauses = _timed(monkeypatch, swipe(APDS9960.DIR_LEFT, 48))
+    assert (slow.direction, slow.lag) == (APDS9960.DIR_LEFT, 14)
+    assert slow.velocity == int(1000 / (14 * slow.period)) < left.velocity
+    assert slow.end - slow.start > left.end - left.start
+
+    # No timing for the results of the decoder alone
+    assert feed(APDS9960.HeuristicDecoder(), swipe(APDS9960.DIR_LEFT), 6).velocity == 0
@@ -0,0 +1,113 @@
+import ctypes
+import errno
+import os
+
+import pytest
+
+import APDS9960
+import i2cdev
+from fakebus import FakeAPDS9960, FakeBus
+
+
+class Recorder():
+    # ioctl stand-in: records the decoded i2c_msg array and fills the read buffers
+    def __init__(self, reply=b''):
+        self.calls = []
+        self.reply = reply
+
+    def __call__(self, fd, request, data):
+        msgs = []
+        for i in range(data.nmsgs):
+            msg = data.msgs[i]
+            payload = None
+            if msg.flags & i2cdev.I2C_M_RD:
+                for j in range(msg.len):
+                    msg.buf[j] = self.reply[j]
+            else:
+                payload = bytes(msg.buf[j] for j in range(msg.len))
+            msgs.append((msg.addr, msg.flags, msg.len, payload))
+        self.calls.append((fd, request, msgs))
+        return 0
+
+
+def _dev(ioctl, addr=0x39):
+    dev = i2cdev.I2CDev(1, addr, path=os.devnull, ioctl=ioctl)
+    dev.start()
+    return dev
+
+
+def test_struct_layout_matches_the_kernel():
+    # struct i2c_msg { __u16 addr; __u16 flags; __u16 len; __u8 *buf; }
+    assert i2cdev.i2c_msg.addr.offset == 0
+    assert i2cdev.i2c_msg.flags.offset == 2
+    assert i2cdev.i2c_msg.len.offset == 4
+    assert i2cdev.i2c_msg.buf.offset == ctypes.sizeof(ctypes.c_void_p)
+    assert i2cdev.i2c_rdwr_ioctl_data.nmsgs.offset == ctypes.sizeof(ctypes.c_void_p)
+
+
+def test_write_read_is_one_combined_transfer():
+    ioctl = Recorder(b'\x12\x34\x56')
+    dev = _dev(ioctl)
+    assert dev.write_read(0x94, 3) == b'\x12\x34\x56'
+    assert len(ioctl.calls) == 1
+    fd, request, msgs = ioctl.calls[0]
+    assert fd == dev._fd
+    assert request == i2cdev.I2C_RDWR
+    assert msgs == [(0x39, 0, 1, b'\x94'), (0x39, i2cdev.I2C_M_RD, 3, None)]
+
+
+def test_writes_and_reads_are_single_messages():
+    ioctl = Recorder(b'\xab\xcd')
+    dev = _dev(ioctl, 0x70)
+    dev.write_bytes(0x80, 0x45)
+    dev.write(bytearray((1, 2, 3)))
+    assert dev.read(2) == b'\xab\xcd'
+    assert [call[2] for call in ioctl.calls] == [
+        [(0x70, 0, 2, b'\x80\x45')],
+        [(0x70, 0, 3, b'\x01\x02\x03')],
+        [(0x70, i2cdev.I2C_M_RD, 2, None)],
+    ]
+
+
+def test_transfer_returns_every_read():
+    ioctl = Recorder(b'\x07\x08')
+    dev = _dev(ioctl)
+    assert dev.transfer(b'\xfc', 2, 1) == [b'\x07\x08', b'\x07']
+
+
+def test_ioctl_failure_raises():
+    def fail(fd, request, data):
+        raise OSError(errno.EREMOTEIO, 'no acknowledge')
+    dev = _dev(fail)
+    with pytest.raises(OSError):
+        dev.write_read(0x92, 1)
+    with pytest.raises(OSError):
+        dev.write_bytes(0x80, 0)
+
+
+def test_missing_device_node_raises():
+    dev = i2cdev.I2CDev(1, path='/nonexistent/i2c-1')
+    with pytest.raises(OSError):
+        dev.start()
+
+
+def test_stop_closes_the_device_node():
+    dev = _dev(Recorder())
+    dev.stop()
+    assert dev._fd is None
+    dev.stop()
+
+
+def test_driver_wraps_bus_errors():
+    bus = FakeBus()
+    chip = bus.attach(0x39, FakeAPDS9960())
+    sensor = APDS9960.APDS9960(1, bus=bus.open(0x39))
+    chip.regs[APDS9960.APDS9960_PDATA] = 42
+    assert sensor.readProximity() == 42
+    assert bus.transfers[-1] == [(0x39, 0, 1), (0x39, i2cdev.I2C_M_RD, 1)]
+
+    chip.failed = True
+    with pytest.raises(APDS9960.ErrorReadingRegister):
+        sensor.readProximity()
+    with pytest.raises(APDS9960.ErrorWritingRegister):
+        sensor._write_reg(APDS9960.APDS9960_ENABLE, 0)
@@ -0,0 +1,81 @@
+import pytest
+
+import APDS9960
+from fakebus import FakeAPDS9960, FakeBus, FakeMux
+
+
+def _setup(policy=APDS9960.ROUND_ROBIN, period=0):
+    # Two multiplexers on one bus, an APDS-9960 on channel 0 of each
+    bus = FakeBus()
+    muxes = []
+    chips = []
+    manager = APDS9960.SensorManager(policy)
+    for i in range(2):
+        addr = APDS9960.TCA9548A_I2C_ADDR + i
+        fake = bus.attach(addr, FakeMux())
+        chip = FakeAPDS9960()
+        chip.regs[APDS9960.APDS9960_PDATA] = 10 * (i + 1)
+        fake.attach(0, APDS9960.APDS9960_I2C_ADDR, chip)
+        mux = APDS9960.I2CMux(1, addr, bus=bus.open(addr))
+        sensor = APDS9960.APDS9960(1, bus=bus.open(APDS9960.APDS9960_I2C_ADDR))
+        manager.add(sensor, mux, 0, period)
+        muxes.append((mux, fake))
+        chips.append(chip)
+    return bus, manager, muxes, chips
+
+
+def test_mux_select_is_cached():
+    bus = FakeBus()
+    fake = bus.attach(0x70, FakeMux())
+    mux = APDS9960.I2CMux(1, 0x70, bus=bus.open(0x70))
+    mux.select(3)
+    mux.select(3)
+    assert fake.writes == [0b1000]
+    assert mux.selects == 1
+    mux.select(None)
+    assert fake.writes == [0b1000, 0]
+
+
+def test_mux_select_failure_forces_next_write():
+    bus = FakeBus()
+    mux = APDS9960.I2CMux(1, 0x70, bus=bus.open(0x70))
+    with pytest.raises(APDS9960.ErrorWritingRegister):
+        mux.select(2)
+    fake = bus.attach(0x70, FakeMux())
+    mux.select(2)
+    assert fake.writes == [0b100]
+
+
+def test_manager_selects_one_channel_per_bus():
+    bus, manager, muxes, chips = _setup()
+    assert manager.poll() == (0, 10)
+    assert muxes[0][1].mask == 1
+    assert manager.poll() == (1, 20)
+    # The first multiplexer is disconnected, otherwise both sensors would answer
+    assert muxes[0][1].mask == 0
+    assert muxes[1][1].mask == 1
+    assert manager.poll() == (0, 10)
+    assert muxes[1][1].mask == 0
+
+
+def test_manager_counts_errors_and_skips_failed_device():
+    bus, manager, muxes, chips = _setup()
+    chips[0].failed = True
+    with pytest.raises(APDS9960.ErrorReadingRegister):
+        manager.poll()
+    assert manager.stats(0).errors == 1
+    assert manager.stats(0).samples == 0
+
+    # The round robin moves on to the healthy device
+    assert manager.poll() == (1, 20)
+    assert manager.stats(1).samples == 1
+    assert manager.stats(1).errors == 0
+
+
+def test_deadline_policy_reads_the_device_due_first():
+    bus, manager, muxes, chips = _setup(APDS9960.DEADLINE, 1000)
+    now = APDS9960.timers.now()
+    manager._devices[0][5] = now + 1000
+    manager._devices[1][5] = now - 10
+    assert manager.poll() == (1, 20)
+    assert manager.poll() is None
@@ -0,0 +1,73 @@
+import pytest
+
+import APDS9960
+from gesture_corpus import feed, swipe, swipe_corpus
+
+np = pytest.importorskip('numpy')
+import gesture_train  # noqa: E402
+
+
+def _tree(seed=5, count=40, max_depth=4):
+    X, y, labels = gesture_train.dataset(swipe_corpus(seed, count))
+    return gesture_train.train(X, y, labels, max_depth), X, y, labels
+
+
+def test_train_leaf_purity():
+    tree, X, y, labels = _tree()
+    leaves = [i for i in range(len(tree.feature)) if tree.feature[i] < 0]
+    for i in leaves:
+        assert 0 < tree.purity[i] <= 100
+    # Every training row reaches a leaf whose purity matches the share of its label there
+    reached = {}
+    for row, label in zip(X, y):
+        values = [int(v) for v in row]
+        reached.setdefault(tree._leaf(values), []).append(labels[label])
+    for i, rows in reached.items():
+        majority = labels[tree.threshold[i]]
+        assert tree.purity[i] == rows.count(majority) * 100 // len(rows)
+
+
+def test_to_source_keeps_purity():
+    tree = _tree()[0]
+    copy = eval(gesture_train.to_source(tree), {'APDS9960': APDS9960})
+    assert copy.purity == tree.purity
+    assert copy.labels == tree.labels
+    # Trees without purity keep their former source
+    bare = APDS9960.GestureTree([-1], [0], [-1], [-1], [APDS9960.DIR_UP])
+    assert gesture_train.to_source(bare) == 'APDS9960.GestureTree([-1], [0], [-1], [-1], [APDS9960.DIR_UP])'
+
+
+def test_model_decoder_confidence_from_purity():
+    tree = APDS9960.GestureTree([-1], [0], [-1], [-1], [APDS9960.DIR_UP], [80])
+    decoder = APDS9960.ModelDecoder(tree)
+    result = feed(decoder, swipe(APDS9960.DIR_UP, 64), 8)
+    assert result.samples >= APDS9960.GESTURE_FULL_SAMPLES
+    assert (result.direction, result.confidence) == (APDS9960.DIR_UP, 80)
+    # Scaled down like the heuristic confidence on short sessions
+    result = feed(decoder, swipe(APDS9960.DIR_UP, 16), 8)
+    assert 0 < result.samples < APDS9960.GESTURE_FULL_SAMPLES
+    assert result.confidence == 80 * result.samples // APDS9960.GESTURE_FULL_SAMPLES
+
+
+class _LabelOnly():
+    def predict(self, values):
+        return APDS9960.DIR_LEFT
+
+
+def test_model_decoder_label_only_models():
+    decoder = APDS9960.ModelDecoder(_LabelOnly())
+    result = feed(decoder, swipe(APDS9960.DIR_LEFT), 8)
+    assert (result.direction, result.confidence) == (APDS9960.DIR_LEFT, 0)
+    tree = APDS9960.GestureTree([-1], [0], [-1], [-1], [APDS9960.DIR_LEFT])
+    assert APDS9960.ModelDecoder(tree).result().confidence == 0
+
+
+def test_trained_model_confidence():
+    tree = _tree()[0]
+    decoder = APDS9960.ModelDecoder(tree)
+    for direction, trace in swipe_corpus(6, 5):
+        result = feed(decoder, trace, 8)
+        values = gesture_train.features(trace)
+        label, purity = tree.classify(values)
+        assert result.direction == label
+        assert result.confidence == purity * min(result.samples, APDS9960.GESTURE_FULL_SAMPLES) // APDS9960.GESTURE_FULL_SAMPLES
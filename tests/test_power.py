@@ -0,0 +1,90 @@
+import pytest
+
+import APDS9960
+from fakebus import FakeAPDS9960, FakeBus
+
+
+def _sensor(chip):
+    bus = FakeBus()
+    bus.attach(APDS9960.APDS9960_I2C_ADDR, chip)
+    return APDS9960.APDS9960(1, bus=bus.open(APDS9960.APDS9960_I2C_ADDR))
+
+
+def _written(chip):
+    # Register writes, without the address pointer writes of the reads
+    return [w for w in chip.writes if len(w) > 1]
+
+
+@pytest.mark.parametrize('period, wtime, wlong, steps', [
+    (0, 255, 0, 1),
+    (100, 256 - 35, 0, 35),
+    (712, 0, 0, 256),
+    (1000, 256 - 29, 1, 29 * APDS9960.WLONG_FACTOR),
+    (60000, 0, 1, 256 * APDS9960.WLONG_FACTOR),
+])
+def test_wait_settings(period, wtime, wlong, steps):
+    setting = APDS9960._waitSettings(period)
+    assert setting[:2] == (wtime, wlong)
+    assert abs(setting[2] - steps * APDS9960.CYCLE_STEP_MS) < 1e-9
+
+
+def test_persistence():
+    chip = FakeAPDS9960()
+    chip.regs[APDS9960.APDS9960_PERS] = 0x03
+    sensor = _sensor(chip)
+    sensor.setProximityPersistence(5)
+    assert chip.regs[APDS9960.APDS9960_PERS] == 0x53
+    assert sensor.getProximityPersistence() == 5
+    sensor.setLightPersistence(9)
+    assert chip.regs[APDS9960.APDS9960_PERS] == 0x59
+    assert sensor.getLightPersistence() == 9
+
+
+def test_wait_period(sleeps):
+    chip = FakeAPDS9960()
+    chip.regs[APDS9960.APDS9960_ENABLE] = APDS9960.APDS9960_PON | APDS9960.APDS9960_AEN
+    chip.regs[APDS9960.APDS9960_CONFIG1] = 0x60
+    sensor = sleeps.sensor = _sensor(chip)
+    actual = sensor.setWaitPeriod(1000)
+    assert abs(actual - 29 * APDS9960.WLONG_FACTOR * APDS9960.CYCLE_STEP_MS) < 1e-9
+    assert chip.regs[APDS9960.APDS9960_WTIME] == 256 - 29
+    assert chip.regs[APDS9960.APDS9960_CONFIG1] == 0x60 | APDS9960.APDS9960_WLONG
+    assert chip.regs[APDS9960.APDS9960_ENABLE] == APDS9960.APDS9960_PON | APDS9960.APDS9960_AEN | APDS9960.APDS9960_WEN
+    assert sensor.getWaitTime() == 256 - 29
+    assert sensor.getWaitLong() == 1
+    # One settle for the three registers, after the lock is released
+    assert sleeps == [(100, True)]
+
+    del chip.writes[:]
+    sensor.setWaitPeriod(100)
+    assert chip.regs[APDS9960.APDS9960_CONFIG1] == 0x60
+    assert chip.regs[APDS9960.APDS9960_WTIME] == 256 - 35
+    # ENABLE already has WEN
+    assert [w[0] for w in _written(chip)] == [APDS9960.APDS9960_WTIME, APDS9960.APDS9960_CONFIG1]
+
+    # Nothing changes, nothing to wait for
+    del sleeps[:]
+    sensor.setWaitPeriod(100)
+    assert sleeps == []
+
+
+def test_low_power_watch(sleeps):
+    chip = FakeAPDS9960()
+    chip.regs[APDS9960.APDS9960_ENABLE] = 0x7F
+    chip.regs[APDS9960.APDS9960_PERS] = 0x02
+    sensor = sleeps.sensor = _sensor(chip)
+    actual = sensor.low_power_watch(10, 200, persistence=4, period=1000)
+    assert abs(actual - 29 * APDS9960.WLONG_FACTOR * APDS9960.CYCLE_STEP_MS) < 1e-9
+
+    writes = _written(chip)
+    assert writes == [
+        (APDS9960.APDS9960_PILT, 10),
+        (APDS9960.APDS9960_PIHT, 200),
+        (APDS9960.APDS9960_PERS, 0x42),
+        (APDS9960.APDS9960_WTIME, 256 - 29),
+        (APDS9960.APDS9960_CONFIG1, APDS9960.APDS9960_WLONG),
+        (APDS9960.APDS9960_ENABLE, APDS9960.APDS9960_PON | APDS9960.APDS9960_PEN | APDS9960.APDS9960_WEN | APDS9960.APDS9960_PIEN),
+    ]
+    # The interrupt is cleared after ENABLE
+    assert chip.writes[-1] == (APDS9960.APDS9960_PICLEAR,)
+    assert sleeps == [(100, True)]
@@ -0,0 +1,219 @@
+import pytest
+
+import APDS9960
+from fakebus import FakeAPDS9960, FakeBus
+
+
+class SideChip(FakeAPDS9960):
+    # PDATA of the photodiode selected by the proximity mask
+    sides = {APDS9960.PMASK_U: 80, APDS9960.PMASK_D: 20, APDS9960.PMASK_L: 50, APDS9960.PMASK_R: 45}
+
+    def read(self, n):
+        if self.pointer == APDS9960.APDS9960_PDATA:
+            self.regs[APDS9960.APDS9960_PDATA] = self.sides.get(self.regs[APDS9960.APDS9960_CONFIG3] & 0b1111, 0)
+        return FakeAPDS9960.read(self, n)
+
+
+def _sensor(chip):
+    bus = FakeBus()
+    bus.attach(APDS9960.APDS9960_I2C_ADDR, chip)
+    return APDS9960.APDS9960(1, bus=bus.open(APDS9960.APDS9960_I2C_ADDR))
+
+
+def test_scan(sleeps):
+    chip = SideChip()
+    chip.regs[APDS9960.APDS9960_CONFIG3] = 0b00000001
+    sensor = sleeps.sensor = _sensor(chip)
+    scanner = APDS9960.ProximityScanner(sensor, settle=10)
+    assert scanner.scan() == [80, 20, 50, 45]
+    assert scanner.direction() == APDS9960.DIR_UP
+    assert sleeps == [(10, True)] * 4
+
+    scanner.stop()
+    assert chip.regs[APDS9960.APDS9960_CONFIG3] == 0b00000001
+
+
+def test_gate_idle_enables_last():
+    chip = FakeAPDS9960()
+    gate = APDS9960.GestureGate(_sensor(chip), wake=60)
+    gate.idle()
+    writes = [write for write in chip.writes if len(write) > 1]
+    assert writes[-1] == (APDS9960.APDS9960_ENABLE, APDS9960.APDS9960_PON | APDS9960.APDS9960_PEN | APDS9960.APDS9960_WEN | APDS9960.APDS9960_PIEN)
+    assert (APDS9960.APDS9960_PIHT, 60) in writes
+
+    # Back from the gesture profile, the thresholds are rewritten before the interrupt is armed
+    gate.arm()
+    del chip.writes[:]
+    gate.idle()
+    writes = [write[0] for write in chip.writes if len(write) > 1]
+    assert writes[-1] == APDS9960.APDS9960_ENABLE
+    assert writes.index(APDS9960.APDS9960_PPULSE) < writes.index(APDS9960.APDS9960_ENABLE)
+
+
+def test_presence_thresholds_are_checked():
+    sensor = _sensor(FakeAPDS9960())
+    for near, far in [(0, -1), (256, 200), (50, 50), (40, 60)]:
+        with pytest.raises(ValueError):
+            APDS9960.PresenceDetector(sensor, near, far)
+    APDS9960.PresenceDetector(sensor, 1, 0)
+    APDS9960.PresenceDetector(sensor, 255, 254)
+
+
+def test_presence_hysteresis():
+    detector = APDS9960.PresenceDetector(_sensor(FakeAPDS9960()), near=60, far=40)
+    assert detector.update(59, 0) is None
+    assert detector.update(60, 10) == (APDS9960.NEAR_STATE, 10)
+    # Inside the band the state holds
+    for value in (59, 50, 41, 60, 41):
+        assert detector.update(value, 20) is None
+    assert detector.state == APDS9960.NEAR_STATE
+    assert detector.update(40, 30) == (APDS9960.FAR_STATE, 30)
+    assert detector.update(59, 40) is None
+    assert detector.state == APDS9960.FAR_STATE
+
+
+def test_presence_dwell():
+    detector = APDS9960.PresenceDetector(_sensor(FakeAPDS9960()), near=60, far=40, near_dwell=100, far_dwell=50)
+    assert detector.update(70, 0) is None
+    assert detector.pending()
+    # A sample back under the threshold restarts the dwell
+    assert detector.update(55, 50) is None
+    assert not detector.pending()
+    assert detector.update(70, 60) is None
+    assert detector.update(70, 159) is None
+    assert detector.update(70, 160) == (APDS9960.NEAR_STATE, 160)
+    assert detector.update(30, 200) is None
+    assert detector.update(30, 250) == (APDS9960.FAR_STATE, 250)
+
+
+def test_presence_arm_and_service(sleeps):
+    chip = FakeAPDS9960()
+    sensor = sleeps.sensor = _sensor(chip)
+    detector = APDS9960.PresenceDetector(sensor, near=60, far=40)
+    detector.arm()
+    assert chip.regs[APDS9960.APDS9960_PILT] == 0
+    assert chip.regs[APDS9960.APDS9960_PIHT] == 59
+    # One settle for both thresholds, after the lock is released
+    assert sleeps == [(100, True)]
+
+    chip.regs[APDS9960.APDS9960_PDATA] = 80
+    del chip.writes[:]
+    assert detector.service()[0] == APDS9960.NEAR_STATE
+    # The window now waits for the far threshold, and the interrupt is cleared
+    assert chip.regs[APDS9960.APDS9960_PILT] == 41
+    assert chip.regs[APDS9960.APDS9960_PIHT] == 255
+    assert (APDS9960.APDS9960_PICLEAR,) in chip.writes
+    assert sleeps.locked() == []
+
+    # No transition: nothing to re-arm
+    del chip.writes[:]
+    assert detector.service() is None
+    assert [write for write in chip.writes if len(write) > 1] == []
+
+
+def _color(chip, clear, red, green, blue, pdata):
+    data = []
+    for value in (clear, red, green, blue):
+        data += [value & 0xFF, value >> 8]
+    chip.regs[APDS9960.APDS9960_CDATAL:APDS9960.APDS9960_CDATAL + 9] = bytes(data + [pdata])
+
+
+def test_compensated_proximity():
+    chip = FakeAPDS9960()
+    sensor = _sensor(chip)
+    _color(chip, 300, 200, 150, 60, 90)
+    # IR = (R + G + B - C) / 2
+    assert sensor.readProximityIR() == (90, 55)
+    assert sensor.readCompensatedProximity() == 90
+    sensor.setAmbientIRFactor(128)
+    assert sensor.readCompensatedProximity() == 90 - 55 // 2
+    sensor.setAmbientIRFactor(1024)
+    assert sensor.readCompensatedProximity() == 0
+    # More clear than color light: no IR
+    _color(chip, 500, 100, 100, 100, 90)
+    assert sensor.readProximityIR() == (90, 0)
+    with pytest.raises(ValueError):
+        sensor.setAmbientIRFactor(65536)
+
+
+class AmbientChip(FakeAPDS9960):
+    # The ambient IR rises at every color read, the proximity follows with 3 counts per 4 IR counts
+    def __init__(self):
+        FakeAPDS9960.__init__(self)
+        self.level = 0
+
+    def read(self, n):
+        if self.pointer == APDS9960.APDS9960_CDATAL:
+            self.level += 8
+            _color(self, 300, 100, 100, 100 + 2 * self.level, 20 + self.level * 3 // 4)
+        return FakeAPDS9960.read(self, n)
+
+
+def test_ir_factor_calibration(sleeps):
+    chip = AmbientChip()
+    sensor = sleeps.sensor = _sensor(chip)
+    assert sensor.calibrateAmbientIRFactor(samples=8, interval=50) == 192
+    assert sensor.getAmbientIRFactor() == 192
+    assert sleeps == [(50, True)] * 8
+
+    # With the factor, the ambient IR no longer shows in the proximity
+    assert sensor.readCompensatedProximity() == 20
+
+    # Without an ambient change the factor cannot be fitted
+    chip.read = lambda n: FakeAPDS9960.read(chip, n)
+    with pytest.raises(ValueError):
+        sensor.calibrateAmbientIRFactor(samples=4, interval=0)
+
+
+def _led(chip):
+    # (LED drive, LED boost, PPULSE) programmed in the chip
+    return (chip.regs[APDS9960.APDS9960_CONTROL] >> 6, (chip.regs[APDS9960.APDS9960_CONFIG2] >> 4) & 0b11, chip.regs[APDS9960.APDS9960_PPULSE])
+
+
+def test_adaptive_proximity_starts_at_its_level():
+    chip = FakeAPDS9960()
+    chip.regs[APDS9960.APDS9960_CONTROL] = 0xC0 | 0x0C
+    chip.regs[APDS9960.APDS9960_PPULSE] = 0x40
+    adaptive = APDS9960.AdaptiveProximity(_sensor(chip))
+    assert adaptive.levels[adaptive.level] == (APDS9960.DEFAULT_LDRIVE, APDS9960.LED_BOOST_100, APDS9960.DEFAULT_PROX_PPULSE)
+    assert _led(chip) == adaptive.levels[adaptive.level]
+    # The other CONTROL bits are kept
+    assert chip.regs[APDS9960.APDS9960_CONTROL] & 0b00111111 == 0x0C
+
+    levels = [(APDS9960.LED_DRIVE_50MA, APDS9960.LED_BOOST_200, 0x83)]
+    APDS9960.AdaptiveProximity(_sensor(chip), levels=levels)
+    assert _led(chip) == levels[0]
+
+
+def test_adaptive_proximity_steps():
+    chip = FakeAPDS9960()
+    adaptive = APDS9960.AdaptiveProximity(_sensor(chip), low=40, high=230)
+    start = adaptive.level
+
+    # A close target saturates: one level weaker for the next conversion
+    chip.regs[APDS9960.APDS9960_PDATA] = 240
+    assert adaptive.read() == 240
+    assert adaptive.level == start + 1
+    assert _led(chip) == (APDS9960.LED_DRIVE_50MA, APDS9960.LED_BOOST_100, APDS9960.DEFAULT_PROX_PPULSE)
+    # Half the LED current: readings are scaled back to the default energy
+    chip.regs[APDS9960.APDS9960_PDATA] = 150
+    assert adaptive.read() == 300
+    assert adaptive.level == start + 1
+
+    # A far target: back to stronger levels
+    chip.regs[APDS9960.APDS9960_PDATA] = 30
+    assert adaptive.read() == 60
+    assert adaptive.level == start
+    assert adaptive.read() == 30
+    assert adaptive.level == start - 1
+    assert _led(chip) == (APDS9960.LED_DRIVE_100MA, APDS9960.LED_BOOST_150, APDS9960.DEFAULT_PROX_PPULSE)
+    assert adaptive.read() == (30 * ((256 * 100) // 150)) >> 8
+    assert adaptive.level == 0
+    assert adaptive.switches == 4
+
+    # The ladder ends: no further step, nothing written
+    del chip.writes[:]
+    assert adaptive.read() == (30 * ((256 * 100) // 300)) >> 8
+    assert adaptive.level == 0
+    assert adaptive.switches == 4
+    assert [write for write in chip.writes if len(write) > 1] == []
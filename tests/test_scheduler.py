@@ -0,0 +1,88 @@
+import APDS9960
+from fakebus import FakeAPDS9960, FakeBus
+
+
+def _sensor():
+    bus = FakeBus()
+    chip = bus.attach(APDS9960.APDS9960_I2C_ADDR, FakeAPDS9960())
+    return APDS9960.APDS9960(1, bus=bus.open(APDS9960.APDS9960_I2C_ADDR)), chip
+
+
+def _written(chip):
+    # Register writes, without the address pointer writes of the reads
+    return [w for w in chip.writes if len(w) > 1]
+
+
+def _wtime(wait_ms):
+    return 256 - int(wait_ms / APDS9960.CYCLE_STEP_MS)
+
+
+def test_proximity_cycle():
+    sensor, chip = _sensor()
+    scheduler = APDS9960.Scheduler(sensor)
+    scheduler.addConsumer(APDS9960.PROXIMITY, 10)
+    plan = dict(scheduler.plan())
+    # plan() only computes
+    assert scheduler.cycle_ms == 0
+    assert _written(chip) == []
+
+    # A 100 ms cycle: one proximity conversion, the rest waiting
+    wait = 100 - APDS9960.PROX_TIME_MS
+    assert plan[APDS9960.APDS9960_WTIME] == _wtime(wait)
+    assert plan[APDS9960.APDS9960_CONFIG1] & APDS9960.APDS9960_WLONG == 0
+    assert plan[APDS9960.APDS9960_ENABLE] == APDS9960.APDS9960_PON | APDS9960.APDS9960_PEN | APDS9960.APDS9960_WEN
+    assert APDS9960.APDS9960_ATIME not in plan
+    scheduler.apply()
+    steps = 256 - _wtime(wait)
+    assert abs(scheduler.cycle_ms - (APDS9960.PROX_TIME_MS + steps * APDS9960.CYCLE_STEP_MS)) < 1e-9
+    assert scheduler.cycle_ms <= 100
+
+
+def test_ambient_light_cycle():
+    sensor, chip = _sensor()
+    scheduler = APDS9960.Scheduler(sensor)
+    scheduler.addConsumer(APDS9960.AMBIENT_LIGHT, 5)
+    scheduler.addConsumer(APDS9960.PROXIMITY, 2, latency=50)
+    plan = dict(scheduler.plan())
+    # The 50 ms latency bounds the cycle, the integration fills what the proximity leaves
+    steps = int((50 - APDS9960.PROX_TIME_MS) / APDS9960.CYCLE_STEP_MS)
+    assert plan[APDS9960.APDS9960_ATIME] == 256 - steps
+    assert APDS9960.APDS9960_WTIME not in plan
+    assert plan[APDS9960.APDS9960_ENABLE] == APDS9960.APDS9960_PON | APDS9960.APDS9960_AEN | APDS9960.APDS9960_PEN
+
+
+def test_apply_writes_changed_registers(sleeps):
+    sensor, chip = _sensor()
+    sleeps.sensor = sensor
+    scheduler = APDS9960.Scheduler(sensor)
+    cid = scheduler.addConsumer(APDS9960.PROXIMITY, 10)
+    # WTIME and ENABLE differ from the power-on registers
+    assert scheduler.apply() == 2
+    assert [w[0] for w in _written(chip)] == [APDS9960.APDS9960_WTIME, APDS9960.APDS9960_ENABLE]
+    assert chip.regs[APDS9960.APDS9960_WTIME] == _wtime(100 - APDS9960.PROX_TIME_MS)
+
+    del chip.writes[:]
+    assert scheduler.apply() == 0
+    assert _written(chip) == []
+
+    scheduler.setConsumer(cid, 5)
+    assert scheduler.apply() == 1
+    assert _written(chip) == [(APDS9960.APDS9960_WTIME, _wtime(200 - APDS9960.PROX_TIME_MS))]
+    # One settle per apply() that wrote, outside the lock
+    assert sleeps == [(100, True), (100, True)]
+
+
+def test_poll_decodes():
+    sensor, chip = _sensor()
+    chip.regs[APDS9960.APDS9960_CDATAL:APDS9960.APDS9960_CDATAL + 9] = bytes([1, 2, 3, 4, 5, 6, 7, 8, 99])
+    scheduler = APDS9960.Scheduler(sensor)
+    scheduler.addConsumer(APDS9960.AMBIENT_LIGHT, 10)
+    scheduler.addConsumer(APDS9960.PROXIMITY, 10)
+    scheduler.apply()
+    deadline = scheduler.nextDeadline()
+    assert scheduler.poll(deadline - 1) == []
+
+    results = scheduler.poll(deadline)
+    assert results == [(APDS9960.AMBIENT_LIGHT, (0x0201, 0x0403, 0x0605, 0x0807)), (APDS9960.PROXIMITY, 99)]
+    assert results[0][1] == sensor.readColor()
+    assert scheduler.nextDeadline() > deadline